@@ -1,6 +1,7 @@
 """Django settings for Fishy Friend Aquatics project (renamed from aquafish_store)."""
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -163,7 +164,36 @@ EMAIL_HOST_USER_ENV = os.getenv('EMAIL_HOST_USER')
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
 RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', '')
+# Optional override of the Razorpay API host (e.g. a local stub for benchmarks)
+RAZORPAY_API_BASE_URL = os.getenv('RAZORPAY_API_BASE_URL', '')
+
+# Payment provider clients are built once per process and share a keep-alive
+# HTTP session. Pool size caps concurrent connections per provider; the
+# timeout is (connect, read) seconds and applies to every provider API call.
+PAYMENT_HTTP_POOL_SIZE = int(os.getenv('PAYMENT_HTTP_POOL_SIZE', '10'))
+# The ASGI payment views share one httpx client per event loop; connections
+# are cheap there, so the cap is higher than the thread-bound sync pool.
+PAYMENT_HTTP_ASYNC_POOL_SIZE = int(os.getenv('PAYMENT_HTTP_ASYNC_POOL_SIZE', '100'))
+PAYMENT_HTTP_TIMEOUT = (
+    float(os.getenv('PAYMENT_HTTP_CONNECT_TIMEOUT', '5')),
+    float(os.getenv('PAYMENT_HTTP_READ_TIMEOUT', '15')),
+)
 PAYMENT_PROVIDER = os.getenv('PAYMENT_PROVIDER', 'razorpay')
+# Seconds a provider order stays reusable for repeat create-payment calls on
+# the same order and amount (page reloads, retries). 0 creates one every time.
+PROVIDER_ORDER_TTL = int(os.getenv('PROVIDER_ORDER_TTL', '86400'))
+# Seconds a draft order holds its cart quantities before other customers can
+# buy them. Create-payment renews lapsed holds. 0 disables reservations.
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', '900'))
+# Stock snapshots are taken this many seconds in the past, so no transaction
+# still open at snapshot time can commit a movement the snapshot should cover.
+STOCK_SNAPSHOT_LAG = int(os.getenv('STOCK_SNAPSHOT_LAG', '3600'))
+# Stock alerts (store.stock_alerts): fish at or below LOW_STOCK_THRESHOLD warn,
+# empty products are critical. More than STOCK_ALERT_DIGEST_THRESHOLD new
+# alerts in one evaluation are rolled into a single digest notification.
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', '5'))
+STOCK_ALERT_DIGEST_THRESHOLD = int(os.getenv('STOCK_ALERT_DIGEST_THRESHOLD', '5'))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', '30'))
 
 
 def _parse_bool_env(name: str, default: bool) -> bool:
@@ -173,7 +203,14 @@ def _parse_bool_env(name: str, default: bool) -> bool:
     return v.lower() in ("true", "1", "yes", "on")
 
 
-ORDER_EMAILS_ASYNC = _parse_bool_env('ORDER_EMAILS_ASYNC', False)
+# Route the Razorpay create/verify/webhook URLs to the async views. Enable when
+# serving through asgi.py (uvicorn/daphne); under WSGI each async view would
+# be wrapped in its own event loop and gain nothing.
+PAYMENT_VIEWS_ASYNC = _parse_bool_env('PAYMENT_VIEWS_ASYNC', False)
+
+# Evaluate stock alerts when the transaction that changed stock commits. When
+# off, only the scheduled evaluate-stock-alerts task raises them.
+STOCK_ALERTS_ON_COMMIT = _parse_bool_env('STOCK_ALERTS_ON_COMMIT', True)
 
 
 # If SMTP settings are provided via environment variables, configure SMTP backend.
@@ -190,12 +227,12 @@ if EMAIL_HOST_ENV and EMAIL_HOST_USER_ENV:
     DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
     if DEBUG:
         proto = "smtps" if EMAIL_USE_SSL else ("smtp+tls" if EMAIL_USE_TLS else "smtp")
-        print(f"[EMAIL CONFIG] Using SMTP backend: {EMAIL_BACKEND} host={EMAIL_HOST}:{EMAIL_PORT} proto={proto} user={EMAIL_HOST_USER}")
+        print(f"[EMAIL CONFIG] Using SMTP backend: {EMAIL_BACKEND} host={EMAIL_HOST}:{EMAIL_PORT} proto={proto} user={EMAIL_HOST_USER}", file=sys.stderr)
 else:
     EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
     DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@fishyfriendaquatics.local")
     if DEBUG:
-        print("[EMAIL CONFIG] Using console email backend. Configure SMTP via environment variables (.env) to enable SMTP.")
+        print("[EMAIL CONFIG] Using console email backend. Configure SMTP via environment variables (.env) to enable SMTP.", file=sys.stderr)
 
 EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "30"))
 
@@ -205,12 +242,100 @@ EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "30"))
 # large messages and attachments.
 INVOICE_ATTACHMENTS = _parse_bool_env('INVOICE_ATTACHMENTS', False)
 
+# Invoice PDFs use DejaVu Sans (DejaVuSans.ttf, -Bold, -Oblique) from
+# INVOICE_FONT_DIR when present, else core fonts. Fonts and logo are loaded once
+# per process. INVOICE_FONT_SUBSET cuts the cached fonts down to Latin and
+# currency glyphs: faster renders, but other scripts print as blank boxes.
+INVOICE_FONT_DIR = os.getenv('INVOICE_FONT_DIR', str(BASE_DIR / 'static' / 'fonts'))
+INVOICE_FONT_SUBSET = _parse_bool_env('INVOICE_FONT_SUBSET', False)
+INVOICE_LOGO_PATH = os.getenv('INVOICE_LOGO_PATH', str(BASE_DIR / 'static' / 'images' / 'logo.jpg'))
+
+# Background tasks (store.tasks) go where TASK_BACKEND says: 'celery' (the
+# broker below), 'db' (BackgroundTask table, run by `manage.py run_worker`;
+# for hosts without a broker) or 'sync' (inline, for development). Under 'db'
+# run_worker also queues CELERY_BEAT_SCHEDULE below, so keep one running (or
+# run `manage.py run_worker --once` from cron every minute).
+TASK_BACKEND = os.getenv('TASK_BACKEND', 'celery')
+TASK_WORKER_THREADS = int(os.getenv('TASK_WORKER_THREADS', '4'))
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '300'))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '5'))
+
+# Payment webhooks are stored in the WebhookEvent inbox and acknowledged at once.
+# WEBHOOK_DISPATCH decides who processes them: 'thread' (in-process pool),
+# 'task' (store.tasks.process_webhook_event on TASK_BACKEND; 'celery' is an
+# alias) or 'none' (manage.py webhook_inbox drain).
+WEBHOOK_DISPATCH = os.getenv('WEBHOOK_DISPATCH', 'thread')
+WEBHOOK_WORKER_CONCURRENCY = int(os.getenv('WEBHOOK_WORKER_CONCURRENCY', '2'))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8'))
+
+# Transactional emails are written to the EmailOutbox table with the change
+# that triggers them and sent after commit. EMAIL_OUTBOX_DISPATCH: 'thread'
+# (one in-process sender thread), 'task' (store.tasks.drain_email_outbox on
+# TASK_BACKEND; 'celery' is an alias) or 'none' (manage.py email_outbox drain --loop).
+EMAIL_OUTBOX_DISPATCH = os.getenv('EMAIL_OUTBOX_DISPATCH', 'thread')
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '50'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+
+# Bearer token that lets scripts fetch /store-admin/export/<orders|items>.<csv|ndjson>
+# without an admin session; empty disables token access.
+EXPORT_API_TOKEN = os.getenv('EXPORT_API_TOKEN', '')
+
+# Admin reports (store.reports) are built in the background into
+# MEDIA_ROOT/reports/. REPORT_DISPATCH: 'thread' (in-process), 'task'
+# (store.tasks.build_report on TASK_BACKEND) or 'none' (manage.py reports build
+# --pending). REPORT_WORKERS processes build large reports in parallel slices
+# (0 builds in-process); files are deleted REPORT_RETENTION_DAYS after they finish.
+REPORT_DISPATCH = os.getenv('REPORT_DISPATCH', 'thread')
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_RETENTION_DAYS = int(os.getenv('REPORT_RETENTION_DAYS', '7'))
+REPORT_TIMEOUT_MINUTES = int(os.getenv('REPORT_TIMEOUT_MINUTES', '60'))
+
+# Clean-up jobs in store.maintenance, run by `manage.py run_maintenance` from
+# cron (or the run-maintenance beat entry). Each job deletes in batches and
+# stops after MAINTENANCE_JOB_BUDGET seconds, continuing on the next run.
+MAINTENANCE_BATCH_SIZE = int(os.getenv('MAINTENANCE_BATCH_SIZE', '1000'))
+MAINTENANCE_JOB_BUDGET = float(os.getenv('MAINTENANCE_JOB_BUDGET', '60'))
+OTP_RETENTION_HOURS = int(os.getenv('OTP_RETENTION_HOURS', '24'))
+DRAFT_ORDER_RETENTION_DAYS = int(os.getenv('DRAFT_ORDER_RETENTION_DAYS', '30'))
+
 # Celery / Redis
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Periodic jobs for `celery -A fishy_friend_aquatics beat`, or for run_worker
+# when TASK_BACKEND is 'db'
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-payments': {
+        'task': 'store.tasks.reconcile_payments',
+        'schedule': float(os.getenv('RECONCILE_PAYMENTS_INTERVAL', '900')),
+    },
+    'drain-webhook-inbox': {
+        'task': 'store.tasks.drain_webhook_inbox',
+        'schedule': 60.0,
+    },
+    'drain-email-outbox': {
+        'task': 'store.tasks.drain_email_outbox',
+        'schedule': 60.0,
+    },
+    'release-stock-reservations': {
+        'task': 'store.tasks.release_stock_reservations',
+        'schedule': 300.0,
+    },
+    'evaluate-stock-alerts': {
+        'task': 'store.tasks.evaluate_stock_alerts',
+        'schedule': float(os.getenv('STOCK_ALERT_INTERVAL', '900')),
+    },
+    'run-maintenance': {
+        'task': 'store.tasks.run_maintenance',
+        'schedule': 900.0,
+    },
+    'snapshot-stock': {
+        'task': 'store.tasks.snapshot_stock',
+        'schedule': float(os.getenv('STOCK_SNAPSHOT_INTERVAL', '86400')),
+    },
+}
 
 
 # Basic logging configuration so email backend events and errors appear in console
@@ -225,6 +350,10 @@ LOGGING = {
         "django": {"handlers": ["console"], "level": "INFO", "propagate": False},
         "django.request": {"handlers": ["console"], "level": "ERROR", "propagate": False},
         "django.core.mail": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        # httpx logs every request at INFO; keep the async payment views quiet
+        "httpx": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+        # fontTools logs every glyph subset at INFO; one per invoice font
+        "fontTools": {"handlers": ["console"], "level": "WARNING", "propagate": False},
     },
 }
 
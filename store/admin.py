@@ -13,6 +13,7 @@ from .models import (
     OrderItem,
     OrderAccessoryItem,
     OrderPlantItem,
+    PaymentReference,
     OTP,
     Review,
     Service,
@@ -30,6 +31,12 @@ from .models import (
     Accessory,
     ShippingChargeSetting,
     ShippingChargeByLocation,
+    StockMovement,
+    StockReservation,
+    WebhookEvent,
+    EmailOutbox,
+    BackgroundTask,
+    ReportJob,
 )
 
 admin.site.register(CustomUser)
@@ -453,29 +460,49 @@ class ComboOfferAdmin(admin.ModelAdmin):
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
-    readonly_fields = ('fish', 'quantity', 'price')
+    fields = ('fish', 'product_name', 'breed_name', 'category_name', 'unit_weight', 'quantity', 'price')
+    readonly_fields = fields
     extra = 0
 
 
 class OrderAccessoryItemInline(admin.TabularInline):
     model = OrderAccessoryItem
-    readonly_fields = ('accessory', 'quantity', 'price')
+    fields = ('accessory', 'product_name', 'breed_name', 'category_name', 'unit_weight', 'quantity', 'price')
+    readonly_fields = fields
     extra = 0
 
 
 class OrderPlantItemInline(admin.TabularInline):
     model = OrderPlantItem
-    readonly_fields = ('plant', 'quantity', 'price')
+    fields = ('plant', 'product_name', 'breed_name', 'category_name', 'unit_weight', 'quantity', 'price')
+    readonly_fields = fields
     extra = 0
 
 
+class PaymentReferenceInline(admin.TabularInline):
+    model = PaymentReference
+    fields = ('kind', 'value', 'created_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    fields = ('product_type', 'product_id', 'quantity', 'expires_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'user', 'total_amount', 'status', 'payment_status', 'created_at')
     list_filter = ('status', 'payment_status', 'created_at')
     search_fields = ('order_number', 'user__username', 'user__email')
     readonly_fields = ('order_number', 'total_amount', 'final_amount', 'created_at', 'updated_at')
-    inlines = (OrderItemInline, OrderAccessoryItemInline, OrderPlantItemInline)
+    inlines = (OrderItemInline, OrderAccessoryItemInline, OrderPlantItemInline, PaymentReferenceInline,
+               StockReservationInline)
     fieldsets = (
         (None, {'fields': ('user', 'order_number')}),
         ('Amounts', {'fields': ('total_amount', 'discount_amount', 'final_amount', 'delivery_charge')}),
@@ -484,3 +511,86 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product_type', 'product_id', 'delta', 'reason', 'reference')
+    list_filter = ('reason', 'product_type')
+    search_fields = ('reference',)
+    date_hierarchy = 'created_at'
+
+    # Append-only: corrections are new movements, never edits
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'provider', 'event_type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'provider', 'event_type')
+    search_fields = ('event_id',)
+    readonly_fields = ('provider', 'event_id', 'event_type', 'payload', 'attempts', 'last_error', 'received_at', 'processed_at')
+    actions = ['replay_events']
+
+    @admin.action(description='Replay selected events')
+    def replay_events(self, request, queryset):
+        from .webhooks import replay
+        count = replay(queryset)
+        self.message_user(request, f'{count} event(s) queued for replay. Run "manage.py webhook_inbox drain" if no worker is running.')
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'template', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'template')
+    search_fields = ('to', 'subject', 'dedupe_key')
+    raw_id_fields = ('order',)
+    readonly_fields = ('to', 'subject', 'body', 'template', 'order', 'site_base', 'dedupe_key', 'attempts',
+                       'last_error', 'next_attempt_at', 'created_at', 'sent_at')
+    actions = ['retry_emails']
+
+    @admin.action(description='Send selected emails again')
+    def retry_emails(self, request, queryset):
+        from .outbox import dispatch, retry
+        count = retry(queryset)
+        dispatch()
+        self.message_user(request, f'{count} email(s) queued again. Run "manage.py email_outbox drain" if no sender is running.')
+
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'worker')
+    readonly_fields = ('name', 'args', 'kwargs', 'attempts', 'max_attempts', 'leased_until', 'worker',
+                       'last_error', 'created_at', 'finished_at')
+    actions = ['retry_tasks']
+
+    @admin.action(description='Run selected tasks again')
+    def retry_tasks(self, request, queryset):
+        from .task_queue import retry
+        count = retry(queryset)
+        self.message_user(request, f'{count} task(s) queued again. Run "manage.py run_worker" if no worker is running.')
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'requested_by', 'row_count', 'file_size', 'created_at', 'finished_at',
+                    'expires_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('kind', 'params', 'status', 'requested_by', 'file_path', 'file_size', 'row_count',
+                       'parts_total', 'parts_done', 'error', 'created_at', 'started_at', 'finished_at', 'expires_at')
+
+    def delete_model(self, request, obj):
+        from .reports import delete_report
+        delete_report(obj)
+
+    def delete_queryset(self, request, queryset):
+        from .reports import delete_report
+        for job in queryset:
+            delete_report(job)
@@ -0,0 +1,308 @@
+"""Streaming catalogue import for fish, accessories and plants.
+
+Rows come from CSV or JSON Lines and are processed in chunks: each chunk is
+one transaction with at most one SELECT, one ``bulk_update`` and one
+``bulk_create`` per product type, plus bulk-created ledger movements for
+stock changes. Categories and breeds are resolved from in-memory maps
+(missing ones are created once). Bulk writes fire no model signals, so the
+per-save work they do is replaced by one pass at the end: availability flags
+for empty products and a full stock alert evaluation.
+
+Rows are matched to existing products by ``id`` when given, else by name
+(per product type). On update only the columns present and non-empty in the
+row are written, so a file of ``type,name,stock,price`` is a stock and price
+update.
+
+Recognised columns: type (fish/accessory/plant, or --type), id, name,
+category, breed (fish), description, price, size (fish), weight, stock,
+minimum_order_quantity, is_active / is_available, is_featured (fish),
+display_order (accessory/plant).
+"""
+import csv
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import PRODUCT_MODELS, record_movements, record_opening_stock
+from .models import Breed, Category
+
+logger = logging.getLogger(__name__)
+
+# Availability flag per product type; both column names are accepted
+FLAGS = {'fish': 'is_available', 'accessory': 'is_active', 'plant': 'is_active'}
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise RowError(f'not a number: {value!r}')
+
+
+def _int(value):
+    try:
+        return int(Decimal(str(value).strip()))
+    except (InvalidOperation, ValueError):
+        raise RowError(f'not an integer: {value!r}')
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE
+
+
+# column -> (model field, parser, product types it applies to; None for all)
+COLUMNS = {
+    'description': ('description', str, None),
+    'price': ('price', _decimal, None),
+    'size': ('size', _decimal, {'fish'}),
+    'weight': ('weight', _decimal, None),
+    'stock': ('stock_quantity', _int, None),
+    'stock_quantity': ('stock_quantity', _int, None),
+    'minimum_order_quantity': ('minimum_order_quantity', _int, None),
+    'is_featured': ('is_featured', _bool, {'fish'}),
+    'display_order': ('display_order', _int, {'accessory', 'plant'}),
+}
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, dict)`` from a CSV or JSON Lines text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+            continue
+        yield number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def _present(value):
+    return value is not None and not (isinstance(value, str) and not value.strip())
+
+
+class CatalogImport:
+    """One import run; call `run` with rows from `read_rows`."""
+
+    def __init__(self, default_type=None, chunk_size=1000, reference='', dry_run=False, create=True):
+        self.default_type = default_type
+        self.chunk_size = max(1, chunk_size)
+        self.reference = reference[:100]
+        self.dry_run = dry_run
+        self.create = create
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        self.errors = []
+        self._categories = {name.lower(): (pk, kind) for pk, name, kind in
+                            Category.objects.values_list('id', 'name', 'category_type')}
+        self._breeds = {(category_id, name.lower()): pk for pk, category_id, name in
+                        Breed.objects.values_list('id', 'category_id', 'name')}
+        self._names = {}
+
+    # ---- lookups --------------------------------------------------------
+
+    def _name_map(self, product_type):
+        if product_type not in self._names:
+            # Lowest id wins when names repeat
+            rows = PRODUCT_MODELS[product_type].objects.order_by('-id').values_list('name', 'id')
+            self._names[product_type] = {name.lower(): pk for name, pk in rows.iterator(chunk_size=5000)}
+        return self._names[product_type]
+
+    def _category(self, name, product_type):
+        name = name.strip()
+        found = self._categories.get(name.lower())
+        if found is None:
+            category = Category.objects.create(name=name, category_type=product_type)
+            found = self._categories[name.lower()] = (category.pk, product_type)
+        pk, kind = found
+        if kind != product_type:
+            raise RowError(f'category {name!r} is a {kind} category')
+        return pk
+
+    def _breed(self, name, category_id):
+        name = name.strip()
+        key = (category_id, name.lower())
+        if key not in self._breeds:
+            self._breeds[key] = Breed.objects.create(name=name, category_id=category_id).pk
+        return self._breeds[key]
+
+    # ---- row parsing ----------------------------------------------------
+
+    def _parse(self, row):
+        product_type = (row.get('type') or self.default_type or '').strip().lower()
+        if product_type not in PRODUCT_MODELS:
+            raise RowError(f'unknown product type {product_type!r}')
+        name = (row.get('name') or '').strip()
+        if not name and not _present(row.get('id')):
+            raise RowError('name or id is required')
+
+        values = {}
+        for column, (field, parse, types) in COLUMNS.items():
+            if _present(row.get(column)) and (types is None or product_type in types):
+                values[field] = parse(row[column])
+        if 'stock_quantity' in values and values['stock_quantity'] < 0:
+            raise RowError('stock cannot be negative')
+        for column in ('is_active', 'is_available'):
+            if _present(row.get(column)):
+                values[FLAGS[product_type]] = _bool(row[column])
+        if name:
+            values['name'] = name
+        if _present(row.get('category')):
+            values['category_id'] = self._category(str(row['category']), product_type)
+        if product_type == 'fish' and _present(row.get('breed')):
+            if 'category_id' not in values:
+                raise RowError('breed needs a category')
+            values['breed_id'] = self._breed(str(row['breed']), values['category_id'])
+        pk = _int(row['id']) if _present(row.get('id')) else None
+        return product_type, pk, values
+
+    # ---- chunk writes ---------------------------------------------------
+
+    def run(self, rows):
+        if not self.dry_run:
+            return self._run(rows)
+        # Everything, including new categories, is rolled back at the end
+        with transaction.atomic():
+            self._run(rows)
+            transaction.set_rollback(True)
+        return self.stats
+
+    def _run(self, rows):
+        chunk = []
+        for number, row in rows:
+            self.stats['rows'] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise RowError(str(row))
+                chunk.append((number, *self._parse(row)))
+            except RowError as exc:
+                self._error(number, exc)
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+        if not self.dry_run:
+            self._finish()
+        return self.stats
+
+    def _error(self, number, exc):
+        self.stats['errors'] += 1
+        if len(self.errors) < 50:
+            self.errors.append(f'line {number}: {exc}')
+
+    def _write_chunk(self, chunk):
+        by_type = {}
+        for number, product_type, pk, values in chunk:
+            by_type.setdefault(product_type, []).append((number, pk, values))
+        with transaction.atomic():
+            for product_type, rows in by_type.items():
+                self._write_type(product_type, rows)
+
+    def _write_type(self, product_type, rows):
+        model = PRODUCT_MODELS[product_type]
+        names = self._name_map(product_type)
+        now = timezone.now()
+
+        targets = {}
+        for number, pk, values in rows:
+            target = pk or names.get(values.get('name', '').lower())
+            targets[number] = target
+        existing = model.objects.in_bulk([pk for pk in targets.values() if pk])
+
+        updates, update_fields, previous_stock = {}, set(), {}
+        creates = {}
+        for number, pk, values in rows:
+            obj = updates.get(targets[number]) or existing.get(targets[number])
+            if obj is None and pk:
+                self._error(number, RowError(f'no {product_type} with id {pk}'))
+                continue
+            if obj is None:
+                key = values['name'].lower()
+                if key in creates:
+                    # Repeated name within the chunk: later rows win
+                    for field, value in values.items():
+                        setattr(creates[key][1], field, value)
+                    continue
+                if not self.create:
+                    self._error(number, RowError(f'no {product_type} named {values["name"]!r}'))
+                    continue
+                error = self._missing_required(product_type, values)
+                if error:
+                    self._error(number, RowError(error))
+                    continue
+                creates[key] = (number, model(**values))
+                continue
+
+            previous_stock.setdefault(obj.pk, obj.stock_quantity)
+            changed = [field for field, value in values.items() if getattr(obj, field) != value]
+            if not changed:
+                if obj.pk not in updates:
+                    self.stats['unchanged'] += 1
+                continue
+            for field in changed:
+                setattr(obj, field, values[field])
+            update_fields.update(changed)
+            if obj.pk not in updates:
+                self.stats['updated'] += 1
+            updates[obj.pk] = obj
+
+        if updates:
+            # bulk_update skips auto_now
+            for obj in updates.values():
+                obj.updated_at = now
+            model.objects.bulk_update(list(updates.values()), sorted(update_fields | {'updated_at'}), batch_size=500)
+            record_movements(product_type, {
+                pk: int(obj.stock_quantity or 0) - int(previous_stock[pk] or 0) for pk, obj in updates.items()
+            }, 'import', self.reference, created_at=now)
+
+        if creates:
+            objs = [obj for _, obj in creates.values()]
+            model.objects.bulk_create(objs, batch_size=500)
+            if any(obj.pk is None for obj in objs):
+                # Backends without RETURNING (MySQL): read the new ids back by name
+                fresh = dict(model.objects.filter(name__in=[o.name for o in objs]).order_by('id')
+                             .values_list('name', 'id'))
+                for obj in objs:
+                    obj.pk = obj.id = fresh.get(obj.name)
+            for obj in objs:
+                names.setdefault(obj.name.lower(), obj.pk)
+            record_opening_stock(model, objs, reason='import', reference=self.reference)
+            self.stats['created'] += len(objs)
+
+    @staticmethod
+    def _missing_required(product_type, values):
+        required = {'fish': ('name', 'category_id', 'breed_id', 'price'), 'accessory': ('name', 'price'),
+                    'plant': ('name',)}[product_type]
+        missing = [field.replace('_id', '') for field in required if values.get(field) is None]
+        return f"new {product_type} needs {', '.join(missing)}" if missing else None
+
+    def _finish(self):
+        """Derived state the skipped post_save signals would have maintained."""
+        for product_type, model in PRODUCT_MODELS.items():
+            flag = FLAGS[product_type]
+            model.objects.filter(stock_quantity__lte=0, **{flag: True}).update(**{flag: False})
+        from .stock_alerts import evaluate_stock_alerts
+        # The chunks are committed by now; an alert failure must not fail the import
+        try:
+            self.stats['alerts'] = evaluate_stock_alerts()['new']
+        except Exception as exc:
+            logger.exception('Stock alert evaluation after catalog import failed')
+            self.stats['alerts'] = 'failed'
+            self.errors.append(f'stock alerts not updated: {exc}')
@@ -0,0 +1,346 @@
+"""Order exports for the admin panel.
+
+`write_orders_workbook` writes the three-sheet orders report with openpyxl's
+write-only mode: rows go straight to per-sheet temporary files and only the
+current row is held in memory. Each sheet is one streamed query - orders
+with their item count annotated, every order line joined to its order, and
+the per-customer totals grouped in the database - so the work does not grow
+with queries per order or per customer. Column widths are fixed up front
+because write-only sheets cannot be measured afterwards.
+
+`stream_export` serves accounting/BI tools instead: orders or order lines
+as CSV or NDJSON, produced page by page. Pages are read in
+``(created_at, id)`` order with a keyset condition rather than OFFSET, each
+through a `values_list` projection and `iterator()` (a server-side cursor
+where the database supports one), so memory stays constant however wide
+the range. Every row carries the cursor of its order; passing the last one
+back as ``cursor`` resumes the export right after that order.
+"""
+import csv
+import json
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .models import Order, OrderAccessoryItem, OrderItem, OrderPlantItem
+
+CHUNK_SIZE = 2000
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# (header, column width) per sheet
+ORDER_COLUMNS = [
+    ('Order Number', 16), ('Customer Username', 20), ('Customer Email', 32), ('Customer Phone', 16),
+    ('Total Amount', 14), ('Order Status', 14), ('Payment Method', 18), ('Payment Status', 16),
+    ('Transaction ID', 26), ('Shipping Address', 50), ('Contact Phone', 16), ('Total Items', 12),
+    ('Order Created', 21), ('Last Updated', 21),
+]
+ITEM_COLUMNS = [
+    ('Order Number', 16), ('Customer Name', 20), ('Fish Name', 30), ('Fish Breed', 22), ('Fish Category', 22),
+    ('Quantity', 10), ('Unit Price', 12), ('Item Total', 12), ('Order Status', 14), ('Order Date', 21),
+]
+CUSTOMER_COLUMNS = [
+    ('Username', 20), ('Email', 32), ('Phone Number', 16), ('Date Joined', 21),
+    ('Email Verified', 15), ('Total Orders', 13), ('Total Spent', 14),
+]
+
+_HEADER_FILL = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
+_HEADER_FONT = Font(color="FFFFFF", bold=True)
+_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+
+def export_orders(params):
+    """Orders for an export, filtered by ``status``/``start_date``/``end_date`` in `params`.
+
+    Payment-pending orders are left out.
+    """
+    orders = Order.objects.exclude(payment_status='pending')
+    if params.get('status'):
+        orders = orders.filter(status=params['status'])
+    if params.get('start_date'):
+        orders = orders.filter(created_at__gte=params['start_date'])
+    if params.get('end_date'):
+        orders = orders.filter(created_at__lte=params['end_date'])
+    return orders
+
+
+def _sheet(workbook, title, columns):
+    ws = workbook.create_sheet(title=title)
+    # Write-only sheets take dimensions only before the first row
+    for index, (_, width) in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+    header = []
+    for name, _ in columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.fill = _HEADER_FILL
+        cell.font = _HEADER_FONT
+        cell.alignment = _HEADER_ALIGNMENT
+        header.append(cell)
+    ws.append(header)
+    return ws
+
+
+def _datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value else ''
+
+
+def order_rows(orders):
+    statuses = dict(Order.STATUS_CHOICES)
+    methods = dict(Order.PAYMENT_METHOD_CHOICES)
+    payment_statuses = dict(Order.PAYMENT_STATUS_CHOICES)
+    rows = (
+        orders.annotate(total_items=Coalesce(Sum('items__quantity'), 0))
+        .order_by('-created_at', '-id')
+        .values_list(
+            'order_number', 'user__username', 'user__email', 'user__phone_number', 'total_amount', 'status',
+            'payment_method', 'payment_status', 'transaction_id', 'shipping_address', 'phone_number',
+            'total_items', 'created_at', 'updated_at',
+        )
+    )
+    for (number, username, email, user_phone, total, status, method, payment_status, transaction_id,
+         address, phone, total_items, created_at, updated_at) in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            number, username, email, user_phone or 'N/A', float(total),
+            statuses.get(status, status), methods.get(method, method), payment_statuses.get(payment_status, payment_status),
+            transaction_id or 'N/A', address, phone, total_items, _datetime(created_at), _datetime(updated_at),
+        ]
+
+
+def item_rows(orders):
+    statuses = dict(Order.STATUS_CHOICES)
+    rows = (
+        OrderItem.objects.filter(order__in=orders.values('id'))
+        .order_by('-order__created_at', '-order_id', 'id')
+        .values_list(
+            'order__order_number', 'order__user__username', 'product_name', 'fish__name', 'breed_name',
+            'category_name', 'quantity', 'price', 'order__status', 'order__created_at',
+        )
+    )
+    for (number, username, product_name, fish_name, breed, category, quantity, price, status,
+         created_at) in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            number, username, product_name or fish_name or 'Deleted product', breed, category,
+            quantity, float(price), float(price * quantity), statuses.get(status, status), _datetime(created_at),
+        ]
+
+
+def customer_rows(orders):
+    rows = (
+        orders.order_by()
+        .values('user_id', 'user__username', 'user__email', 'user__phone_number', 'user__created_at',
+                'user__email_verified')
+        .annotate(total_orders=Count('id'), total_spent=Sum('total_amount'))
+        .order_by('user_id')
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            row['user__username'], row['user__email'], row['user__phone_number'] or 'N/A',
+            _datetime(row['user__created_at']), 'Yes' if row['user__email_verified'] else 'No',
+            row['total_orders'], float(row['total_spent']),
+        ]
+
+
+def write_workbook(fh, sheets):
+    """Write ``(title, columns, rows)`` sheets as a write-only workbook to `fh`.
+
+    Returns the number of rows written to the first sheet.
+    """
+    workbook = Workbook(write_only=True)
+    counts = []
+    for title, columns, rows in sheets:
+        ws = _sheet(workbook, title, columns)
+        count = 0
+        for row in rows:
+            ws.append(row)
+            count += 1
+        counts.append(count)
+    workbook.save(fh)
+    return counts[0] if counts else 0
+
+
+def orders_workbook_sheets(orders):
+    """The three sheets of the orders report for the `orders` queryset."""
+    return [
+        ('Orders Summary', ORDER_COLUMNS, order_rows(orders)),
+        ('Order Items Detail', ITEM_COLUMNS, item_rows(orders)),
+        ('Customer Details', CUSTOMER_COLUMNS, customer_rows(orders)),
+    ]
+
+
+def write_orders_workbook(orders, fh):
+    """Write the orders report for the `orders` queryset to the binary file `fh`.
+
+    Returns the number of order rows written.
+    """
+    return write_workbook(fh, orders_workbook_sheets(orders))
+
+
+# ---- CSV / NDJSON -----------------------------------------------------------
+
+PAGE_SIZE = 1000
+# Rows joined into one chunk of the streamed response
+ROWS_PER_CHUNK = 200
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+ORDER_FIELDS = [
+    ('order_number', 'order_number'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ('status', 'status'), ('payment_status', 'payment_status'), ('payment_method', 'payment_method'),
+    ('customer_username', 'user__username'), ('customer_email', 'user__email'),
+    ('total_amount', 'total_amount'), ('discount_amount', 'discount_amount'),
+    ('delivery_charge', 'delivery_charge'), ('final_amount', 'final_amount'), ('coupon_code', 'coupon__code'),
+    ('transaction_id', 'transaction_id'), ('provider_order_id', 'provider_order_id'),
+    ('shipping_state', 'shipping_state'), ('shipping_pincode', 'shipping_pincode'),
+]
+LINE_FIELDS = [
+    ('sku_type', 'sku_type'), ('product_name', 'product_name'), ('breed_name', 'breed_name'),
+    ('category_name', 'category_name'), ('quantity', 'quantity'), ('unit_price', 'price'),
+]
+LINE_MODELS = (OrderItem, OrderAccessoryItem, OrderPlantItem)
+
+DATASETS = {
+    'orders': ['cursor'] + [name for name, _ in ORDER_FIELDS],
+    'items': ['cursor', 'order_number', 'order_created_at'] + [name for name, _ in LINE_FIELDS] + ['line_total'],
+}
+
+_CURSOR_FORMAT = '%Y%m%dT%H%M%S%f'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    return f"{created_at.astimezone(dt_timezone.utc):{_CURSOR_FORMAT}}_{pk}"
+
+
+def decode_cursor(cursor):
+    """``(created_at, id)`` from a cursor string; raises InvalidCursor."""
+    try:
+        stamp, pk = cursor.split('_')
+        return datetime.strptime(stamp, _CURSOR_FORMAT).replace(tzinfo=dt_timezone.utc), int(pk)
+    except (AttributeError, ValueError):
+        raise InvalidCursor(f'Invalid cursor {cursor!r}')
+
+
+def _pages(orders, fields, cursor=None, limit=None):
+    """Yield lists of ``(cursor, id, *fields)`` tuples in ``(created_at, id)`` order."""
+    after = decode_cursor(cursor) if cursor else None
+    orders = orders.order_by('created_at', 'id').values_list('created_at', 'id', *fields)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page = orders
+        if after is not None:
+            page = page.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+        size = PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining)
+        rows = [(encode_cursor(row[0], row[1]),) + row[1:] for row in page[:size].iterator(chunk_size=size)]
+        if not rows:
+            return
+        yield rows
+        if len(rows) < size:
+            return
+        last = rows[-1]
+        after = decode_cursor(last[0])
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def _order_records(orders, cursor, limit):
+    for page in _pages(orders, [path for _, path in ORDER_FIELDS], cursor, limit):
+        for row in page:
+            yield (row[0],) + row[2:]
+
+
+def _line_records(orders, cursor, limit):
+    line_paths = [path for _, path in LINE_FIELDS]
+    for page in _pages(orders, ['order_number', 'created_at'], cursor, limit):
+        # Lines of the page's orders, one query per line model, grouped by order
+        lines = {}
+        ids = [row[1] for row in page]
+        for model in LINE_MODELS:
+            for order_id, *values in (
+                model.objects.filter(order_id__in=ids).order_by('id')
+                .values_list('order_id', *line_paths).iterator(chunk_size=2000)
+            ):
+                lines.setdefault(order_id, []).append(values)
+        for row_cursor, order_id, number, created_at in page:
+            for values in lines.get(order_id, ()):
+                quantity, price = values[-2], values[-1]
+                yield (row_cursor, number, created_at, *values, price * quantity)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Strings keep amounts exact for accounting
+        return str(value)
+    return value
+
+
+class _Echo:
+    """File-like object whose write returns the line the csv writer produced."""
+
+    def write(self, value):
+        return value
+
+
+def stream_export(dataset, fmt, orders, cursor=None, limit=None):
+    """Yield text chunks of `dataset` ('orders'/'items') for `orders` as `fmt` ('csv'/'ndjson').
+
+    `limit` caps the number of orders (for 'items': the orders whose lines
+    are included). Raises InvalidCursor for a malformed cursor before
+    anything is produced.
+    """
+    if cursor:
+        decode_cursor(cursor)
+    columns = DATASETS[dataset]
+    records = (_order_records if dataset == 'orders' else _line_records)(orders, cursor, limit)
+    return _csv_chunks(columns, records) if fmt == 'csv' else _ndjson_chunks(columns, records)
+
+
+def write_csv(dataset, orders, fh, header=True):
+    """Write all of `dataset` for `orders` as CSV to the text file `fh`; returns the row count."""
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    records = (_order_records if dataset == 'orders' else _line_records)(orders, None, None)
+    for chunk in _csv_chunks(DATASETS[dataset], counted(records), header):
+        fh.write(chunk)
+    return count
+
+
+def _csv_chunks(columns, records, header=True):
+    writer = csv.writer(_Echo())
+    chunk = [writer.writerow(columns)] if header else []
+    for record in records:
+        chunk.append(writer.writerow([_value(value) for value in record]))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _ndjson_chunks(columns, records):
+    chunk = []
+    for record in records:
+        chunk.append(json.dumps(dict(zip(columns, map(_value, record))), ensure_ascii=False) + '\n')
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
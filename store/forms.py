@@ -21,6 +21,7 @@ from .models import (
     BlogPost,
     ShippingChargeSetting,
     ShippingChargeByLocation,
+    ReportJob,
 )
 
 
@@ -209,6 +210,22 @@ class OrderFilterForm(forms.Form):
         widget=forms.DateInput(attrs={'class': 'form-control datepicker', 'placeholder': 'YYYY-MM-DD', 'autocomplete': 'off'})
     )
 
+
+class ReportRequestForm(OrderFilterForm):
+    kind = forms.ChoiceField(
+        choices=ReportJob.KIND_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def report_params(self):
+        """The filters as JSON-safe `store.exports.export_orders` params."""
+        params = {}
+        for name in ('status', 'start_date', 'end_date'):
+            value = self.cleaned_data.get(name)
+            if value:
+                params[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+        return params
+
 class FishMediaForm(forms.ModelForm):
     class Meta:
         model = FishMedia
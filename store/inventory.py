@@ -0,0 +1,349 @@
+"""Stock reservations, set-based stock deduction and stock notifications.
+
+`reserve_order_stock` holds a draft order's quantities for
+STOCK_RESERVATION_TTL seconds. Availability is on-hand stock minus other
+orders' unexpired holds (`available_to_sell`), checked under row locks so
+concurrent checkouts cannot both claim the last units. The cart and product
+pages check the same figure, so shoppers learn of held units before checkout.
+
+`deduct_stock` replaces per-row ``save()`` calls during order finalization:
+one locking read and one conditional UPDATE per product type, followed by a
+bulk availability-flag update; stock alerts are queued for after commit
+(see `store.stock_alerts`). Per-row saves fired the pre_save/post_save stock
+signals, which cost several extra queries per product while the order row
+was locked.
+
+Every stock change is also appended to the StockMovement ledger, of which
+the products' `stock_quantity` column is a projection. `stock_at` answers
+point-in-time queries from the latest StockSnapshot plus the movements
+recorded after it; `take_stock_snapshot` writes those snapshots.
+"""
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Accessory, Fish, Plant, StockMovement, StockReservation, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_MODELS = {'fish': Fish, 'accessory': Accessory, 'plant': Plant}
+
+# (product type, Order related_name, product id field on the line)
+ORDER_LINES = (
+    ('fish', 'items', 'fish_id'),
+    ('accessory', 'accessory_items', 'accessory_id'),
+    ('plant', 'plant_items', 'plant_id'),
+)
+
+
+class InsufficientStock(Exception):
+    """A reservation could not be met; `shortages` holds (name, requested, available)."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('; '.join(f'{name}: requested {req}, available {avail}' for name, req, avail in shortages))
+
+
+# Model -> (availability flag cleared at zero stock, label used in titles)
+STOCK_MODELS = {
+    Fish: ('is_available', 'fish'),
+    Accessory: ('is_active', 'accessory'),
+    Plant: ('is_active', 'plant'),
+}
+
+
+def deduct_stock(model, quantities, order_number=None):
+    """Subtract `quantities` ({pk: qty}) from `model` stock, clamping at zero.
+
+    Must run inside a transaction. Returns the applied changes as
+    ``(pk, name, previous_stock, new_stock)`` tuples.
+    """
+    quantities = {pk: qty for pk, qty in quantities.items() if pk and qty > 0}
+    if not quantities:
+        return []
+
+    flag, label = STOCK_MODELS[model]
+    # Lock in id order, as reserve_order_stock does, so the two cannot deadlock
+    rows = (
+        model.objects.select_for_update().filter(id__in=quantities).order_by('id')
+        .values_list('id', 'name', 'stock_quantity')
+    )
+
+    changes = []
+    for pk, name, stock in rows:
+        previous = int(stock or 0)
+        new_stock = previous - quantities[pk]
+        if new_stock < 0:
+            logger.warning(
+                'Order %s attempted to reduce %s %s stock below zero (%s -> %s)',
+                order_number, label, pk, previous, new_stock,
+            )
+            new_stock = 0
+        if new_stock != previous:
+            changes.append((pk, name, previous, new_stock))
+    if not changes:
+        return []
+
+    ids = [pk for pk, _, _, _ in changes]
+    deduction = Case(
+        *[When(id=pk, then=Value(quantities[pk])) for pk in ids],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    model.objects.filter(id__in=ids).update(stock_quantity=Greatest(F('stock_quantity') - deduction, Value(0)))
+
+    sold_out = [pk for pk, _, _, new_stock in changes if new_stock == 0]
+    if sold_out:
+        model.objects.filter(id__in=sold_out, **{flag: True}).update(**{flag: False})
+
+    record_movements(label, {pk: new - prev for pk, _, prev, new in changes}, 'order', order_number or '')
+    from .stock_alerts import queue_stock_alerts
+    queue_stock_alerts(label, ids)
+    return changes
+
+
+def order_quantities(order):
+    """Return ``{product_type: {product_id: quantity}}`` for an order's lines."""
+    result = {}
+    for product_type, related_name, product_field in ORDER_LINES:
+        quantities = defaultdict(int)
+        for product_id, quantity in getattr(order, related_name).values_list(product_field, 'quantity'):
+            if product_id and quantity and quantity > 0:
+                quantities[product_id] += quantity
+        if quantities:
+            result[product_type] = dict(quantities)
+    return result
+
+
+def reserved_quantities(product_type, product_ids, exclude_order=None, exclude_user=None):
+    """Sum unexpired holds per product id, leaving out `exclude_order`'s or `exclude_user`'s own."""
+    holds = StockReservation.objects.filter(
+        product_type=product_type, product_id__in=list(product_ids), expires_at__gt=timezone.now(),
+    )
+    if exclude_order is not None:
+        holds = holds.exclude(order=exclude_order)
+    if exclude_user is not None:
+        holds = holds.exclude(order__user=exclude_user)
+    return dict(holds.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+
+
+def available_to_sell(product_type, product_ids, exclude_order=None, exclude_user=None):
+    """Return ``{product_id: stock minus other orders' active holds}`` (never negative).
+
+    Cart checks pass the shopper as `exclude_user`, so the hold of their own
+    checkout draft does not count against them.
+    """
+    model = PRODUCT_MODELS[product_type]
+    reserved = reserved_quantities(product_type, product_ids, exclude_order, exclude_user)
+    return {
+        pk: max(int(stock or 0) - reserved.get(pk, 0), 0)
+        for pk, stock in model.objects.filter(id__in=list(product_ids)).values_list('id', 'stock_quantity')
+    }
+
+
+def reserve_order_stock(order, ttl=None):
+    """Replace `order`'s holds with holds covering its current lines.
+
+    Product rows are locked in id order, so concurrent reservations for the
+    same products queue instead of both passing the check. Raises
+    InsufficientStock (holding nothing new) when any line cannot be covered.
+    A TTL of 0 disables reservations.
+    """
+    ttl = getattr(settings, 'STOCK_RESERVATION_TTL', 900) if ttl is None else ttl
+    if not ttl:
+        return []
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+
+    with transaction.atomic():
+        shortages, holds = [], []
+        for product_type, quantities in order_quantities(order).items():
+            model = PRODUCT_MODELS[product_type]
+            stock = {
+                pk: (name, int(on_hand or 0))
+                for pk, name, on_hand in model.objects.select_for_update().filter(id__in=quantities)
+                .order_by('id').values_list('id', 'name', 'stock_quantity')
+            }
+            reserved = reserved_quantities(product_type, quantities, exclude_order=order)
+            for pk, quantity in quantities.items():
+                name, on_hand = stock.get(pk, (f'{product_type} {pk}', 0))
+                available = max(on_hand - reserved.get(pk, 0), 0)
+                if quantity > available:
+                    shortages.append((name, quantity, available))
+                holds.append(StockReservation(
+                    order=order, product_type=product_type, product_id=pk, quantity=quantity, expires_at=expires_at,
+                ))
+        if shortages:
+            raise InsufficientStock(shortages)
+        StockReservation.objects.filter(order=order).delete()
+        return StockReservation.objects.bulk_create(holds)
+
+
+def hold_order_stock(order):
+    """Re-reserve a pending order's stock if its holds have expired."""
+    if order.status != 'pending' or not getattr(settings, 'STOCK_RESERVATION_TTL', 900):
+        return []
+    if order.stock_reservations.filter(expires_at__gt=timezone.now()).exists():
+        return None
+    return reserve_order_stock(order)
+
+
+def release_order_stock(order):
+    """Drop every hold of `order`. Returns the number of holds removed."""
+    deleted, _ = StockReservation.objects.filter(order=order).delete()
+    return deleted
+
+
+def release_expired_reservations(batch_size=1000, now=None):
+    """Delete expired holds in batches. Returns the number deleted."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(StockReservation.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = StockReservation.objects.filter(id__in=ids).delete()
+        total += deleted
+
+
+# ---- ledger ------------------------------------------------------------------
+
+_movement_context = ContextVar('stock_movement_context', default=None)
+
+# Keeps IN lists well below database parameter limits
+_ID_CHUNK = 500
+# Seconds snapshots trail the clock by; see take_stock_snapshot
+DEFAULT_SNAPSHOT_LAG = 3600
+
+
+@contextmanager
+def stock_movement_reason(reason, reference=''):
+    """Attribute stock changes saved inside the block to `reason` and `reference`.
+
+    Product saves are recorded as ``initial``/``adjustment`` by default;
+    imports and scripted restocks wrap their saves in this.
+    """
+    token = _movement_context.set((reason, reference))
+    try:
+        yield
+    finally:
+        _movement_context.reset(token)
+
+
+def record_movements(product_type, deltas, reason, reference='', created_at=None):
+    """Append ledger rows for ``{product_id: delta}``, skipping zero deltas."""
+    created_at = created_at or timezone.now()
+    rows = [
+        StockMovement(product_type=product_type, product_id=pk, delta=delta, reason=reason,
+                      reference=(reference or '')[:100], created_at=created_at)
+        for pk, delta in deltas.items() if delta
+    ]
+    return StockMovement.objects.bulk_create(rows, batch_size=1000) if rows else []
+
+
+def record_stock_edit(model, instance, created, update_fields=None):
+    """Ledger row for a product saved through the ORM (forms, admin, seeds)."""
+    if update_fields is not None and 'stock_quantity' not in update_fields:
+        return []
+    product_type = STOCK_MODELS[model][1]
+    current = int(instance.stock_quantity or 0)
+    if created:
+        previous = 0
+    else:
+        previous = instance.previous('stock_quantity')
+        if previous is None:
+            # Saved without being loaded first; fall back to the ledger balance
+            previous = stock_at(product_type, [instance.pk])[instance.pk]
+    reason, reference = _movement_context.get() or ('initial' if created else 'adjustment', '')
+    return record_movements(product_type, {instance.pk: current - int(previous or 0)}, reason, reference)
+
+
+def record_opening_stock(model, products, reason='initial', reference=''):
+    """Ledger rows for products inserted with ``bulk_create`` (no signals fire).
+
+    The products need primary keys; on MySQL re-read them after bulk_create.
+    """
+    return record_movements(
+        STOCK_MODELS[model][1], {p.pk: int(p.stock_quantity or 0) for p in products}, reason, reference,
+    )
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), _ID_CHUNK):
+        yield ids[start:start + _ID_CHUNK]
+
+
+def stock_at(product_type, product_ids=None, when=None):
+    """Return ``{product_id: ledger balance at `when`}`` (default: now).
+
+    Each product starts from its latest snapshot at or before `when` and adds
+    the movements recorded after it. Snapshots are written for all products
+    at once, so products are grouped by snapshot time and each group costs
+    two aggregate queries. `product_ids` defaults to every product of the type.
+    """
+    when = when or timezone.now()
+    if product_ids is None:
+        product_ids = PRODUCT_MODELS[product_type].objects.values_list('id', flat=True)
+    balances = dict.fromkeys(product_ids, 0)
+
+    since = defaultdict(list)  # snapshot time (None = no snapshot) -> product ids
+    snapped = {}
+    for chunk in _chunks(balances):
+        snapped.update(
+            StockSnapshot.objects.filter(product_type=product_type, product_id__in=chunk, taken_at__lte=when)
+            .values('product_id').annotate(latest=Max('taken_at')).values_list('product_id', 'latest')
+        )
+    for pk in balances:
+        since[snapped.get(pk)].append(pk)
+
+    for taken_at, ids in since.items():
+        for chunk in _chunks(ids):
+            movements = StockMovement.objects.filter(product_type=product_type, product_id__in=chunk, created_at__lte=when)
+            if taken_at is not None:
+                balances.update(
+                    StockSnapshot.objects.filter(product_type=product_type, product_id__in=chunk, taken_at=taken_at)
+                    .values_list('product_id', 'quantity')
+                )
+                movements = movements.filter(created_at__gt=taken_at)
+            for pk, total in movements.values('product_id').annotate(total=Sum('delta')).values_list('product_id', 'total'):
+                balances[pk] += total
+    return balances
+
+
+def take_stock_snapshot(taken_at=None):
+    """Snapshot the ledger balance of every product. Returns the rows written.
+
+    Movements are timestamped when recorded, not when their transaction
+    commits, and `stock_at` never replays movements dated at or before a
+    snapshot. The default `taken_at` therefore lags STOCK_SNAPSHOT_LAG
+    seconds (longer than any transaction) behind now, so every movement it
+    covers has been committed by the time the balance is read.
+    """
+    if taken_at is None:
+        taken_at = timezone.now() - timedelta(seconds=getattr(settings, 'STOCK_SNAPSHOT_LAG', DEFAULT_SNAPSHOT_LAG))
+    written = 0
+    for product_type in PRODUCT_MODELS:
+        rows = [
+            StockSnapshot(product_type=product_type, product_id=pk, quantity=quantity, taken_at=taken_at)
+            for pk, quantity in stock_at(product_type, when=taken_at).items()
+        ]
+        written += len(StockSnapshot.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True))
+    return written
+
+
+def ledger_drift(product_type):
+    """Return ``(pk, name, stock_quantity, ledger balance)`` where the two disagree."""
+    ledger = stock_at(product_type)
+    return [
+        (pk, name, int(stock or 0), ledger.get(pk, 0))
+        for pk, name, stock in PRODUCT_MODELS[product_type].objects.values_list('id', 'name', 'stock_quantity')
+        if int(stock or 0) != ledger.get(pk, 0)
+    ]
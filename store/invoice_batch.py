@@ -0,0 +1,59 @@
+"""Worker side of the `generate_invoices` command.
+
+The command hands out chunks of order ids; `render_chunk` loads each chunk
+with its customer and lines in a fixed number of queries and renders the
+invoices through the invoice store, so unchanged invoices are read back
+instead of re-rendered. Pool workers are started with the 'spawn' method
+(no database connection inherited from the parent), so nothing here touches
+Django at import time: `init_worker` sets it up in each child.
+"""
+import os
+import shutil
+
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def invoice_filename(order_number):
+    from django.utils.text import get_valid_filename
+    return f'invoice-{get_valid_filename(order_number)}.pdf'
+
+
+def render_chunk(order_ids, mode='store', output_dir=None, force=False):
+    """Render the invoices for `order_ids`.
+
+    'store' only refreshes the invoice store; 'files' also copies each PDF to
+    `output_dir`; 'zip' returns the PDF bytes for the caller to archive.
+    `force` re-renders invoices whose stored file is current.
+
+    Returns ``(done, failed)``: done is a list of ``(order_number, size)``,
+    or ``(order_number, pdf bytes)`` in 'zip' mode; failed lists order numbers.
+    """
+    from .invoices import ensure_invoice
+    from .models import Order
+
+    orders = (
+        Order.objects.filter(id__in=order_ids).select_related('user')
+        .prefetch_related('items', 'accessory_items', 'plant_items').order_by('id')
+    )
+    done, failed = [], []
+    for order in orders:
+        if force:
+            order.invoice_hash = ''
+        invoice = ensure_invoice(order)
+        if invoice is None:
+            failed.append(order.order_number)
+            continue
+        if mode == 'store':
+            done.append((order.order_number, invoice.size))
+            continue
+        if mode == 'zip':
+            with open(invoice.path, 'rb') as fh:
+                done.append((order.order_number, fh.read()))
+            continue
+        shutil.copyfile(invoice.path, os.path.join(output_dir, invoice_filename(order.order_number)))
+        done.append((order.order_number, invoice.size))
+    return done, failed
@@ -0,0 +1,308 @@
+"""Invoice PDF layout with fonts and logo loaded once per process.
+
+Registering a TTF font with fpdf2 parses the whole font file (~100 ms for
+DejaVu Sans) and placing the logo decodes the image again, on every
+invoice. `InvoiceRenderer` does both once, on first use, and hands each new
+document a copy of the parsed font (fresh per-document glyph subset, shared
+metrics) and of the logo's image record. Font tables fpdf2 never embeds are
+stripped at load so each document's output step has less to parse.
+
+Fonts are read from INVOICE_FONT_DIR (DejaVuSans.ttf, plus the -Bold and
+-Oblique variants when present); without them the core Helvetica fonts are
+used and amounts are printed as "Rs". With INVOICE_FONT_SUBSET the cached
+fonts are cut down to Latin, punctuation and currency glyphs when loaded,
+which makes the per-document glyph subsetting fpdf2 does at output several
+times cheaper; characters outside that set print as a blank box.
+"""
+import copy
+import io
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+FONT_FAMILY = 'DejaVu'
+FONT_FILES = {'': 'DejaVuSans.ttf', 'B': 'DejaVuSans-Bold.ttf', 'I': 'DejaVuSans-Oblique.ttf'}
+
+# Basic Latin to Latin Extended-B, general punctuation and currency symbols
+SUBSET_UNICODES = [*range(0x20, 0x250), *range(0x2000, 0x2070), *range(0x20A0, 0x20D0)]
+
+# Tables fpdf2 drops when embedding a font; removing them up front saves
+# parsing them again for every document
+DROPPED_TABLES = ('FFTM', 'GDEF', 'GPOS', 'GSUB', 'MATH', 'hdmx', 'meta', 'sbix', 'CBDT', 'CBLC',
+                  'EBDT', 'EBLC', 'EBSC', 'SVG ', 'CPAL', 'COLR')
+
+RENDERER_SETTINGS = ('INVOICE_FONT_DIR', 'INVOICE_FONT_SUBSET', 'INVOICE_LOGO_PATH')
+
+
+class InvoiceRenderer:
+    """Render order invoices; safe to share between threads."""
+
+    # Layout metrics, in mm
+    MARGIN = 15
+    LOGO_WIDTH = 30
+    HEADER_X = 50
+    # The site name sits 40px (at 96 dpi) lower than the top of the logo
+    HEADER_Y = 14.5 + 40 * 25.4 / 96
+    COLUMNS = (('Item', 95, 'L'), ('Qty', 20, 'R'), ('Unit', 30, 'R'), ('Total', 30, 'R'))
+    ROW_HEIGHT = 8
+    NAME_CHARS = 60
+    STRIPE = (240, 240, 240)
+
+    def __init__(self, font_dir=None, logo_path=None, subset_fonts=False):
+        self.font_dir = font_dir
+        self.logo_path = logo_path
+        self.subset_fonts = subset_fonts
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._fonts = {}
+        self._logo = None
+        self._icc_profiles = {}
+
+    # ---- one-time loading -----------------------------------------------
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._fonts = self._load_fonts()
+            self._load_logo()
+            self._loaded = True
+
+    def _load_fonts(self):
+        from fpdf import FPDF
+        from fpdf.fonts import TTFFont
+
+        fonts = {}
+        if not self.font_dir:
+            return fonts
+        scratch = FPDF()
+        for style, filename in FONT_FILES.items():
+            path = os.path.join(self.font_dir, filename)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+                data = self._prepare(data)
+                template = TTFFont(scratch, io.BytesIO(data), f'{FONT_FAMILY.lower()}{style}', style)
+            except Exception:
+                logger.warning('Failed to load invoice font %s; skipping it', path, exc_info=True)
+                continue
+            fonts[style] = (data, template)
+        if fonts and '' not in fonts:
+            logger.warning('%s not found in %s; invoices use core fonts', FONT_FILES[''], self.font_dir)
+            return {}
+        return fonts
+
+    def _prepare(self, data):
+        """Drop the tables fpdf2 discards at output anyway, and subset if enabled."""
+        from fontTools import subset as ftsubset
+        from fontTools import ttLib
+
+        font = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False)
+        if self.subset_fonts:
+            options = ftsubset.Options(notdef_outline=True, recommended_glyphs=True, layout_features=[])
+            options.drop_tables += list(DROPPED_TABLES)
+            subsetter = ftsubset.Subsetter(options)
+            subsetter.populate(unicodes=SUBSET_UNICODES)
+            subsetter.subset(font)
+        else:
+            for tag in DROPPED_TABLES:
+                if tag in font:
+                    del font[tag]
+        out = io.BytesIO()
+        font.save(out)
+        return out.getvalue()
+
+    def _load_logo(self):
+        if not self.logo_path or not os.path.exists(self.logo_path):
+            return
+        from fpdf.image_datastructures import ImageCache
+        from fpdf.image_parsing import preload_image
+
+        cache = ImageCache()
+        try:
+            _, _, info = preload_image(cache, self.logo_path)
+        except Exception:
+            logger.warning('Failed to load invoice logo %s', self.logo_path, exc_info=True)
+            return
+        self._logo = info
+        self._icc_profiles = cache.icc_profiles
+
+    # ---- per-document setup ---------------------------------------------
+
+    def _attach_fonts(self, pdf):
+        from fontTools import ttLib
+        from fpdf.fonts import SubsetMap
+
+        for style, (data, template) in self._fonts.items():
+            font = copy.copy(template)
+            font.i = len(pdf.fonts) + 1
+            # fpdf2 subsets the font program in place when writing the PDF,
+            # so each document reopens it; lazy loading keeps that cheap
+            font.ttfont = ttLib.TTFont(io.BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True)
+            font.missing_glyphs = []
+            font.biggest_size_pt = 0
+            font.subset = SubsetMap(font)
+            pdf.fonts[template.fontkey] = font
+
+    def _place_logo(self, pdf):
+        if self._logo is None:
+            return
+        # Output records the PDF object id on the image record: copy it per document
+        info = copy.copy(self._logo)
+        info['i'] = len(pdf.image_cache.images) + 1
+        info['usages'] = 0
+        pdf.image_cache.images[self.logo_path] = info
+        pdf.image_cache.icc_profiles.update(self._icc_profiles)
+        pdf.image(self.logo_path, x=self.MARGIN, y=10, w=self.LOGO_WIDTH)
+
+    # ---- layout ----------------------------------------------------------
+
+    def render(self, order):
+        """Return the invoice PDF for `order` as bytes."""
+        from fpdf import FPDF
+
+        self._load()
+        pdf = FPDF(unit='mm', format='A4')
+        pdf.set_auto_page_break(auto=True, margin=self.MARGIN)
+        self._attach_fonts(pdf)
+        pdf.add_page()
+
+        unicode = bool(self._fonts)
+        family = FONT_FAMILY if unicode else 'helvetica'
+        bold = 'B' if not unicode or 'B' in self._fonts else ''
+        italic = 'I' if not unicode or 'I' in self._fonts else ''
+        currency = '₹' if unicode else 'Rs'
+
+        def money(value):
+            return f'{currency}{float(value):,.2f}'
+
+        # Header: logo, site name and company details
+        self._place_logo(pdf)
+        pdf.set_xy(self.HEADER_X, self.HEADER_Y)
+        pdf.set_font(family, bold, 18)
+        pdf.set_text_color(11, 83, 148)
+        pdf.cell(0, 8, settings.SITE_NAME, ln=True)
+        pdf.set_font(family, '', 10)
+        pdf.set_text_color(80, 80, 80)
+        for line in (getattr(settings, name, '') for name in
+                     ('COMPANY_ADDRESS_LINE1', 'COMPANY_ADDRESS_LINE2', 'COMPANY_PHONE')):
+            if line:
+                pdf.set_x(self.HEADER_X)
+                pdf.cell(0, 5, line, ln=True)
+        pdf.ln(6)
+
+        # Invoice title and meta
+        pdf.set_font(family, bold, 14)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 8, 'INVOICE', ln=True, align='R')
+        pdf.set_font(family, '', 10)
+        pdf.cell(0, 5, f'Invoice #: {order.order_number}', ln=True, align='R')
+        pdf.cell(0, 5, f'Date: {order.created_at.strftime("%Y-%m-%d")}', ln=True, align='R')
+        pdf.ln(4)
+
+        # Billing / shipping details
+        pdf.set_font(family, bold, 11)
+        pdf.cell(95, 6, 'Bill To:', border=0)
+        pdf.cell(0, 6, 'Ship To:', border=0, ln=True)
+        pdf.set_font(family, '', 10)
+        user = order.user
+        bill_lines = [f'{user.first_name} {user.last_name}'.strip() or user.username, user.email or '']
+        ship_lines = str(order.shipping_address).split('\n') if order.shipping_address else ['N/A']
+        for i in range(max(len(bill_lines), len(ship_lines))):
+            pdf.cell(95, 5, bill_lines[i] if i < len(bill_lines) else '', border=0)
+            pdf.cell(0, 5, ship_lines[i] if i < len(ship_lines) else '', border=0, ln=True)
+        pdf.ln(6)
+
+        # Line items
+        pdf.set_fill_color(242, 246, 251)
+        pdf.set_text_color(11, 83, 148)
+        pdf.set_draw_color(180, 180, 180)
+        pdf.set_line_width(0.4)
+        pdf.set_font(family, bold, 10)
+        for title, width, align in self.COLUMNS:
+            pdf.cell(width, self.ROW_HEIGHT, title, border=1, fill=True, align=align)
+        pdf.ln(self.ROW_HEIGHT)
+
+        pdf.set_font(family, '', 10)
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_fill_color(*self.STRIPE)
+        lines = [*order.items.all(), *order.accessory_items.all(), *order.plant_items.all()]
+        for index, line in enumerate(lines):
+            name = line.display_name or ''
+            if len(name) > self.NAME_CHARS:
+                name = name[:self.NAME_CHARS - 3] + '...'
+            values = (name, str(line.quantity), money(line.price), money(line.get_total()))
+            for (_, width, align), value in zip(self.COLUMNS, values):
+                pdf.cell(width, self.ROW_HEIGHT, value, border=1, align=align, fill=index % 2 == 1)
+            pdf.ln(self.ROW_HEIGHT)
+
+        # Totals
+        pdf.ln(6)
+        label_w, amount_w = self.COLUMNS[2][1], self.COLUMNS[3][1]
+        right_x = self.MARGIN + self.COLUMNS[0][1] + self.COLUMNS[1][1]
+        pdf.set_x(right_x)
+        pdf.set_font(family, '', 10)
+        pdf.cell(label_w, 6, 'Subtotal:', border=0)
+        pdf.cell(amount_w, 6, money(order.total_amount), border=0, align='R', ln=True)
+        if order.discount_amount and float(order.discount_amount) > 0:
+            pdf.set_x(right_x)
+            pdf.cell(label_w, 6, 'Discount:', border=0)
+            pdf.cell(amount_w, 6, f'-{money(order.discount_amount)}', border=0, align='R', ln=True)
+        pdf.set_x(right_x)
+        pdf.set_font(family, bold, 12)
+        pdf.cell(label_w, 8, 'Total:', border=0)
+        pdf.cell(amount_w, 8, money(order.final_amount), border=0, align='R', ln=True)
+
+        pdf.ln(8)
+        pdf.set_font(family, '', 9)
+        contact = getattr(settings, 'DEFAULT_FROM_EMAIL', 'support@aquafishstore.com')
+        pdf.multi_cell(0, 5, f'If you have any questions about this invoice, contact us at {contact}')
+
+        # Footer
+        pdf.set_y(-30)
+        pdf.set_font(family, italic, 8)
+        pdf.set_text_color(120, 120, 120)
+        pdf.cell(0, 5, f'Thank you for shopping with {settings.SITE_NAME}', ln=True, align='C')
+
+        return bytes(pdf.output())
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_invoice_renderer():
+    """The process-wide renderer, built from settings on first use."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = InvoiceRenderer(
+                    font_dir=getattr(settings, 'INVOICE_FONT_DIR', None),
+                    logo_path=getattr(settings, 'INVOICE_LOGO_PATH', None),
+                    subset_fonts=getattr(settings, 'INVOICE_FONT_SUBSET', False),
+                )
+    return _renderer
+
+
+def reset_invoice_renderer():
+    """Drop the cached renderer so the next render reloads fonts and logo."""
+    global _renderer
+    with _renderer_lock:
+        _renderer = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting in RENDERER_SETTINGS:
+        reset_invoice_renderer()
@@ -0,0 +1,138 @@
+"""Content-addressed invoice PDF store.
+
+An invoice is keyed by its order id plus a SHA-256 of everything the PDF
+shows (`invoice_fingerprint`). `ensure_invoice` renders only when that hash
+differs from the one recorded on the order or the file is gone, so email
+retries, resends and downloads reuse the stored file. Path, hash and size
+are recorded on the Order; `Order.invoice_url` and the download view read
+them instead of probing the filesystem.
+
+Files live under MEDIA_ROOT/invoices/<order id>-<hash prefix>.pdf, which is
+not guessable from the order number.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout changes so stored invoices are re-rendered
+INVOICE_LAYOUT_VERSION = 2
+
+InvoiceFile = namedtuple('InvoiceFile', 'path sha256 size')
+
+
+def _lines(manager):
+    # Sorted here rather than with order_by() so prefetched lines are reused
+    return [
+        [line.display_name or '', line.quantity, str(line.price)]
+        for line in sorted(manager.all(), key=lambda line: line.pk)
+    ]
+
+
+def invoice_fingerprint(order):
+    """SHA-256 of the order fields and lines rendered on the invoice."""
+    user = order.user
+    content = {
+        'layout': INVOICE_LAYOUT_VERSION,
+        'site': [settings.SITE_NAME, getattr(settings, 'DEFAULT_FROM_EMAIL', '')] + [
+            getattr(settings, name, '') for name in ('COMPANY_ADDRESS_LINE1', 'COMPANY_ADDRESS_LINE2', 'COMPANY_PHONE')
+        ],
+        'order': [
+            order.order_number, order.created_at.isoformat() if order.created_at else '',
+            order.shipping_address or '', order.shipping_state or '', order.shipping_pincode or '',
+            order.phone_number or '', order.payment_method or '',
+            str(order.total_amount), str(order.discount_amount), str(order.delivery_charge), str(order.final_amount),
+        ],
+        'customer': [user.first_name, user.last_name, user.username, user.email or ''] if user else [],
+        'items': _lines(order.items),
+        'accessories': _lines(order.accessory_items),
+        'plants': _lines(order.plant_items),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _invoices_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'invoices')
+
+
+def _stored(order, digest):
+    if order.invoice_hash != digest or not order.invoice_path:
+        return None
+    path = os.path.join(settings.MEDIA_ROOT, order.invoice_path)
+    if not os.path.isfile(path):
+        return None
+    return InvoiceFile(path, digest, order.invoice_size)
+
+
+def ensure_invoice(order):
+    """Return the current InvoiceFile for `order`, rendering it only if needed.
+
+    Returns None when the PDF cannot be generated.
+    """
+    digest = invoice_fingerprint(order)
+    stored = _stored(order, digest)
+    if stored is not None:
+        return stored
+
+    from .views import generate_invoice_pdf
+
+    pdf_bytes = generate_invoice_pdf(order)
+    if not pdf_bytes:
+        return None
+
+    relative = os.path.join('invoices', f'{order.pk}-{digest[:16]}.pdf')
+    path = os.path.join(settings.MEDIA_ROOT, relative)
+    os.makedirs(_invoices_dir(), exist_ok=True)
+    # Write then rename so concurrent readers never see a partial file; each
+    # writer (thread or process) gets its own temp file
+    fd, tmp_path = tempfile.mkstemp(dir=_invoices_dir(), prefix=f'{order.pk}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(pdf_bytes)
+        # mkstemp creates 0600; keep invoices readable like other media
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    previous = order.invoice_path
+    fields = {
+        'invoice_path': relative,
+        'invoice_hash': digest,
+        'invoice_size': len(pdf_bytes),
+        'invoice_generated_at': timezone.now(),
+    }
+    # Plain UPDATE: the invoice record is not an order change signals care about
+    Order.objects.filter(pk=order.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(order, name, value)
+
+    if previous and previous != relative:
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, previous))
+        except OSError:
+            pass
+    logger.info('Rendered invoice for order %s (%s bytes)', order.order_number, len(pdf_bytes))
+    return InvoiceFile(path, digest, len(pdf_bytes))
+
+
+def invoice_pdf_bytes(order):
+    """PDF bytes for `order` from the store, or None if it cannot be generated."""
+    invoice = ensure_invoice(order)
+    if invoice is None:
+        return None
+    with open(invoice.path, 'rb') as fh:
+        return fh.read()
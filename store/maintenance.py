@@ -0,0 +1,275 @@
+"""Periodic clean-up of tables that otherwise only grow.
+
+Jobs are registered with `@job` and run by `python manage.py run_maintenance`
+(from cron, e.g. every 15 minutes) or the `run_maintenance` task. Each call
+runs the jobs that are due; a `MaintenanceJob` row per job holds when it is
+next due and a lease, taken with a conditional UPDATE, so overlapping runs
+skip a job that is already running.
+
+The 'email_outbox' and 'webhooks' jobs also requeue rows a dead worker left
+claimed and work off due retries, which the in-process dispatchers only do
+when a new row arrives.
+
+Jobs delete in batches of primary keys, one short statement at a time, and
+stop when their time budget runs out; a job that did not finish stays due
+and carries on at the next run. Every run logs the rows removed and the
+time taken.
+"""
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import OTP, MaintenanceJob, Notification, Order
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_JOB_BUDGET = 60
+
+Job = namedtuple('Job', 'name func every description')
+
+# Job name -> Job, in registration order
+_jobs = {}
+
+
+def job(name, every, description=''):
+    """Register ``func(batch_size, deadline) -> (removed, finished)`` as a job run every `every`."""
+    def register(func):
+        _jobs[name] = Job(name, func, every, description or (func.__doc__ or '').strip().split('\n')[0])
+        return func
+    return register
+
+
+def registered_jobs():
+    return list(_jobs.values())
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def delete_in_batches(queryset, batch_size, deadline):
+    """Delete `queryset` a batch of pks at a time until done or `deadline`.
+
+    Returns ``(removed, finished)``; cascaded rows count towards `removed`.
+    """
+    removed = 0
+    model = queryset.model
+    while time.monotonic() < deadline:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return removed, True
+        deleted, _ = model._default_manager.filter(pk__in=pks).delete()
+        removed += deleted
+    return removed, False
+
+
+# ---- jobs -------------------------------------------------------------------
+
+@job('sessions', timedelta(hours=1))
+def clear_sessions(batch_size, deadline):
+    """Delete expired sessions."""
+    from importlib import import_module
+    engine = import_module(settings.SESSION_ENGINE)
+    store = engine.SessionStore
+    if not hasattr(store, 'get_model_class'):
+        # File/cookie/cache sessions expire on their own terms
+        store.clear_expired()
+        return 0, True
+    return delete_in_batches(
+        store.get_model_class().objects.filter(expire_date__lt=timezone.now()), batch_size, deadline,
+    )
+
+
+@job('cache_table', timedelta(minutes=15))
+def clear_cache_table(batch_size, deadline):
+    """Delete expired entries from DatabaseCache tables.
+
+    The backend only culls while writing, once MAX_ENTRIES is reached, and
+    counts the table on every write; keeping it free of expired rows keeps
+    both cheap.
+    """
+    removed = 0
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if not hasattr(cache, 'cache_model_class'):
+            continue
+        connection = connections[router.db_for_write(cache.cache_model_class)]
+        table = connection.ops.quote_name(cache._table)
+        key = connection.ops.quote_name('cache_key')
+        now = connection.ops.adapt_datetimefield_value(timezone.now().replace(microsecond=0))
+        while True:
+            if time.monotonic() >= deadline:
+                return removed, False
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT {key} FROM {table} WHERE {connection.ops.quote_name("expires")} < %s '
+                    f'LIMIT {int(batch_size)}',
+                    [now],
+                )
+                keys = [row[0] for row in cursor.fetchall()]
+                if not keys:
+                    break
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {key} IN ({", ".join(["%s"] * len(keys))})', keys,
+                )
+                removed += cursor.rowcount
+    return removed, True
+
+
+@job('otps', timedelta(hours=1))
+def clear_otps(batch_size, deadline):
+    """Delete used OTPs and ones older than OTP_RETENTION_HOURS."""
+    cutoff = timezone.now() - timedelta(hours=_setting('OTP_RETENTION_HOURS', 24))
+    removed, finished = delete_in_batches(OTP.objects.filter(is_used=True), batch_size, deadline)
+    if not finished:
+        return removed, False
+    more, finished = delete_in_batches(OTP.objects.filter(created_at__lt=cutoff), batch_size, deadline)
+    return removed + more, finished
+
+
+@job('notifications', timedelta(days=1))
+def clear_notifications(batch_size, deadline):
+    """Delete read, unkeyed notifications older than NOTIFICATION_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=_setting('NOTIFICATION_RETENTION_DAYS', 30))
+    # Same rows as stock_alerts.prune_notifications, within the time budget
+    return delete_in_batches(
+        Notification.objects.filter(is_read=True, key__isnull=True, created_at__lt=cutoff), batch_size, deadline,
+    )
+
+
+@job('draft_orders', timedelta(days=1))
+def clear_draft_orders(batch_size, deadline):
+    """Delete checkout drafts never paid within DRAFT_ORDER_RETENTION_DAYS.
+
+    The retention is well past the reconciliation window, so no payment can
+    still arrive for them; their lines and stock holds go with them.
+    """
+    cutoff = timezone.now() - timedelta(days=_setting('DRAFT_ORDER_RETENTION_DAYS', 30))
+    drafts = Order.objects.filter(
+        status='pending', payment_status__in=['pending', 'failed'], transaction_id__isnull=True,
+        created_at__lt=cutoff,
+    ).order_by('id')
+    # Orders cascade to several tables; keep each transaction small
+    return delete_in_batches(drafts, max(1, batch_size // 10), deadline)
+
+
+@job('reports', timedelta(hours=1))
+def clear_reports(batch_size, deadline):
+    """Fail stalled report builds and delete reports past REPORT_RETENTION_DAYS."""
+    from .reports import fail_stale, prune_expired
+    fail_stale()
+    # Each row has a file to unlink as well
+    return prune_expired(max(1, batch_size // 10), deadline)
+
+
+def _drain_until(drain, limit, deadline):
+    """Call ``drain(limit)`` until a short batch or `deadline`; returns ``(handled, finished)``."""
+    handled = 0
+    while time.monotonic() < deadline:
+        done = sum(drain(limit).values())
+        handled += done
+        if done < limit:
+            return handled, True
+    return handled, False
+
+
+@job('email_outbox', timedelta(minutes=15))
+def sweep_email_outbox(batch_size, deadline):
+    """Requeue emails stuck sending and send those due, retries included."""
+    from . import outbox
+    # The in-process sender only wakes when a new email is queued
+    released = outbox.release_stale()
+    sent, finished = _drain_until(
+        outbox.drain, _setting('EMAIL_OUTBOX_BATCH_SIZE', outbox.DEFAULT_BATCH_SIZE), deadline,
+    )
+    return released + sent, finished
+
+
+@job('webhooks', timedelta(minutes=15))
+def sweep_webhooks(batch_size, deadline):
+    """Requeue webhook events stuck processing and process those due."""
+    from . import webhooks
+    released = webhooks.release_stale()
+    processed, finished = _drain_until(webhooks.drain, 100, deadline)
+    return released + processed, finished
+
+
+# ---- scheduler --------------------------------------------------------------
+
+def _lock(name, lease):
+    """Take the lease on job `name`; returns the state row or None if it is held."""
+    state, _ = MaintenanceJob.objects.get_or_create(name=name)
+    now = timezone.now()
+    taken = MaintenanceJob.objects.filter(pk=state.pk).exclude(locked_until__gt=now).update(
+        locked_until=now + lease,
+    )
+    if not taken:
+        return None
+    state.refresh_from_db()
+    return state
+
+
+def run_job(entry, batch_size, budget, force=False):
+    """Run one job if it is due (or `force`). Returns a result dict, or None if skipped."""
+    state = _lock(entry.name, timedelta(seconds=budget + 300))
+    if state is None:
+        logger.info('Maintenance job %s is already running; skipped', entry.name)
+        return None
+    started_at = timezone.now()
+    try:
+        if not force and state.next_run_at > started_at:
+            return None
+        started = time.monotonic()
+        error = ''
+        try:
+            removed, finished = entry.func(batch_size, started + budget)
+        except Exception as exc:
+            logger.exception('Maintenance job %s failed', entry.name)
+            removed, finished, error = 0, False, str(exc)[:2000]
+        duration = time.monotonic() - started
+        state.last_run_at = started_at
+        state.last_removed = removed
+        state.last_duration = duration
+        state.last_error = error
+        # Unfinished jobs stay due; failed ones wait one interval
+        state.next_run_at = started_at + entry.every if finished or error else started_at
+        state.save(update_fields=['last_run_at', 'last_removed', 'last_duration', 'last_error', 'next_run_at'])
+        logger.info('Maintenance job %s removed %s rows in %.2fs%s', entry.name, removed, duration,
+                    '' if finished else ' (budget reached)' if not error else ' (failed)')
+        return {'name': entry.name, 'removed': removed, 'duration': duration, 'finished': finished, 'error': error}
+    finally:
+        MaintenanceJob.objects.filter(pk=state.pk).update(locked_until=None)
+
+
+def run_due(names=None, force=False, batch_size=None, job_budget=None, total_budget=None):
+    """Run the due jobs (all registered, or `names`) within the time budgets.
+
+    Returns the result dicts of the jobs that ran.
+    """
+    batch_size = batch_size or _setting('MAINTENANCE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    job_budget = job_budget or _setting('MAINTENANCE_JOB_BUDGET', DEFAULT_JOB_BUDGET)
+    unknown = set(names or ()) - set(_jobs)
+    if unknown:
+        raise KeyError(f"Unknown maintenance job(s): {', '.join(sorted(unknown))}")
+    end = time.monotonic() + total_budget if total_budget else None
+    results = []
+    for entry in registered_jobs():
+        if names and entry.name not in names:
+            continue
+        budget = job_budget
+        if end is not None:
+            budget = min(budget, end - time.monotonic())
+            if budget <= 0:
+                logger.info('Maintenance time budget used up before %s', entry.name)
+                break
+        result = run_job(entry, batch_size, budget, force=force)
+        if result is not None:
+            results.append(result)
+    return results
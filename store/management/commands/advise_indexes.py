@@ -0,0 +1,354 @@
+"""
+Replay a representative set of requests, fingerprint the SQL they issue and
+suggest composite indexes for queries that end up scanning whole tables.
+
+Usage:
+    python manage.py advise_indexes
+    python manage.py advise_indexes --paths-file extra_paths.txt --top 20
+    python manage.py advise_indexes --emit-migration
+
+Only GET requests are replayed so the command is safe to run against a copy of
+the production database. EXPLAIN output is understood for SQLite and MySQL.
+"""
+import os
+import re
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import NoReverseMatch, reverse
+
+from store.models import Fish, Order
+
+
+# (url name, args, who) — `who` is one of anonymous/customer/admin
+DEFAULT_REQUESTS = [
+    ('home', [], 'anonymous'),
+    ('fish_list', [], 'anonymous'),
+    ('accessories', [], 'anonymous'),
+    ('plants', [], 'anonymous'),
+    ('combos', [], 'anonymous'),
+    ('search_suggestions', [], 'anonymous'),
+    ('cart', [], 'customer'),
+    ('checkout', [], 'customer'),
+    ('customer_orders', [], 'customer'),
+    ('notifications_dropdown', [], 'admin'),
+    ('admin_dashboard', [], 'admin'),
+    ('admin_orders', [], 'admin'),
+    ('admin_coupons', [], 'admin'),
+    ('admin_accessories', [], 'admin'),
+    ('admin_plants', [], 'admin'),
+    ('staff_fish_list', [], 'admin'),
+]
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_WS_RE = re.compile(r'\s+')
+_COLUMN_RE = r'[`"]?(\w+)[`"]?\.[`"]?(\w+)[`"]?'
+_EQ_RE = re.compile(_COLUMN_RE + r'\s*(=|IN\b|IS\b)', re.IGNORECASE)
+# Innermost parenthesised group with an OR in it
+_OR_GROUP_RE = re.compile(r'\([^()]*\bOR\b[^()]*\)', re.IGNORECASE)
+_BOOL_RE = re.compile(r'(?:\bNOT\s+' + _COLUMN_RE + r')|(?:' + _COLUMN_RE + r'\s*(?=\bAND\b|\bOR\b|\)|$))', re.IGNORECASE)
+_RANGE_RE = re.compile(_COLUMN_RE + r'\s*(?:<=|>=|<|>|BETWEEN\b|LIKE\b)', re.IGNORECASE)
+_ORDER_RE = re.compile(r'\bORDER BY\b(.*?)(?:\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+_WHERE_RE = re.compile(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+
+
+def fingerprint(sql):
+    """Collapse literals so queries that differ only by parameters group together."""
+    fp = _STRING_RE.sub('?', sql)
+    fp = _NUMBER_RE.sub('?', fp)
+    fp = _IN_LIST_RE.sub('IN (...)', fp)
+    return _WS_RE.sub(' ', fp).strip()
+
+
+class Command(BaseCommand):
+    help = 'Replay representative requests, EXPLAIN the captured SQL and propose composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paths-file', help='File with extra paths to GET (one per line, optional "customer"/"admin" prefix)')
+        parser.add_argument('--repeat', type=int, default=1, help='Replay the request set this many times')
+        parser.add_argument('--top', type=int, default=15, help='Number of fingerprints to print')
+        parser.add_argument('--customer', help='Username of the customer to replay customer pages as')
+        parser.add_argument('--admin', help='Username of the admin to replay admin pages as')
+        parser.add_argument('--emit-migration', action='store_true', help='Write a migration adding the proposed store indexes')
+        parser.add_argument('--migration-name', default='advised_indexes', help='Name suffix for the emitted migration')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            raise CommandError(f'EXPLAIN parsing is only implemented for SQLite and MySQL (got {connection.vendor})')
+
+        requests = self._build_request_set(options)
+        clients = self._build_clients(options)
+
+        stats = defaultdict(lambda: {'count': 0, 'time': 0.0, 'sample': None, 'paths': set()})
+        started = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            for _ in range(max(1, options['repeat'])):
+                for path, who in requests:
+                    client = clients.get(who)
+                    if client is None:
+                        continue
+                    with CaptureQueriesContext(connection) as ctx:
+                        try:
+                            client.get(path)
+                        except Exception as exc:
+                            self.stdout.write(self.style.WARNING(f'GET {path} failed: {exc}'))
+                            continue
+                    for q in ctx.captured_queries:
+                        sql = q.get('sql') or ''
+                        if not sql.lstrip().upper().startswith('SELECT'):
+                            continue
+                        fp = fingerprint(sql)
+                        entry = stats[fp]
+                        entry['count'] += 1
+                        entry['time'] += float(q.get('time') or 0)
+                        entry['sample'] = entry['sample'] or sql
+                        entry['paths'].add(path)
+        elapsed = time.perf_counter() - started
+
+        total_queries = sum(e['count'] for e in stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {len(requests)} request(s) x{options["repeat"]} in {elapsed:.2f}s: '
+            f'{total_queries} SELECTs, {len(stats)} distinct fingerprints'
+        ))
+
+        ranked = sorted(stats.items(), key=lambda kv: (kv[1]['time'], kv[1]['count']), reverse=True)
+        proposals = defaultdict(float)
+        for fp, entry in ranked:
+            for table in self._scanned_tables(entry['sample']):
+                cols = self._candidate_columns(entry['sample'], table)
+                if cols:
+                    proposals[(table, tuple(cols))] += entry['time'] + entry['count'] * 0.001
+
+        for fp, entry in ranked[:options['top']]:
+            self.stdout.write('')
+            self.stdout.write(f"[{entry['count']}x, {entry['time'] * 1000:.1f}ms] {fp[:300]}")
+            self.stdout.write(f"    paths: {', '.join(sorted(entry['paths']))[:200]}")
+            for line in self._explain(entry['sample']):
+                self.stdout.write(f'    {line}')
+
+        indexes = self._resolve_proposals(proposals)
+        self.stdout.write('')
+        if not indexes:
+            self.stdout.write(self.style.SUCCESS('No missing indexes detected for the replayed request set.'))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Proposed indexes (add to the model Meta.indexes):'))
+        for model, fields, weight in indexes:
+            self.stdout.write(f'  {model._meta.label}: models.Index(fields={list(fields)!r})  # weight={weight:.4f}')
+
+        if options['emit_migration']:
+            path = self._write_migration(indexes, options['migration_name'])
+            if path:
+                self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
+                self.stdout.write('Remember to mirror the indexes in Meta.indexes so makemigrations stays clean.')
+
+    # -- request set -----------------------------------------------------
+
+    def _build_request_set(self, options):
+        requests = []
+        for name, args, who in DEFAULT_REQUESTS:
+            try:
+                requests.append((reverse(name, args=args), who))
+            except NoReverseMatch:
+                continue
+
+        fish = Fish.objects.filter(is_available=True).only('id').first()
+        if fish:
+            requests.append((reverse('fish_detail', args=[fish.id]), 'anonymous'))
+        fish_list = reverse('fish_list')
+        requests.append((f'{fish_list}?sort=price_low', 'anonymous'))
+        requests.append((f'{reverse("search_suggestions")}?q=gold', 'anonymous'))
+
+        order = Order.objects.exclude(payment_status='pending').only('id', 'user_id').order_by('-created_at').first()
+        if order:
+            requests.append((reverse('admin_order_detail', args=[order.id]), 'admin'))
+            requests.append((reverse('order_detail', args=[order.id]), 'customer'))
+
+        paths_file = options.get('paths_file')
+        if paths_file:
+            if not os.path.exists(paths_file):
+                raise CommandError(f'Paths file not found: {paths_file}')
+            with open(paths_file, encoding='utf-8') as fh:
+                for raw in fh:
+                    line = raw.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    who, _, path = line.partition(' ')
+                    if who in ('anonymous', 'customer', 'admin') and path:
+                        requests.append((path.strip(), who))
+                    else:
+                        requests.append((line, 'anonymous'))
+        return requests
+
+    def _build_clients(self, options):
+        User = get_user_model()
+        clients = {'anonymous': Client()}
+
+        if options.get('customer'):
+            customer = User.objects.filter(username=options['customer']).first()
+        else:
+            # Prefer the customer with the most orders so history pages are realistic
+            customer = (
+                User.objects.filter(role='customer', is_active=True)
+                .annotate(n=models.Count('orders'))
+                .order_by('-n')
+                .first()
+            )
+        if customer:
+            clients['customer'] = Client()
+            clients['customer'].force_login(customer)
+        else:
+            self.stdout.write(self.style.WARNING('No customer account found; skipping customer pages.'))
+
+        if options.get('admin'):
+            admin = User.objects.filter(username=options['admin']).first()
+        else:
+            admin = User.objects.filter(role='admin', is_active=True).first() or User.objects.filter(is_superuser=True).first()
+        if admin:
+            clients['admin'] = Client()
+            clients['admin'].force_login(admin)
+        else:
+            self.stdout.write(self.style.WARNING('No admin account found; skipping admin pages.'))
+        return clients
+
+    # -- EXPLAIN parsing -------------------------------------------------
+
+    def _explain(self, sql):
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    return [row[-1] for row in cursor.fetchall()]
+                cursor.execute(f'EXPLAIN {sql}')
+                cols = [c[0] for c in cursor.description]
+                return [', '.join(f'{c}={v}' for c, v in zip(cols, row) if v is not None) for row in cursor.fetchall()]
+        except Exception as exc:
+            return [f'EXPLAIN failed: {exc}']
+
+    def _scanned_tables(self, sql):
+        """Return table names that the plan reads without using an index."""
+        tables = set()
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    for row in cursor.fetchall():
+                        detail = row[-1]
+                        m = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+                        if m and 'USING' not in detail:
+                            tables.add(m.group(1))
+                else:
+                    cursor.execute(f'EXPLAIN {sql}')
+                    cols = [c[0] for c in cursor.description]
+                    for row in cursor.fetchall():
+                        info = dict(zip(cols, row))
+                        if info.get('type') == 'ALL' and info.get('table'):
+                            tables.add(info['table'])
+        except Exception:
+            return set()
+        # Aliases (T3, U0...) are resolved back to real table names where possible
+        known = {m._meta.db_table for m in apps.get_models()}
+        return {t for t in tables if t in known}
+
+    def _candidate_columns(self, sql, table):
+        where = _WHERE_RE.search(sql)
+        eq_cols, range_cols, order_cols = [], [], []
+        if where:
+            clause = where.group(1)
+            or_groups = [m.span() for m in _OR_GROUP_RE.finditer(clause)]
+            for m in _EQ_RE.finditer(clause):
+                tbl, col, op = m.groups()
+                # `c IS NULL OR c >= ?` cannot seek on c; leave c to the range pass
+                if op.upper() == 'IS' and any(start < m.start() < end for start, end in or_groups):
+                    continue
+                if tbl == table and col not in eq_cols:
+                    eq_cols.append(col)
+            # SQLite renders boolean filters as bare `"t"."c"` / `NOT "t"."c"`
+            for m in _BOOL_RE.findall(clause):
+                tbl, col = (m[0], m[1]) if m[0] else (m[2], m[3])
+                if tbl == table and col not in eq_cols:
+                    eq_cols.append(col)
+            for tbl, col in _RANGE_RE.findall(clause):
+                if tbl == table and col not in eq_cols and col not in range_cols:
+                    range_cols.append(col)
+        order = _ORDER_RE.search(sql)
+        if order:
+            for tbl, col in re.findall(_COLUMN_RE, order.group(1)):
+                if tbl == table and col not in eq_cols and col not in range_cols:
+                    order_cols.append(col)
+        # Equality columns first, then at most one range column, then sort keys
+        cols = eq_cols + range_cols[:1] + (order_cols[:1] if not range_cols else [])
+        return cols[:4]
+
+    def _resolve_proposals(self, proposals):
+        by_table = {m._meta.db_table: m for m in apps.get_models() if not m._meta.proxy}
+        resolved = []
+        for (table, columns), weight in sorted(proposals.items(), key=lambda kv: kv[1], reverse=True):
+            model = by_table.get(table)
+            if model is None:
+                continue
+            col_to_field = {f.column: f.name for f in model._meta.concrete_fields}
+            fields = tuple(col_to_field[c] for c in columns if c in col_to_field)
+            if not fields or fields == ('id',):
+                continue
+            if self._already_indexed(model, fields):
+                continue
+            resolved.append((model, fields, weight))
+        # Drop proposals that are a leading prefix of a wider one on the same model
+        return [
+            (model, fields, weight) for model, fields, weight in resolved
+            if not any(m is model and f != fields and f[:len(fields)] == fields for m, f, _ in resolved)
+        ]
+
+    def _already_indexed(self, model, fields):
+        opts = model._meta
+        existing = [tuple(idx.fields) for idx in opts.indexes]
+        existing += [tuple(ut) for ut in opts.unique_together]
+        existing += [tuple(c.fields) for c in opts.constraints if getattr(c, 'fields', None)]
+        for f in opts.concrete_fields:
+            if f.primary_key or f.unique or f.db_index:
+                existing.append((f.name,))
+        stripped = tuple(f.lstrip('-') for f in fields)
+        return any(idx[:len(stripped)] == stripped for idx in existing)
+
+    # -- migration output ------------------------------------------------
+
+    def _write_migration(self, indexes, name):
+        store_indexes = [(m, f) for m, f, _ in indexes if m._meta.app_label == 'store']
+        if not store_indexes:
+            self.stdout.write(self.style.WARNING('No proposals for the store app; migration not written.'))
+            return None
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaves = loader.graph.leaf_nodes('store')
+        operations = []
+        for model, fields in store_indexes:
+            index = models.Index(fields=list(fields))
+            index.set_name_with_model(model)
+            operations.append(migrations.AddIndex(model_name=model._meta.model_name, index=index))
+
+        numbers = [
+            int(n.split('_')[0]) for app, n in loader.disk_migrations
+            if app == 'store' and n.split('_')[0].isdigit()
+        ]
+        number = (max(numbers) + 1) if numbers else 1
+        migration_name = f'{number:04d}_{name}'
+        migration = type('Migration', (migrations.Migration,), {
+            'dependencies': leaves,
+            'operations': operations,
+        })(migration_name, 'store')
+
+        writer = MigrationWriter(migration)
+        with open(writer.path, 'w', encoding='utf-8') as fh:
+            fh.write(writer.as_string())
+        return writer.path
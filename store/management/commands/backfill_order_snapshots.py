@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from store.models import OrderItem, OrderAccessoryItem, OrderPlantItem
+
+
+SNAPSHOT_FIELDS = ['product_name', 'breed_name', 'category_name', 'sku_type', 'unit_weight', 'product_image',
+                   'product_size', 'product_summary']
+
+LINE_MODELS = (
+    (OrderItem, ('fish__breed', 'fish__category')),
+    (OrderAccessoryItem, ('accessory__category',)),
+    (OrderPlantItem, ('plant__category',)),
+)
+
+
+class Command(BaseCommand):
+    help = 'Copy product name/breed/category/weight/image/size/summary onto order lines created before snapshots existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Lines updated per bulk_update (default 500)')
+        parser.add_argument('--force', action='store_true', help='Re-snapshot lines that already have a product name')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many lines would be updated')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        force = options['force']
+        dry_run = options['dry_run']
+
+        for model, related in LINE_MODELS:
+            qs = model.objects.exclude(**{f'{model.product_field}__isnull': True})
+            if not force:
+                qs = qs.filter(product_name='')
+            total = qs.count()
+            label = model._meta.verbose_name_plural
+            if dry_run or not total:
+                self.stdout.write(f'{label}: {total} line(s) to backfill')
+                continue
+
+            updated = 0
+            last_id = 0
+            # Walk by primary key so each chunk is an indexed range scan and the
+            # filter on product_name does not skip rows as they are updated.
+            while True:
+                chunk = list(qs.filter(id__gt=last_id).select_related(*related).order_by('id')[:batch_size])
+                if not chunk:
+                    break
+                for line in chunk:
+                    line.capture_snapshot()
+                model.objects.bulk_update(chunk, SNAPSHOT_FIELDS)
+                updated += len(chunk)
+                last_id = chunk[-1].id
+                self.stdout.write(f'{label}: {updated}/{total}')
+
+            self.stdout.write(self.style.SUCCESS(f'{label}: backfilled {updated} line(s)'))
@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import outbox
+from store.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = 'Inspect, retry and drain the transactional email outbox'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        ls = sub.add_parser('list', help='List recent emails')
+        ls.add_argument('--status', choices=[c[0] for c in EmailOutbox.STATUS_CHOICES])
+        ls.add_argument('--to', help='Recipient address')
+        ls.add_argument('--limit', type=int, default=25)
+
+        rt = sub.add_parser('retry', help='Queue emails to be sent again')
+        rt.add_argument('ids', nargs='*', type=int, help='Outbox row ids')
+        rt.add_argument('--failed', action='store_true', help='Retry every failed email')
+
+        dr = sub.add_parser('drain', help='Send due emails (run with --loop as a worker)')
+        dr.add_argument('--limit', type=int, default=None, help='Emails per pass (default EMAIL_OUTBOX_BATCH_SIZE)')
+        dr.add_argument('--loop', action='store_true', help='Keep polling instead of exiting after one pass')
+        dr.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _list(self, options):
+        qs = EmailOutbox.objects.all()
+        if options['status']:
+            qs = qs.filter(status=options['status'])
+        if options['to']:
+            qs = qs.filter(to__iexact=options['to'])
+        for entry in qs.order_by('-created_at')[:options['limit']]:
+            self.stdout.write(
+                f"{entry.id:>6}  {entry.created_at:%Y-%m-%d %H:%M:%S}  {entry.status:<8} x{entry.attempts:<2} "
+                f"{entry.to:<30} {entry.subject[:50]}"
+                + (f"  !! {entry.last_error[:80]}" if entry.last_error else '')
+            )
+
+    def _retry(self, options):
+        if options['failed']:
+            qs = EmailOutbox.objects.filter(status='failed')
+        elif options['ids']:
+            qs = EmailOutbox.objects.filter(id__in=options['ids'])
+        else:
+            raise CommandError('Give outbox ids or --failed')
+        self.stdout.write(f'Queued {outbox.retry(qs)} email(s) again')
+
+    def _drain(self, options):
+        limit = options['limit']
+        while True:
+            released = outbox.release_stale()
+            if released:
+                self.stdout.write(f'Released {released} stale email(s)')
+            started = time.perf_counter()
+            results = outbox.drain(limit)
+            sent = sum(results.values())
+            if results:
+                summary = ', '.join(f'{status}={count}' for status, count in sorted(results.items()))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'Handled {sent} email(s) in {elapsed:.1f}s: {summary}')
+            if not options['loop']:
+                break
+            # Go straight into the next pass when a full batch was handled
+            if sent < (limit or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', outbox.DEFAULT_BATCH_SIZE)):
+                time.sleep(options['interval'])
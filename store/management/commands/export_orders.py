@@ -0,0 +1,44 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.exports import DATASETS, FORMATS, InvalidCursor, export_orders, stream_export
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream orders or order lines as CSV or NDJSON (same filters as the admin Excel export)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS), help='orders, or items for order lines')
+        parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--status', choices=[c for c, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--start-date', help='Orders created on or after (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Orders created on or before (YYYY-MM-DD)')
+        parser.add_argument('--cursor', help='Resume after the order with this cursor (from the cursor column)')
+        parser.add_argument('--limit', type=int, help='Stop after this many orders')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('status', 'start_date', 'end_date') if options[key]}
+        for key in ('start_date', 'end_date'):
+            if key in params:
+                try:
+                    params[key] = date.fromisoformat(params[key])
+                except ValueError:
+                    raise CommandError(f"--{key.replace('_', '-')} must be YYYY-MM-DD")
+        if options['limit'] is not None and options['limit'] <= 0:
+            raise CommandError('--limit must be a positive integer')
+        try:
+            chunks = stream_export(options['dataset'], options['fmt'], export_orders(params),
+                                   cursor=options['cursor'], limit=options['limit'])
+        except InvalidCursor as exc:
+            raise CommandError(str(exc))
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time as dtime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from store.invoice_batch import init_worker, invoice_filename, render_chunk
+from store.models import Order
+
+
+def _day(value, end=False):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f'Cannot parse date {value!r}')
+    return timezone.make_aware(datetime.combine(day, dtime.max if end else dtime.min))
+
+
+class Command(BaseCommand):
+    help = 'Render invoice PDFs for orders in a date range or status, in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First order date (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--until', help='Last order date (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--status', action='append', choices=[c for c, _ in Order.STATUS_CHOICES],
+                            help='Order status to include; repeatable (default: any)')
+        parser.add_argument('--payment-status', default='paid',
+                            choices=[c for c, _ in Order.PAYMENT_STATUS_CHOICES] + ['any'],
+                            help="Payment status to include (default: paid)")
+        output = parser.add_mutually_exclusive_group()
+        output.add_argument('--output-dir', help='Also write one invoice-<order number>.pdf per order here')
+        output.add_argument('--zip', dest='zip_path', help='Also write every invoice into this zip file')
+        parser.add_argument('--force', action='store_true', help='Re-render invoices even when the stored file is current')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: CPU count; 0 renders in this process)')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Orders loaded per worker task (default 50)')
+
+    def handle(self, *args, **options):
+        qs = Order.objects.all()
+        if options['since']:
+            qs = qs.filter(created_at__gte=_day(options['since']))
+        if options['until']:
+            qs = qs.filter(created_at__lte=_day(options['until'], end=True))
+        if options['status']:
+            qs = qs.filter(status__in=options['status'])
+        if options['payment_status'] != 'any':
+            qs = qs.filter(payment_status=options['payment_status'])
+
+        mode = 'zip' if options['zip_path'] else 'files' if options['output_dir'] else 'store'
+        if mode == 'files':
+            os.makedirs(options['output_dir'], exist_ok=True)
+        chunk_size = max(1, options['chunk_size'])
+        workers = max(0, options['workers'])
+
+        self.total = qs.count()
+        if not self.total:
+            self.stdout.write(self.style.WARNING('No matching orders'))
+            return
+        self.stdout.write(f'Rendering {self.total} invoices with {workers or "no"} worker process(es)')
+        self.done, self.failed, self.bytes = 0, [], 0
+        self.started = self.last_report = time.perf_counter()
+
+        archive = zipfile.ZipFile(options['zip_path'], 'w', zipfile.ZIP_STORED) if mode == 'zip' else None
+        try:
+            chunks = self._chunks(qs, chunk_size)
+            task = (mode, options['output_dir'], options['force'])
+            if workers:
+                self._run_pool(chunks, task, workers, archive)
+            else:
+                for ids in chunks:
+                    self._collect(render_chunk(ids, *task), archive)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.perf_counter() - self.started
+        for number in self.failed[:20]:
+            self.stdout.write(self.style.ERROR(f'Failed: {number}'))
+        if len(self.failed) > 20:
+            self.stdout.write(self.style.ERROR(f'... and {len(self.failed) - 20} more'))
+        target = {'store': 'the invoice store', 'files': options['output_dir'], 'zip': options['zip_path']}[mode]
+        style = self.style.WARNING if self.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{self.done} invoices ({self.bytes / 1048576:.1f} MiB) to {target} in {elapsed:.1f}s '
+            f'({self.done / elapsed if elapsed else 0:.1f}/s), {len(self.failed)} failed'
+        ))
+
+    @staticmethod
+    def _chunks(qs, chunk_size):
+        # Ids only, streamed; workers load the orders themselves
+        chunk = []
+        for pk in qs.order_by('id').values_list('id', flat=True).iterator(chunk_size=2000):
+            chunk.append(pk)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _run_pool(self, chunks, task, workers, archive):
+        # 'spawn' so no child inherits this process's database connection
+        context = multiprocessing.get_context('spawn')
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'fishy_friend_aquatics.settings')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_worker, initargs=(settings_module,)) as pool:
+            pending = set()
+            for ids in chunks:
+                # Bounded queue: ids are read only as fast as workers render
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self._collect(future.result(), archive)
+                pending.add(pool.submit(render_chunk, ids, *task))
+            for future in pending:
+                self._collect(future.result(), archive)
+
+    def _collect(self, result, archive):
+        done, failed = result
+        for number, payload in done:
+            if archive is not None:
+                archive.writestr(invoice_filename(number), payload)
+                payload = len(payload)
+            self.bytes += payload
+        self.done += len(done)
+        self.failed.extend(failed)
+        now = time.perf_counter()
+        if now - self.last_report >= 2 or self.done + len(self.failed) >= self.total:
+            self.last_report = now
+            elapsed = now - self.started
+            self.stdout.write(f'{self.done + len(self.failed)}/{self.total} ({self.done / elapsed:.1f}/s)')
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_import import CatalogImport, read_rows
+from store.inventory import PRODUCT_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Create or update fish, accessories and plants (including stock and prices) from CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or .jsonl file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--type', choices=list(PRODUCT_MODELS), help="Product type for rows without a 'type' column")
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows written per transaction (default 1000)')
+        parser.add_argument('--update-only', action='store_true', help='Report unknown products instead of creating them')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and roll everything back')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+
+        importer = CatalogImport(
+            default_type=options['type'],
+            chunk_size=options['chunk_size'],
+            reference=os.path.basename(path) if path != '-' else 'stdin',
+            dry_run=options['dry_run'],
+            create=not options['update_only'],
+        )
+        started = time.perf_counter()
+        if path == '-':
+            stats = importer.run(read_rows(sys.stdin, fmt))
+        else:
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                stats = importer.run(read_rows(stream, fmt))
+        elapsed = time.perf_counter() - started
+
+        for error in importer.errors:
+            self.stdout.write(self.style.ERROR(error))
+        if stats['errors'] > len(importer.errors):
+            self.stdout.write(self.style.ERROR(f"... and {stats['errors'] - len(importer.errors)} more"))
+        summary = ', '.join(f'{key}={value}' for key, value in stats.items())
+        style = self.style.WARNING if stats['errors'] else self.style.SUCCESS
+        prefix = 'Dry run' if options['dry_run'] else 'Import'
+        self.stdout.write(style(f'{prefix} finished in {elapsed:.1f}s: {summary}'))
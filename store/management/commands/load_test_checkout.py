@@ -0,0 +1,287 @@
+"""Concurrent checkout load test against the MockProvider.
+
+Seeds a throwaway catalogue (fish, coupon, customers, all prefixed
+``loadtest``), then runs N simulated customers on threads. Each customer
+walks the real views through django.test.Client:
+
+    add_to_cart -> apply_coupon -> create_draft -> create_payment -> verify
+
+Reported per step: p50/p95/p99 latency, mean DB queries, time spent in
+``SELECT ... FOR UPDATE`` statements (row-lock waits on MySQL/PostgreSQL) and
+"database is locked" errors (SQLite). Afterwards it flags oversold stock and
+orders that received more than one invoice.
+
+Emails go to the locmem backend and invoices to a temporary MEDIA_ROOT, so
+nothing leaves the machine. Run against a development database only.
+"""
+import json
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import outbox as email_outbox, razorpay_integration
+from store.models import Breed, Category, Coupon, Fish, Order, OrderItem
+from store.payments import get_payment_provider
+
+PREFIX = 'loadtest'
+STEPS = ('add_to_cart', 'apply_coupon', 'create_draft', 'create_payment', 'verify')
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class _LockTimer:
+    """execute_wrapper that accumulates time spent in row-locking SELECTs."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.locked_errors = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        locking = 'FOR UPDATE' in sql.upper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except Exception as exc:
+            if 'locked' in str(exc).lower():
+                self.locked_errors += 1
+            raise
+        finally:
+            if locking:
+                self.seconds += time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent simulated checkouts with the MockProvider and report latency, queries and anomalies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Simulated customers (default 20)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Customers running at once (default 8)')
+        parser.add_argument('--fishes', type=int, default=3, help='Products in the seeded catalogue (default 3)')
+        parser.add_argument('--stock', type=int, default=None,
+                            help='Stock per product (default users // 2, so checkouts contend for stock)')
+        parser.add_argument('--quantity', type=int, default=1, help='Units each customer buys (default 1)')
+        parser.add_argument('--keep', action='store_true', help='Keep seeded rows after the run')
+
+    # ---- seeding ----------------------------------------------------------
+
+    def _seed(self, options):
+        User = get_user_model()
+        self._cleanup()
+        category, _ = Category.objects.get_or_create(name=f'{PREFIX} category', defaults={'category_type': 'fish'})
+        breed, _ = Breed.objects.get_or_create(name=f'{PREFIX} breed', category=category)
+        stock = options['stock'] if options['stock'] is not None else max(1, options['users'] // 2)
+        fishes = [
+            Fish.objects.create(
+                name=f'{PREFIX} fish {i}', category=category, breed=breed, description='Load test product',
+                price=Decimal('120.00'), weight=Decimal('0.100'), stock_quantity=stock,
+                minimum_order_quantity=1, is_available=True,
+            )
+            for i in range(max(1, options['fishes']))
+        ]
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code=f'{PREFIX.upper()}10', discount_percentage=Decimal('10'), coupon_type='all',
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1),
+        )
+        users = []
+        for i in range(options['users']):
+            user = User(username=f'{PREFIX}_user_{i}', email=f'{PREFIX}_{i}@example.invalid', role='customer',
+                        is_active=True, address='1 Test Street', phone_number='9999999999')
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith=f'{PREFIX}_user_').order_by('id'))
+        return fishes, coupon, users, stock
+
+    def _cleanup(self):
+        User = get_user_model()
+        User.objects.filter(username__startswith=f'{PREFIX}_user_').delete()
+        Coupon.objects.filter(code=f'{PREFIX.upper()}10').delete()
+        Fish.objects.filter(name__startswith=f'{PREFIX} fish').delete()
+        Category.objects.filter(name=f'{PREFIX} category').delete()
+
+    # ---- one simulated customer ---------------------------------------------
+
+    def _customer(self, index, user, fish, coupon, quantity, results, lock):
+        close_old_connections()
+        client = Client()
+        client.force_login(user)
+        xhr = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        timer = _LockTimer()
+        order_id = None
+        provider_order = None
+
+        def step(name, call, check=None):
+            with connection.execute_wrapper(timer), CaptureQueriesContext(connection) as queries:
+                locked_before, lock_before = timer.locked_errors, timer.seconds
+                start = time.perf_counter()
+                try:
+                    response = call()
+                    ok = response.status_code < 400 and (check is None or bool(check(response)))
+                except Exception:
+                    response, ok = None, False
+                elapsed = time.perf_counter() - start
+            with lock:
+                results[name].append({
+                    'seconds': elapsed,
+                    'queries': len(queries),
+                    'lock_seconds': timer.seconds - lock_before,
+                    'locked_errors': timer.locked_errors - locked_before,
+                    'ok': ok,
+                })
+            return response if ok else None
+
+        try:
+            if not step('add_to_cart', lambda: client.post(
+                    reverse('add_to_cart', args=[fish.id]), {'quantity': quantity}, **xhr)):
+                return
+            step('apply_coupon', lambda: client.post(reverse('apply_coupon'), {'coupon_code': coupon.code}, **xhr))
+            response = step('create_draft', lambda: client.post(reverse('create_draft_order'), {
+                'shipping_address': f'Customer {index}\n1 Test Street\nKochi',
+                'shipping_state': 'Kerala',
+                'shipping_pincode': '682001',
+                'phone_number': '9999999999',
+                'payment_method': 'card',
+            }, **xhr))
+            if not response:
+                return
+            order_id = response.json().get('order_id')
+            response = step('create_payment', lambda: client.post(reverse('create_razorpay_payment', args=[order_id])))
+            if not response:
+                return
+            payload = response.json()
+            provider_order = payload.get('provider_order_id') or payload.get('razorpay_order_id')
+            step('verify', lambda: client.post(reverse('verify_razorpay_payment'), data=json.dumps({
+                'razorpay_payment_id': f'mock_pay_{order_id}',
+                'razorpay_order_id': provider_order,
+                'razorpay_signature': 'mock',
+                'order_id': order_id,
+            }), content_type='application/json'), check=lambda r: r.json().get('success'))
+        finally:
+            close_old_connections()
+
+    # ---- run ----------------------------------------------------------------
+
+    def handle(self, *args, **options):
+        fishes, coupon, users, stock = self._seed(options)
+        initial_stock = {fish.id: stock for fish in fishes}
+        results = defaultdict(list)
+        lock = threading.Lock()
+        semaphore = threading.Semaphore(max(1, options['concurrency']))
+        mock = get_payment_provider('mock')
+
+        def run_one(i, user):
+            with semaphore:
+                self._customer(i, user, fishes[i % len(fishes)], coupon, options['quantity'], results, lock)
+
+        orig_get = razorpay_integration.get_payment_provider
+        media_root = tempfile.mkdtemp(prefix='loadtest-media-')
+        overrides = override_settings(
+            ALLOWED_HOSTS=['*'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            MEDIA_ROOT=media_root,
+            # Queued invoices are sent after the run, so SMTP time is not measured
+            EMAIL_OUTBOX_DISPATCH='none',
+            WEBHOOK_DISPATCH='none',
+            # create_razorpay_payment refuses to run without keys; the mock ignores them
+            RAZORPAY_KEY_ID='rzp_test_loadtest',
+            RAZORPAY_KEY_SECRET='loadtest',
+        )
+        try:
+            overrides.enable()
+            mail.outbox = []
+            razorpay_integration.get_payment_provider = lambda name=None: mock
+            threads = [threading.Thread(target=run_one, args=(i, user)) for i, user in enumerate(users)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - started
+            while sum(email_outbox.drain().values()):
+                pass
+            outbox = list(mail.outbox)
+        finally:
+            razorpay_integration.get_payment_provider = orig_get
+            overrides.disable()
+
+        self._report(results, wall, options)
+        self._check(fishes, initial_stock, users, outbox)
+
+        if not options['keep']:
+            self._cleanup()
+        self.stdout.write(f'Invoices written to {media_root}')
+
+    def _report(self, results, wall, options):
+        completed = sum(1 for r in results['verify'] if r['ok'])
+        self.stdout.write(
+            f"\n{options['users']} customers, concurrency {options['concurrency']}: "
+            f"{completed} paid checkouts in {wall:.2f}s ({completed / wall if wall else 0:.1f} checkouts/s)\n"
+        )
+        self.stdout.write(f"{'step':<15}{'n':>5}{'fail':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                          f"{'queries':>9}{'lock ms':>10}{'locked':>8}")
+        for name in STEPS:
+            rows = results.get(name, [])
+            if not rows:
+                continue
+            ms = [r['seconds'] * 1000 for r in rows]
+            self.stdout.write(
+                f"{name:<15}{len(rows):>5}{sum(1 for r in rows if not r['ok']):>6}"
+                f"{statistics.median(ms):>10.1f}{_percentile(ms, 95):>10.1f}{_percentile(ms, 99):>10.1f}"
+                f"{statistics.mean(r['queries'] for r in rows):>9.1f}"
+                f"{sum(r['lock_seconds'] for r in rows) * 1000:>10.1f}"
+                f"{sum(r['locked_errors'] for r in rows):>8}"
+            )
+
+    def _check(self, fishes, initial_stock, users, outbox):
+        problems = []
+        paid = Order.objects.filter(user__in=users, payment_status='paid')
+        sold = dict(
+            OrderItem.objects.filter(order__in=paid, fish__in=fishes)
+            .values_list('fish_id').annotate(total=Sum('quantity'))
+        )
+        for fish in Fish.objects.filter(id__in=[f.id for f in fishes]):
+            units = sold.get(fish.id, 0)
+            if units > initial_stock[fish.id] or fish.stock_quantity < 0:
+                problems.append(
+                    f'OVERSOLD {fish.name}: stock {initial_stock[fish.id]}, sold {units}, now {fish.stock_quantity}'
+                )
+
+        invoices = defaultdict(int)
+        numbers = set(paid.values_list('order_number', flat=True))
+        for message in outbox:
+            for number in numbers:
+                if number in message.subject and 'Invoice' in message.subject:
+                    invoices[number] += 1
+        for number, count in sorted(invoices.items()):
+            if count > 1:
+                problems.append(f'DUPLICATE INVOICE {number}: {count} emails')
+        missing = numbers - set(invoices)
+        if missing:
+            problems.append(f'{len(missing)} paid order(s) without an invoice email')
+
+        self.stdout.write('')
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS('No oversold stock or duplicate invoices detected'))
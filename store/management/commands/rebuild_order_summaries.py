@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from store.models import Order, OrderSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the OrderSummary rows used by the customer order history page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Orders loaded per batch (default 200)')
+        parser.add_argument('--missing-only', action='store_true', help='Only build summaries for paid orders that have none')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        if options['missing_only']:
+            qs = Order.objects.filter(payment_status='paid', summary__isnull=True)
+        else:
+            # Orders refunded after payment keep their summary, so refresh those too
+            qs = Order.objects.filter(Q(payment_status='paid') | Q(summary__isnull=False))
+
+        total = qs.count()
+        done = 0
+        last_id = 0
+        while True:
+            chunk = list(qs.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not chunk:
+                break
+            for order in chunk:
+                OrderSummary.refresh_for(order)
+            done += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f'{done}/{total}')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {done} order summaries'))
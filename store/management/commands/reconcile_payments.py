@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from store.reconciliation import reconcile_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Finalize pending orders that the payment provider reports as paid (missed webhooks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', help='Payment provider name (default PAYMENT_PROVIDER)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Orders loaded per page (default 100)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent provider requests (default 4)')
+        parser.add_argument('--min-age-minutes', type=int, default=10,
+                            help='Skip orders younger than this; their webhook may still arrive (default 10)')
+        parser.add_argument('--max-age-days', type=int, default=7, help='Ignore orders older than this (default 7)')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after checking this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='Report paid orders without finalizing them')
+
+    def handle(self, *args, **options):
+        stats = reconcile_pending_orders(
+            provider_name=options['provider'],
+            batch_size=max(1, options['batch_size']),
+            workers=max(1, options['workers']),
+            min_age=timedelta(minutes=options['min_age_minutes']),
+            max_age=timedelta(days=options['max_age_days']),
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f'{key}={value}' for key, value in stats.items())
+        style = self.style.WARNING if stats['errors'] else self.style.SUCCESS
+        self.stdout.write(style(f'Reconciliation complete: {summary}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Delete expired draft-order stock reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement (default 1000)')
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired stock reservations'))
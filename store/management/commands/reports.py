@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import reports
+from store.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = 'List, build and prune background admin reports'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        ls = sub.add_parser('list', help='List recent reports')
+        ls.add_argument('--status', choices=[c[0] for c in ReportJob.STATUS_CHOICES])
+        ls.add_argument('--limit', type=int, default=25)
+
+        bd = sub.add_parser('build', help='Build queued reports (run with --pending --loop as a worker)')
+        bd.add_argument('ids', nargs='*', type=int, help='Report ids')
+        bd.add_argument('--pending', action='store_true', help='Build every queued report')
+        bd.add_argument('--workers', type=int, default=None, help='Processes per report (default REPORT_WORKERS)')
+        bd.add_argument('--loop', action='store_true', help='Keep polling with --pending instead of exiting')
+        bd.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+        sub.add_parser('prune', help='Fail stalled builds and delete expired reports')
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _list(self, options):
+        qs = ReportJob.objects.all()
+        if options['status']:
+            qs = qs.filter(status=options['status'])
+        for job in qs.order_by('-created_at')[:options['limit']]:
+            self.stdout.write(
+                f"{job.id:>6}  {job.created_at:%Y-%m-%d %H:%M:%S}  {job.kind:<14} {job.status:<8} "
+                f"{job.parts_done}/{job.parts_total} parts  {job.row_count:>8} rows  {job.file_path}"
+                + (f"  !! {job.error[:80]}" if job.error else '')
+            )
+
+    def _build(self, options):
+        if not options['ids'] and not options['pending']:
+            raise CommandError('Give report ids or --pending')
+        while True:
+            if options['pending']:
+                ids = list(ReportJob.objects.filter(status='queued').order_by('created_at')
+                           .values_list('id', flat=True))
+            else:
+                ids = options['ids']
+            for job_id in ids:
+                job = reports.build(job_id, workers=options['workers'])
+                if job is None:
+                    self.stdout.write(f'Report {job_id} is not queued; skipped')
+                elif job.status == 'failed':
+                    self.stderr.write(f'Report {job.id} failed: {job.error}')
+                else:
+                    elapsed = (job.finished_at - job.started_at).total_seconds()
+                    self.stdout.write(f'Built report {job.id} ({job.kind}): {job.row_count} rows in {elapsed:.1f}s')
+            if not (options['loop'] and options['pending']):
+                break
+            if not ids:
+                time.sleep(options['interval'])
+
+    def _prune(self, options):
+        failed = reports.fail_stale()
+        removed, _ = reports.prune_expired()
+        self.stdout.write(f'Marked {failed} stalled report(s) failed; deleted {removed} expired report(s)')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store import maintenance
+from store.models import MaintenanceJob
+
+
+def _interval(delta):
+    seconds = int(delta.total_seconds())
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f'{seconds // size}{unit}'
+    return f'{seconds}s'
+
+
+class Command(BaseCommand):
+    help = 'Run the due maintenance jobs (expired sessions, cache rows, OTPs, old notifications, stale drafts); for cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('jobs', nargs='*', help='Only these jobs (default: all that are due)')
+        parser.add_argument('--list', action='store_true', help='Show the jobs and their last run, then exit')
+        parser.add_argument('--force', action='store_true', help='Run the jobs even if they are not due')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows deleted per statement (default MAINTENANCE_BATCH_SIZE)')
+        parser.add_argument('--job-budget', type=float, default=None,
+                            help='Seconds each job may run (default MAINTENANCE_JOB_BUDGET)')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Seconds for the whole run; jobs left over wait for the next run')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self._list()
+        try:
+            results = maintenance.run_due(
+                names=options['jobs'], force=options['force'], batch_size=options['batch_size'],
+                job_budget=options['job_budget'], total_budget=options['budget'],
+            )
+        except KeyError as exc:
+            raise CommandError(exc.args[0])
+        for result in results:
+            line = f"{result['name']:<14} removed {result['removed']:>7} rows in {result['duration']:.2f}s"
+            if result['error']:
+                self.stdout.write(self.style.ERROR(f"{line}  failed: {result['error'][:100]}"))
+            elif not result['finished']:
+                self.stdout.write(self.style.WARNING(f'{line}  (budget reached, continues next run)'))
+            else:
+                self.stdout.write(line)
+        if not results:
+            self.stdout.write('No maintenance jobs due')
+
+    def _list(self):
+        states = {state.name: state for state in MaintenanceJob.objects.all()}
+        now = timezone.now()
+        for entry in maintenance.registered_jobs():
+            state = states.get(entry.name)
+            if state is None or state.last_run_at is None:
+                last, due = 'never run', 'due'
+            else:
+                last = (f'{state.last_run_at:%Y-%m-%d %H:%M} removed {state.last_removed} '
+                        f'in {state.last_duration:.2f}s' + (' (failed)' if state.last_error else ''))
+                due = 'due' if state.next_run_at <= now else f'next {state.next_run_at:%Y-%m-%d %H:%M}'
+            self.stdout.write(f'{entry.name:<14} every {_interval(entry.every):<4} {due:<22} {last}  - {entry.description}')
@@ -0,0 +1,94 @@
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import task_queue
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks from the database (TASK_BACKEND=db) in a thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Tasks run at once (default TASK_WORKER_THREADS)')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--lease', type=int, default=None,
+                            help='Seconds a task stays leased without a heartbeat (default TASK_LEASE_SECONDS)')
+        parser.add_argument('--keep-days', type=int, default=7, help='Delete finished tasks older than this')
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due, then exit')
+        parser.add_argument('--no-schedule', action='store_true',
+                            help='Do not queue the periodic CELERY_BEAT_SCHEDULE tasks (TASK_BACKEND=db)')
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'] or getattr(settings, 'TASK_WORKER_THREADS', 4))
+        lease = options['lease'] or getattr(settings, 'TASK_LEASE_SECONDS', task_queue.DEFAULT_LEASE_SECONDS)
+        interval = options['interval']
+        worker = task_queue.worker_name()
+        task_queue.autodiscover()
+
+        self.stop = threading.Event()
+        if not options['once']:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, self._request_stop)
+        if task_queue.backend() != 'db':
+            self.stdout.write(self.style.WARNING(
+                f'TASK_BACKEND is {task_queue.backend()!r}; only tasks already in the table will run'
+            ))
+        self.stdout.write(f'Worker {worker} running with {threads} thread(s)')
+
+        # Under 'db' there is no Celery beat; the workers queue its schedule
+        schedule = task_queue.backend() == 'db' and not options['no_schedule']
+
+        counts = {}
+        running = {}
+        last_heartbeat = last_purge = 0.0
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='task') as pool:
+            while not self.stop.is_set():
+                now = time.monotonic()
+                if now - last_heartbeat >= lease / 3:
+                    last_heartbeat = now
+                    task_queue.extend_leases([t.id for t in running.values()], worker, lease)
+                    released = task_queue.release_expired()
+                    if released:
+                        self.stdout.write(f'Requeued {released} task(s) with an expired lease')
+                if now - last_purge >= 3600:
+                    last_purge = now
+                    task_queue.purge(timedelta(days=options['keep_days']))
+                if schedule:
+                    queued = task_queue.enqueue_periodic()
+                    if queued:
+                        self.stdout.write(f"Queued periodic task(s): {', '.join(queued)}")
+
+                claimed = task_queue.claim(worker, threads - len(running), lease)
+                for task in claimed:
+                    running[pool.submit(task_queue.run_task, task)] = task
+                if not running:
+                    if options['once']:
+                        break
+                    self.stop.wait(interval)
+                    continue
+
+                finished, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    status = future.result()
+                    counts[status] = counts.get(status, 0) + 1
+                    if status != 'done':
+                        self.stdout.write(self.style.WARNING(f'{task.name} #{task.id}: {status}'))
+
+            if running:
+                self.stdout.write(f'Stopping after {len(running)} running task(s) finish')
+                for future, task in running.items():
+                    status = future.result()
+                    counts[status] = counts.get(status, 0) + 1
+
+        summary = ', '.join(f'{status}={count}' for status, count in sorted(counts.items())) or 'no tasks'
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} stopped: {summary}'))
+
+    def _request_stop(self, signum, frame):
+        self.stop.set()
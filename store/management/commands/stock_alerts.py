@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.stock_alerts import evaluate_stock_alerts, prune_notifications
+
+
+class Command(BaseCommand):
+    help = 'Evaluate low/out-of-stock alerts for the whole catalogue and prune old read notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-prune', action='store_true', help='Only evaluate alerts')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Keep read notifications this long (default NOTIFICATION_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        stats = evaluate_stock_alerts()
+        self.stdout.write(
+            f"Checked {stats['checked']} products: {stats['new']} new, {stats['updated']} updated, "
+            f"{stats['resolved']} resolved alerts" + (' (rolled into a digest)' if stats['digest'] else '')
+        )
+        if not options['no_prune']:
+            pruned = prune_notifications(options['retention_days'])
+            self.stdout.write(f'Pruned {pruned} read notifications')
+        self.stdout.write(self.style.SUCCESS('Done'))
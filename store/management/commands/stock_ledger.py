@@ -0,0 +1,76 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from store.inventory import PRODUCT_MODELS, ledger_drift, record_movements, stock_at, take_stock_snapshot
+from store.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = 'Inspect the stock movement ledger, take snapshots and check the stock columns against it'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        sub.add_parser('snapshot', help='Snapshot the ledger balance of every product')
+
+        hist = sub.add_parser('history', help='List the movements of one product')
+        hist.add_argument('product_type', choices=list(PRODUCT_MODELS))
+        hist.add_argument('product_id', type=int)
+        hist.add_argument('--limit', type=int, default=25)
+
+        at = sub.add_parser('at', help='Stock per product at a point in time')
+        at.add_argument('product_type', choices=list(PRODUCT_MODELS))
+        at.add_argument('when', help='ISO date or datetime')
+        at.add_argument('product_ids', nargs='*', type=int, help='Products to report (default all)')
+
+        verify = sub.add_parser('verify', help='Compare stock_quantity with the ledger')
+        verify.add_argument('--fix', action='store_true',
+                            help='Record correction movements so the ledger matches stock_quantity')
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _snapshot(self, options):
+        written = take_stock_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stock snapshots'))
+
+    def _history(self, options):
+        movements = StockMovement.objects.filter(
+            product_type=options['product_type'], product_id=options['product_id'],
+        ).order_by('-created_at', '-id')[:options['limit']]
+        for mv in movements:
+            self.stdout.write(f"{mv.created_at:%Y-%m-%d %H:%M:%S}  {mv.delta:+6d}  {mv.reason:<11} {mv.reference}")
+
+    def _at(self, options):
+        when = parse_datetime(options['when'])
+        if when is None:
+            day = parse_date(options['when'])
+            if day is None:
+                raise CommandError(f"Cannot parse {options['when']!r}")
+            # A bare date means the end of that day
+            when = datetime.combine(day, time.max)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        balances = stock_at(options['product_type'], options['product_ids'] or None, when)
+        for pk, quantity in sorted(balances.items()):
+            self.stdout.write(f'{pk:>6}  {quantity}')
+
+    def _verify(self, options):
+        total = 0
+        for product_type in PRODUCT_MODELS:
+            with transaction.atomic():
+                drift = ledger_drift(product_type)
+                for pk, name, stock, ledger in drift:
+                    self.stdout.write(self.style.ERROR(f'{product_type} {pk} {name}: stock {stock}, ledger {ledger}'))
+                if drift and options['fix']:
+                    record_movements(product_type, {pk: stock - ledger for pk, _, stock, ledger in drift},
+                                     'correction', 'stock_ledger verify')
+            total += len(drift)
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Stock columns match the ledger'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Recorded {total} correction movements'))
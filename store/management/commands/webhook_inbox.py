@@ -0,0 +1,102 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import webhooks
+from store.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = 'Inspect, replay and drain the payment webhook inbox'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        ls = sub.add_parser('list', help='List recent events')
+        ls.add_argument('--status', choices=[c[0] for c in WebhookEvent.STATUS_CHOICES])
+        ls.add_argument('--type', dest='event_type')
+        ls.add_argument('--limit', type=int, default=25)
+
+        show = sub.add_parser('show', help='Print one event with its payload')
+        show.add_argument('event', help='Inbox row id or provider event id')
+
+        rp = sub.add_parser('replay', help='Queue events to be processed again')
+        rp.add_argument('events', nargs='*', help='Inbox row ids or provider event ids')
+        rp.add_argument('--failed', action='store_true', help='Replay every failed event')
+        rp.add_argument('--now', action='store_true', help='Process the replayed events immediately')
+
+        dr = sub.add_parser('drain', help='Process due events (run with --loop as a worker)')
+        dr.add_argument('--limit', type=int, default=100, help='Events per pass')
+        dr.add_argument('--concurrency', type=int, default=None, help='Worker threads (default WEBHOOK_WORKER_CONCURRENCY)')
+        dr.add_argument('--loop', action='store_true', help='Keep polling instead of exiting after one pass')
+        dr.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _lookup(self, ref):
+        qs = WebhookEvent.objects.filter(event_id=ref)
+        if ref.isdigit():
+            qs = qs | WebhookEvent.objects.filter(id=int(ref))
+        return qs
+
+    def _list(self, options):
+        qs = WebhookEvent.objects.all()
+        if options['status']:
+            qs = qs.filter(status=options['status'])
+        if options['event_type']:
+            qs = qs.filter(event_type=options['event_type'])
+        for ev in qs.order_by('-received_at')[:options['limit']]:
+            self.stdout.write(
+                f"{ev.id:>6}  {ev.received_at:%Y-%m-%d %H:%M:%S}  {ev.status:<10} x{ev.attempts:<2} "
+                f"{ev.event_type:<18} {ev.event_id}"
+                + (f"  !! {ev.last_error[:80]}" if ev.last_error else '')
+            )
+
+    def _show(self, options):
+        ev = self._lookup(options['event']).first()
+        if ev is None:
+            raise CommandError(f"No webhook event {options['event']!r}")
+        self.stdout.write(f'id:            {ev.id}')
+        self.stdout.write(f'provider:      {ev.provider}')
+        self.stdout.write(f'event_id:      {ev.event_id}')
+        self.stdout.write(f'event_type:    {ev.event_type}')
+        self.stdout.write(f'status:        {ev.status} (attempts {ev.attempts})')
+        self.stdout.write(f'received_at:   {ev.received_at}')
+        self.stdout.write(f'next_attempt:  {ev.next_attempt_at}')
+        self.stdout.write(f'processed_at:  {ev.processed_at}')
+        if ev.last_error:
+            self.stdout.write(f'last_error:    {ev.last_error}')
+        self.stdout.write(json.dumps(ev.payload, indent=2, sort_keys=True))
+
+    def _replay(self, options):
+        if options['failed']:
+            qs = WebhookEvent.objects.filter(status='failed')
+        elif options['events']:
+            qs = WebhookEvent.objects.none()
+            for ref in options['events']:
+                qs = qs | self._lookup(ref)
+        else:
+            raise CommandError('Give event ids or --failed')
+        ids = list(qs.exclude(status='processing').values_list('id', flat=True))
+        count = webhooks.replay(WebhookEvent.objects.filter(id__in=ids))
+        self.stdout.write(f'Queued {count} event(s) for replay')
+        if options['now']:
+            for event_id in ids:
+                self.stdout.write(f'{event_id}: {webhooks.process_event(event_id)}')
+
+    def _drain(self, options):
+        while True:
+            released = webhooks.release_stale()
+            if released:
+                self.stdout.write(f'Released {released} stale event(s)')
+            results = webhooks.drain(limit=options['limit'], concurrency=options['concurrency'])
+            if results:
+                summary = ', '.join(f'{status}={count}' for status, count in sorted(results.items(), key=str))
+                self.stdout.write(f'Processed {sum(results.values())} event(s): {summary}')
+            if not options['loop']:
+                break
+            # Go straight into the next pass when a full batch was handled
+            if sum(results.values()) < options['limit']:
+                time.sleep(options['interval'])
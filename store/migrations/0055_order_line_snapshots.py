@@ -0,0 +1,119 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0030_alter_accessory_show_as_banner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='breed_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='category_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='product_image',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='sku_type',
+            field=models.CharField(blank=True, choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='unit_weight',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='breed_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='category_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='sku_type',
+            field=models.CharField(blank=True, choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_weight',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='breed_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='category_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='product_image',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='sku_type',
+            field=models.CharField(blank=True, choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='unit_weight',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AlterField(
+            model_name='orderaccessoryitem',
+            name='accessory',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.accessory'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='fish',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.fish'),
+        ),
+        migrations.AlterField(
+            model_name='orderplantitem',
+            name='plant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='store.plant'),
+        ),
+    ]
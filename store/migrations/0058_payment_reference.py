@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_references(apps, schema_editor):
+    """Index the references of existing orders, oldest first.
+
+    When a value was issued to more than one order the first one keeps it,
+    matching PaymentReference.record().
+    """
+    Order = apps.get_model('store', 'Order')
+    PaymentReference = apps.get_model('store', 'PaymentReference')
+    seen = set()
+    batch = []
+    rows = Order.objects.order_by('id').values_list('id', 'order_number', 'provider_order_id', 'transaction_id')
+    for order_id, order_number, provider_order_id, transaction_id in rows.iterator(chunk_size=2000):
+        for kind, value in (
+            ('order_number', (order_number or '').strip().upper()),
+            ('provider_order', (provider_order_id or '').strip()),
+            ('payment', (transaction_id or '').strip()),
+        ):
+            value = value[:200]
+            if not value or (kind, value) in seen:
+                continue
+            seen.add((kind, value))
+            batch.append(PaymentReference(kind=kind, value=value, order_id=order_id))
+        if len(batch) >= 1000:
+            PaymentReference.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        PaymentReference.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0057_webhook_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('provider_order', 'Provider order id'), ('payment', 'Payment id'), ('order_number', 'Order number')], max_length=20)),
+                ('value', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_references', to='store.order')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='paymentreference',
+            constraint=models.UniqueConstraint(fields=('kind', 'value'), name='store_paymentref_kind_value_uniq'),
+        ),
+        migrations.RunPython(backfill_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0058_payment_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='provider_order_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='provider_order_payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0059_provider_order_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], max_length=20)),
+                ('product_id', models.PositiveIntegerField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='store.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product_type', 'product_id', 'expires_at', 'quantity'], name='store_stockres_product_idx'), models.Index(fields=['expires_at'], name='store_stockres_expires_idx')],
+            },
+        ),
+    ]
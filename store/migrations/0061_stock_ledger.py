@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def open_ledger(apps, schema_editor):
+    """Record current stock as each product's opening movement and snapshot."""
+    StockMovement = apps.get_model('store', 'StockMovement')
+    StockSnapshot = apps.get_model('store', 'StockSnapshot')
+    now = django.utils.timezone.now()
+    for product_type, model_name in (('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')):
+        movements, snapshots = [], []
+        rows = apps.get_model('store', model_name).objects.order_by('id').values_list('id', 'stock_quantity')
+        for product_id, stock in rows.iterator(chunk_size=2000):
+            stock = int(stock or 0)
+            if stock:
+                movements.append(StockMovement(product_type=product_type, product_id=product_id, delta=stock,
+                                               reason='initial', reference='ledger opening', created_at=now))
+            snapshots.append(StockSnapshot(product_type=product_type, product_id=product_id, quantity=stock, taken_at=now))
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+        StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0060_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], max_length=20)),
+                ('product_id', models.PositiveIntegerField()),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('initial', 'Opening stock'), ('adjustment', 'Manual adjustment'), ('order', 'Order'), ('import', 'Import'), ('correction', 'Ledger correction')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(choices=[('fish', 'Fish'), ('accessory', 'Accessory'), ('plant', 'Plant')], max_length=20)),
+                ('product_id', models.PositiveIntegerField()),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('product_type', 'product_id', 'taken_at'), name='store_stocksnap_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product_type', 'product_id', 'created_at'], name='store_stockmove_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['created_at'], name='store_stockmove_created_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:57
+
+from django.db import migrations, models
+
+
+def retire_unkeyed_stock_alerts(apps, schema_editor):
+    """Mark pre-existing unread stock alerts read.
+
+    They carry no condition key, so the first evaluation would duplicate
+    them; it re-raises keyed alerts for products that are still low.
+    """
+    Notification = apps.get_model('store', 'Notification')
+    Notification.objects.filter(
+        is_read=False, key__isnull=True, level__in=['warning', 'critical'], title__contains='stock',
+    ).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0061_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'created_at'], name='store_notif_unread_idx'),
+        ),
+        migrations.RunPython(retire_unkeyed_stock_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:54
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+LINE_PRODUCTS = (
+    ('OrderItem', 'fish'),
+    ('OrderAccessoryItem', 'accessory'),
+    ('OrderPlantItem', 'plant'),
+)
+
+
+def copy_size_and_summary(apps, schema_editor):
+    """Fill the new columns from products that still exist.
+
+    Only these two columns are written, so existing name/breed/category
+    snapshots are left as they were captured.
+    """
+    for model_name, product_field in LINE_PRODUCTS:
+        model = apps.get_model('store', model_name)
+        qs = model.objects.exclude(**{f'{product_field}__isnull': True}).select_related(product_field).order_by('id')
+        last_id = 0
+        while True:
+            chunk = list(qs.filter(id__gt=last_id)[:500])
+            if not chunk:
+                break
+            for line in chunk:
+                product = getattr(line, product_field)
+                line.product_size = getattr(product, 'size', None)
+                line.product_summary = Truncator(product.description or '').words(30)[:300]
+            model.objects.bulk_update(chunk, ['product_size', 'product_summary'])
+            last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0067_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='product_size',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderaccessoryitem',
+            name='product_summary',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_size',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_summary',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='product_size',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderplantitem',
+            name='product_summary',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.RunPython(copy_size_and_summary, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,17 @@
 from django.db import models
-from django.conf import settings
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+import os
 import random
 import string
 from urllib.parse import urlparse, parse_qs
 from decimal import Decimal
-from django.utils.text import slugify
+from django.utils.text import Truncator, slugify
+
+from .tracking import FieldTrackerMixin
 
 
 class CustomUserManager(UserManager):
@@ -19,8 +21,9 @@ class CustomUserManager(UserManager):
         return super().create_superuser(username, email=email, password=password, **extra_fields)
 
 
-class CustomUser(AbstractUser):
+class CustomUser(FieldTrackerMixin, AbstractUser):
     objects = CustomUserManager()
+    tracked_fields = ('role',)
     ROLE_CHOICES = [
         ('customer', 'Customer'),
         ('staff', 'Staff'),
@@ -168,7 +171,9 @@ class Breed(models.Model):
         return f"{self.name} ({self.category.name})"
 
 
-class Fish(models.Model):
+class Fish(FieldTrackerMixin, models.Model):
+    tracked_fields = ('stock_quantity',)
+
     name = models.CharField(max_length=200)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='fishes')
     breed = models.ForeignKey(Breed, on_delete=models.CASCADE, related_name='fishes')
@@ -203,64 +208,33 @@ class Notification(models.Model):
     level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='info')
     # Optional related fish
     fish = models.ForeignKey(Fish, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    # Condition key of stock alerts ("stock:<type>:<id>:<low|out>"), released
+    # once the condition clears; see store.stock_alerts
+    key = models.CharField(max_length=100, null=True, blank=True, unique=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread count and dropdown in global_flags
+            models.Index(fields=['is_read', 'created_at'], name='store_notif_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.level})"
 
 
-# Signals to create notifications when fish stock changes
-@receiver(pre_save, sender=Fish)
-def fish_pre_save(sender, instance, **kwargs):
-    if not instance.pk:
-        instance._previous_stock = None
-        return
-    try:
-        prev = sender.objects.get(pk=instance.pk)
-        instance._previous_stock = prev.stock_quantity
-    except sender.DoesNotExist:
-        instance._previous_stock = None
-
-
+# Signals to record fish stock changes and queue stock alerts
 @receiver(post_save, sender=Fish)
 def fish_post_save(sender, instance, created, **kwargs):
     # Automatically set is_available to False when stock is 0
     if instance.stock_quantity == 0 and instance.is_available:
         Fish.objects.filter(pk=instance.pk).update(is_available=False)
     
-    # Only care about updates for notifications
-    if created:
-        return
-
-    prev = getattr(instance, '_previous_stock', None)
-    curr = instance.stock_quantity or 0
-    threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
-
-    # Out of stock
-    if curr <= 0 and (prev is None or prev > 0):
-        # avoid duplicate unread critical notification for same fish
-        exists = Notification.objects.filter(fish=instance, level='critical', is_read=False).exists()
-        if not exists:
-            Notification.objects.create(
-                title=f"{instance.name} is out of stock",
-                message=f"{instance.name} has run out of stock.",
-                level='critical',
-                fish=instance,
-            )
-    # Low stock threshold crossed
-    elif curr <= threshold and (prev is None or (prev is not None and prev > threshold)):
-        exists = Notification.objects.filter(fish=instance, level='warning', is_read=False).exists()
-        if not exists:
-            Notification.objects.create(
-                title=f"{instance.name} stock is low",
-                message=f"{instance.name} stock is low (only {curr} left).",
-                level='warning',
-                fish=instance,
-            )
-
-
+    from .inventory import record_stock_edit
+    from .stock_alerts import queue_stock_alerts
+    record_stock_edit(sender, instance, created, kwargs.get('update_fields'))
+    if created or instance.has_changed('stock_quantity'):
+        queue_stock_alerts('fish', [instance.pk])
 
 
 class FishMedia(models.Model):
@@ -429,7 +403,10 @@ class AccessoryCart(models.Model):
         return self.accessory.price * self.quantity
 
 
-class Order(models.Model):
+class Order(FieldTrackerMixin, models.Model):
+    # Read by the payment/invoice/summary signals in store.signals
+    tracked_fields = ('status', 'payment_status', 'order_number', 'provider_order_id', 'transaction_id')
+
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('processing', 'Processing'),
@@ -466,6 +443,16 @@ class Order(models.Model):
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     # Provider's order id (e.g., Stripe PaymentIntent id or other provider id)
     provider_order_id = models.CharField(max_length=200, blank=True, null=True)
+    # Client payload returned when the provider order was created; reused while
+    # amount and currency still match and PROVIDER_ORDER_TTL has not elapsed
+    provider_order_payload = models.JSONField(blank=True, null=True)
+    provider_order_created_at = models.DateTimeField(blank=True, null=True)
+    # Stored invoice PDF (see store.invoices): path relative to MEDIA_ROOT and
+    # the SHA-256 of the invoice content it was rendered from
+    invoice_path = models.CharField(max_length=255, blank=True, default='')
+    invoice_hash = models.CharField(max_length=64, blank=True, default='')
+    invoice_size = models.PositiveIntegerField(blank=True, null=True)
+    invoice_generated_at = models.DateTimeField(blank=True, null=True)
     shipping_address = models.TextField(blank=True, null=True)
     shipping_state = models.CharField(max_length=100, blank=True)
     shipping_pincode = models.CharField(max_length=20, blank=True)
@@ -485,14 +472,11 @@ class Order(models.Model):
 
     @property
     def invoice_url(self):
+        # The download view renders the PDF on demand, so no filesystem check
         if self.payment_status != 'paid':
             return None
-        from django.conf import settings
-        import os
-        invoice_path = os.path.join(settings.MEDIA_ROOT, 'invoices', f'invoice-{self.order_number}.pdf')
-        if os.path.exists(invoice_path):
-            return settings.MEDIA_URL + f'invoices/invoice-{self.order_number}.pdf'
-        return None
+        from django.urls import reverse
+        return reverse('download_invoice', args=[self.pk])
 
 
 class ShippingChargeSetting(models.Model):
@@ -541,43 +525,569 @@ class ShippingChargeByLocation(models.Model):
         return f"{status} {self.location_name} - ₹{self.shipping_charge}"
 
 
-class OrderItem(models.Model):
+def summarize_description(text):
+    """The first 30 words of a product description, as stored on order lines."""
+    return Truncator(text or '').words(30)[:300]
+
+
+class OrderLineSnapshot(models.Model):
+    """Product details copied onto an order line when it is created.
+
+    Invoices, emails, exports and order pages read these columns instead of
+    joining back to the product, so renaming or deleting a product does not
+    rewrite historical orders.
+    """
+    SKU_TYPE_CHOICES = [
+        ('fish', 'Fish'),
+        ('accessory', 'Accessory'),
+        ('plant', 'Plant'),
+    ]
+
+    product_name = models.CharField(max_length=200, blank=True, default='')
+    breed_name = models.CharField(max_length=100, blank=True, default='')
+    category_name = models.CharField(max_length=100, blank=True, default='')
+    sku_type = models.CharField(max_length=20, choices=SKU_TYPE_CHOICES, blank=True, default='')
+    unit_weight = models.DecimalField(max_digits=6, decimal_places=3, null=True, blank=True)
+    product_image = models.CharField(max_length=255, blank=True, default='')
+    # Size in inches (fish only) and the start of the product description
+    product_size = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    product_summary = models.CharField(max_length=300, blank=True, default='')
+
+    # Name of the product foreign key on the concrete line model
+    product_field = None
+    sku = None
+
+    class Meta:
+        abstract = True
+
+    def get_product(self):
+        return getattr(self, self.product_field, None)
+
+    def capture_snapshot(self, product=None):
+        """Copy name/breed/category/weight/image/size/summary from `product` onto the line."""
+        product = product or self.get_product()
+        if product is None:
+            return
+        breed = getattr(product, 'breed', None)
+        category = getattr(product, 'category', None)
+        self.product_name = (product.name or '')[:200]
+        self.breed_name = (breed.name if breed else '')[:100]
+        self.category_name = (category.name if category else '')[:100]
+        self.sku_type = self.sku
+        self.unit_weight = getattr(product, 'weight', None)
+        image = getattr(product, 'image', None)
+        self.product_image = image.name if image else ''
+        self.product_size = getattr(product, 'size', None)
+        self.product_summary = summarize_description(getattr(product, 'description', ''))
+
+    def save(self, *args, **kwargs):
+        if not self.product_name:
+            self.capture_snapshot()
+        super().save(*args, **kwargs)
+
+    @property
+    def display_name(self):
+        if self.product_name:
+            return self.product_name
+        product = self.get_product()
+        return product.name if product else 'Deleted product'
+
+    @property
+    def image_url(self):
+        if not self.product_image:
+            return None
+        from django.core.files.storage import default_storage
+        try:
+            return default_storage.url(self.product_image)
+        except Exception:
+            return None
+
+    def get_total(self):
+        return self.price * self.quantity
+
+
+class OrderItem(OrderLineSnapshot):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    fish = models.ForeignKey(Fish, on_delete=models.CASCADE)
+    fish = models.ForeignKey(Fish, on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    
+
+    product_field = 'fish'
+    sku = 'fish'
+
     def __str__(self):
-        return f"{self.order.order_number} - {self.fish.name}"
-    
-    def get_total(self):
-        return self.price * self.quantity
+        return f"{self.order.order_number} - {self.display_name}"
 
 
-class OrderAccessoryItem(models.Model):
+class OrderAccessoryItem(OrderLineSnapshot):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='accessory_items')
-    accessory = models.ForeignKey('Accessory', on_delete=models.CASCADE)
+    accessory = models.ForeignKey('Accessory', on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
-    def __str__(self):
-        return f"{self.order.order_number} - {self.accessory.name}"
+    product_field = 'accessory'
+    sku = 'accessory'
 
-    def get_total(self):
-        return self.price * self.quantity
+    def __str__(self):
+        return f"{self.order.order_number} - {self.display_name}"
 
 
-class OrderPlantItem(models.Model):
+class OrderPlantItem(OrderLineSnapshot):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='plant_items')
-    plant = models.ForeignKey('Plant', on_delete=models.CASCADE)
+    plant = models.ForeignKey('Plant', on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    product_field = 'plant'
+    sku = 'plant'
+
     def __str__(self):
-        return f"{self.order.order_number} - {self.plant.name}"
+        return f"{self.order.order_number} - {self.display_name}"
+
+
+class OrderSummary(models.Model):
+    """Read model for the customer order history page.
+
+    One row per order, refreshed whenever the order's payment or fulfilment
+    status changes, so listing a customer's history never has to walk the
+    line items of every order.
+    """
+    PREVIEW_LIMIT = 4
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='summary')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='order_summaries')
+    order_number = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default='pending')
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES, default='pending')
+    item_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    thumbnail = models.CharField(max_length=255, blank=True, default='')
+    # Up to PREVIEW_LIMIT lines with images: [{"name", "image", "quantity"}, ...]
+    preview_lines = models.JSONField(default=list, blank=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    final_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
 
-    def get_total(self):
-        return self.price * self.quantity
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'payment_status', '-created_at'], name='store_ordsum_user_paid_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary {self.order_number}"
+
+    @classmethod
+    def refresh_for(cls, order):
+        """Recompute and store the summary row for `order`."""
+        lines = []
+        for related in (order.items, order.accessory_items, order.plant_items):
+            lines.extend(related.order_by('id').values_list('product_name', 'product_image', 'quantity'))
+        preview = [
+            {'name': name, 'image': image, 'quantity': qty}
+            for name, image, qty in lines if image
+        ][:cls.PREVIEW_LIMIT]
+        summary, _ = cls.objects.update_or_create(
+            order=order,
+            defaults={
+                'user_id': order.user_id,
+                'order_number': order.order_number,
+                'status': order.status,
+                'payment_status': order.payment_status,
+                'item_count': len(lines),
+                'total_quantity': sum(qty or 0 for _, _, qty in lines),
+                'thumbnail': preview[0]['image'] if preview else '',
+                'preview_lines': preview,
+                'total_amount': order.total_amount or 0,
+                'final_amount': order.final_amount or 0,
+                'created_at': order.created_at,
+            },
+        )
+        return summary
+
+    @property
+    def hidden_line_count(self):
+        return max(0, self.item_count - len(self.preview_lines))
+
+    @property
+    def preview_items(self):
+        from django.core.files.storage import default_storage
+        return [{**line, 'url': default_storage.url(line['image'])} for line in self.preview_lines]
+
+
+class PaymentReference(models.Model):
+    """Every external reference ever issued for an order, for one-hop lookups.
+
+    Provider order ids rotate when a customer retries checkout, payment ids
+    arrive with verification/webhooks and order numbers are echoed back in
+    receipts and notes. Each is stored here (order numbers upper-cased) so
+    payment callbacks resolve their order through the (kind, value) unique
+    index instead of a chain of fallbacks and case-insensitive scans.
+    """
+    KIND_PROVIDER_ORDER = 'provider_order'
+    KIND_PAYMENT = 'payment'
+    KIND_ORDER_NUMBER = 'order_number'
+    KIND_CHOICES = [
+        (KIND_PROVIDER_ORDER, 'Provider order id'),
+        (KIND_PAYMENT, 'Payment id'),
+        (KIND_ORDER_NUMBER, 'Order number'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.CharField(max_length=200)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_references')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'value'], name='store_paymentref_kind_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.value} -> {self.order_id}"
+
+    @classmethod
+    def normalise(cls, kind, value):
+        value = (str(value) if value is not None else '').strip()
+        if kind == cls.KIND_ORDER_NUMBER:
+            value = value.upper()
+        return value[:200]
+
+    @classmethod
+    def record(cls, order, kind, value):
+        """Map `value` to `order`. An existing mapping to another order is kept."""
+        from django.db import IntegrityError, transaction
+
+        value = cls.normalise(kind, value)
+        if not value or not order.pk:
+            return None
+        try:
+            with transaction.atomic():
+                ref, _ = cls.objects.get_or_create(kind=kind, value=value, defaults={'order': order})
+        except IntegrityError:
+            ref = cls.objects.filter(kind=kind, value=value).first()
+        if ref is not None and ref.order_id != order.pk:
+            import logging
+            logging.getLogger(__name__).warning(
+                'Payment reference %s:%s already belongs to order %s, not %s', kind, value, ref.order_id, order.pk,
+            )
+        return ref
+
+    @classmethod
+    def resolve(cls, provider_order=None, payment_id=None, order_number=None):
+        """Return the Order matching any of the given references, or None.
+
+        All candidates are fetched in a single query; a provider order id
+        match wins over a payment id, which wins over an order number.
+        """
+        candidates = []
+        if provider_order:
+            candidates.append((cls.KIND_PROVIDER_ORDER, cls.normalise(cls.KIND_PROVIDER_ORDER, provider_order)))
+        if payment_id:
+            candidates.append((cls.KIND_PAYMENT, cls.normalise(cls.KIND_PAYMENT, payment_id)))
+        # Some callers pass the order number where the provider id would be
+        for number in (order_number, provider_order):
+            if number:
+                candidates.append((cls.KIND_ORDER_NUMBER, cls.normalise(cls.KIND_ORDER_NUMBER, number)))
+        if not candidates:
+            return None
+
+        query = models.Q()
+        for kind, value in candidates:
+            query |= models.Q(kind=kind, value=value)
+        found = {(ref.kind, ref.value): ref.order for ref in cls.objects.filter(query).select_related('order')}
+        for candidate in candidates:
+            if candidate in found:
+                return found[candidate]
+        return None
+
+
+class StockReservation(models.Model):
+    """Stock held for a draft order until it is paid, cancelled or the hold expires.
+
+    Holds past `expires_at` no longer count against availability; the
+    `release_stock_reservations` sweeper deletes them. Paying an order turns
+    its holds into a stock deduction, cancelling it drops them.
+    """
+    PRODUCT_CHOICES = [
+        ('fish', 'Fish'),
+        ('accessory', 'Accessory'),
+        ('plant', 'Plant'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product_type = models.CharField(max_length=20, choices=PRODUCT_CHOICES)
+    product_id = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Covers the reserved-quantity aggregate for a set of products
+            models.Index(fields=['product_type', 'product_id', 'expires_at', 'quantity'], name='store_stockres_product_idx'),
+            models.Index(fields=['expires_at'], name='store_stockres_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_type} {self.product_id} for order {self.order_id}"
+
+
+class StockMovement(models.Model):
+    """Append-only ledger of stock changes.
+
+    Every change to a product's `stock_quantity` is recorded here with its
+    reason and reference (order number, import file, ...). The column on the
+    product is a projection of this ledger kept for fast reads; see
+    `store.inventory.stock_at` for point-in-time balances.
+    """
+    REASON_CHOICES = [
+        ('initial', 'Opening stock'),
+        ('adjustment', 'Manual adjustment'),
+        ('order', 'Order'),
+        ('import', 'Import'),
+        ('correction', 'Ledger correction'),
+    ]
+
+    product_type = models.CharField(max_length=20, choices=StockReservation.PRODUCT_CHOICES)
+    product_id = models.PositiveIntegerField()
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True)
+    # Not auto_now_add so bulk loads and backfills can date their rows
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_type', 'product_id', 'created_at'], name='store_stockmove_product_idx'),
+            models.Index(fields=['created_at'], name='store_stockmove_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} {self.product_type} {self.product_id} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Stock movements are append-only; record a correction instead')
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """Ledger balance of one product at `taken_at`.
+
+    Point-in-time queries start from the latest snapshot and replay only the
+    movements recorded after it.
+    """
+    product_type = models.CharField(max_length=20, choices=StockReservation.PRODUCT_CHOICES)
+    product_id = models.PositiveIntegerField()
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_type', 'product_id', 'taken_at'], name='store_stocksnap_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_type} {self.product_id} = {self.quantity} at {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class WebhookEvent(models.Model):
+    """Payment provider webhook stored before it is processed.
+
+    The webhook endpoint only verifies the signature and inserts a row here;
+    the (provider, event_id) unique key makes provider retries no-ops.
+    Processing happens in `store.webhooks`, off the request path.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=20, default='razorpay')
+    event_id = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=64, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='store_webhookevent_provider_event_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='store_webhook_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.event_type or '?'} {self.event_id} ({self.status})"
+
+
+class EmailOutbox(models.Model):
+    """Transactional email waiting to be delivered.
+
+    Rows are inserted in the same transaction as the change that triggers
+    them and sent by `store.outbox` over a shared SMTP connection, so views
+    never wait on SMTP. Order emails (`template` set) are rendered when sent;
+    other messages carry their plain-text `body`. A non-null `dedupe_key`
+    makes repeated queueing of the same email a no-op.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    # Base name under store/emails/ ('invoice', 'order_cancelled'); needs `order`
+    template = models.CharField(max_length=50, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    site_base = models.CharField(max_length=200, blank=True)
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'email outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='store_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
+
+
+class BackgroundTask(models.Model):
+    """Task queued in the database when `TASK_BACKEND` is 'db'.
+
+    `store.task_queue` inserts a row per `.delay()` call; `manage.py
+    run_worker` leases due rows, runs them in a thread pool and retries
+    failures with backoff. A running row whose lease has expired (its
+    worker died) is picked up again by the next worker.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='store_task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class MaintenanceJob(models.Model):
+    """Schedule and lock state of one job registered in `store.maintenance`.
+
+    ``beat:<entry>`` rows hold when each CELERY_BEAT_SCHEDULE entry is next
+    due under TASK_BACKEND=db (`store.task_queue.enqueue_periodic`).
+
+    `locked_until` is a lease taken with a conditional UPDATE so overlapping
+    cron runs never run the same job twice; the other fields record when it
+    is next due and what its last run did.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_removed = models.PositiveIntegerField(default=0)
+    last_duration = models.FloatField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class ReportJob(models.Model):
+    """Export requested from the admin area and built in the background.
+
+    `store.reports` builds the file under MEDIA_ROOT/reports/ off the
+    request path; the admin reports page polls the row until it is done and
+    then offers the download. Files and rows are removed once `expires_at`
+    passes (see the 'reports' maintenance job).
+    """
+    KIND_CHOICES = [
+        ('orders_xlsx', 'Orders workbook (xlsx: orders, items, customers)'),
+        ('orders_csv', 'Orders (CSV)'),
+        ('items_csv', 'Order item detail (CSV)'),
+        ('customers_csv', 'Customer sheet (CSV)'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Order filters, as for the Excel export: status, start_date, end_date
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='report_jobs')
+    # Relative to MEDIA_ROOT
+    file_path = models.CharField(max_length=255, blank=True, default='')
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    parts_total = models.PositiveIntegerField(default=0)
+    parts_done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['expires_at'], name='store_report_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    @property
+    def download_name(self):
+        extension = os.path.splitext(self.file_path)[1] or '.csv'
+        return f"{self.kind.rsplit('_', 1)[0]}-report-{self.pk}{extension}"
 
 
 class Review(models.Model):
@@ -615,8 +1125,10 @@ class Service(models.Model):
         return self.title
 
 
-class Accessory(models.Model):
+class Accessory(FieldTrackerMixin, models.Model):
     """Accessories that can be sold alongside fishes (e.g., filters, nets, food)."""
+    tracked_fields = ('stock_quantity',)
+
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='accessories')
@@ -641,47 +1153,23 @@ class Accessory(models.Model):
 
 
 # Signal for Accessory stock management
-@receiver(pre_save, sender=Accessory)
-def accessory_pre_save(sender, instance, **kwargs):
-    if not instance.pk:
-        instance._previous_stock = None
-        return
-    try:
-        prev = sender.objects.get(pk=instance.pk)
-        instance._previous_stock = prev.stock_quantity
-    except sender.DoesNotExist:
-        instance._previous_stock = None
-
-
 @receiver(post_save, sender=Accessory)
 def accessory_post_save(sender, instance, created, **kwargs):
     # Automatically set is_active to False when stock is 0
     if instance.stock_quantity == 0 and instance.is_active:
         Accessory.objects.filter(pk=instance.pk).update(is_active=False)
     
-    if created:
-        return
-
-    prev = getattr(instance, '_previous_stock', None)
-    curr = instance.stock_quantity or 0
+    from .inventory import record_stock_edit
+    from .stock_alerts import queue_stock_alerts
+    record_stock_edit(sender, instance, created, kwargs.get('update_fields'))
+    if created or instance.has_changed('stock_quantity'):
+        queue_stock_alerts('accessory', [instance.pk])
 
-    if curr > 0 or (prev is not None and prev <= 0):
-        return
 
-    notification_title = f"{instance.name} accessory is out of stock"
-    exists = Notification.objects.filter(title=notification_title, is_read=False).exists()
-    if exists:
-        return
-
-    Notification.objects.create(
-        title=notification_title,
-        message=f"{instance.name} accessory stock has reached zero. Please restock promptly.",
-        level='critical',
-    )
-
-
-class Plant(models.Model):
+class Plant(FieldTrackerMixin, models.Model):
     """Aquatic plants grouped by plant categories."""
+    tracked_fields = ('stock_quantity',)
+
     name = models.CharField(max_length=200)
     category = models.ForeignKey(
         Category,
@@ -728,43 +1216,17 @@ class Plant(models.Model):
         return super().save(*args, **kwargs)
 
 
-@receiver(pre_save, sender=Plant)
-def plant_pre_save(sender, instance, **kwargs):
-    if not instance.pk:
-        instance._previous_stock = None
-        return
-    try:
-        prev = sender.objects.get(pk=instance.pk)
-        instance._previous_stock = prev.stock_quantity
-    except sender.DoesNotExist:
-        instance._previous_stock = None
-
-
 @receiver(post_save, sender=Plant)
 def plant_post_save(sender, instance, created, **kwargs):
     # Automatically set is_active to False when stock is 0
     if instance.stock_quantity == 0 and instance.is_active:
         Plant.objects.filter(pk=instance.pk).update(is_active=False)
     
-    if created:
-        return
-
-    prev = getattr(instance, '_previous_stock', None)
-    curr = instance.stock_quantity or 0
-
-    if curr > 0 or (prev is not None and prev <= 0):
-        return
-
-    notification_title = f"{instance.name} plant is out of stock"
-    exists = Notification.objects.filter(title=notification_title, is_read=False).exists()
-    if exists:
-        return
-
-    Notification.objects.create(
-        title=notification_title,
-        message=f"{instance.name} plant stock has reached zero. Please restock promptly.",
-        level='critical',
-    )
+    from .inventory import record_stock_edit
+    from .stock_alerts import queue_stock_alerts
+    record_stock_edit(sender, instance, created, kwargs.get('update_fields'))
+    if created or instance.has_changed('stock_quantity'):
+        queue_stock_alerts('plant', [instance.pk])
 
 
 class PlantMedia(models.Model):
@@ -0,0 +1,303 @@
+"""Transactional email outbox.
+
+Views and signal handlers call `queue_email` / `queue_order_email`, which
+insert an `EmailOutbox` row in the caller's transaction; nothing talks to
+SMTP on the request path. Once the transaction commits the outbox is
+drained according to `EMAIL_OUTBOX_DISPATCH`:
+
+* ``thread`` (default) - one background thread drains it in-process.
+* ``task`` (or ``celery``) - queue `store.tasks.drain_email_outbox` on the
+  task backend (`store.task_queue`).
+* ``none`` - leave it for `python manage.py email_outbox drain` or the beat
+  schedule.
+
+In every mode the 'email_outbox' maintenance job (`store.maintenance`)
+requeues messages left 'sending' by a dead worker and sends retries that
+come due when no new message wakes the sender.
+
+`drain` claims due messages and sends a batch over one SMTP connection
+(`get_connection`), reopening it only after a failure. Failed messages are
+retried with exponential backoff up to `EMAIL_OUTBOX_MAX_ATTEMPTS` times;
+refused recipients fail at once. A message that fails with an invoice
+attached is retried once straight away without the attachment, as the
+synchronous sender always did.
+"""
+import hashlib
+import logging
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BATCH_SIZE = 50
+# Backoff grows 60s, 120s, 240s ... capped at one hour
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+
+# Errors no retry will fix
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+
+class SiteRequest:
+    """Stand-in request so background sends can build absolute links.
+
+    If `site_base` is provided it will be used as the absolute base URL.
+    """
+    def __init__(self, site_base):
+        self.site_base = (site_base or '').rstrip('/')
+
+    def build_absolute_uri(self, path):
+        if not self.site_base:
+            return path
+        if path.startswith('/'):
+            return f"{self.site_base}{path}"
+        return f"{self.site_base}/{path}"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def queue_email(to, subject, body='', template='', order=None, site_base='', dedupe_key=None):
+    """Insert an outbox row; it is sent after the current transaction commits.
+
+    Returns the row, or None when `to` is empty or `dedupe_key` was already
+    queued.
+    """
+    if not to:
+        return None
+    try:
+        # Savepoint: a duplicate key must not break the caller's transaction
+        with transaction.atomic():
+            entry = EmailOutbox.objects.create(
+                to=to, subject=subject[:255], body=body, template=template, order=order,
+                site_base=(site_base or '')[:200], dedupe_key=dedupe_key,
+            )
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        logger.info('Email %s already queued; skipping', dedupe_key)
+        return None
+    dispatch()
+    return entry
+
+
+def _order_dedupe_key(order, template):
+    """Key for one payment's email: the order, template and transaction id.
+
+    None (no deduplication) when the order has no transaction id.
+    """
+    transaction_id = (getattr(order, 'transaction_id', None) or '').strip()
+    if not transaction_id:
+        return None
+    key = f'order:{order.pk}:{template}:{transaction_id}'
+    if len(key) > 100:
+        key = f'order:{order.pk}:{template}:{hashlib.sha256(transaction_id.encode()).hexdigest()[:40]}'
+    return key
+
+
+def queue_order_email(order, template, subject, request=None, dedupe=True):
+    """Queue an order email (invoice/cancellation) to the order's customer.
+
+    With `dedupe` the email is queued at most once per order, template and
+    payment (`transaction_id`), so the finalize path and the paid signal
+    cannot both send one payment's invoice, while a later payment of the
+    same order still gets its own. One-off events pass ``dedupe=False``.
+    """
+    user = getattr(order, 'user', None)
+    recipient = (getattr(user, 'email', '') or '').strip()
+    if not recipient:
+        logger.warning('Skipping %s email - no recipient for order %s', template, getattr(order, 'order_number', None))
+        return None
+    site_base = request.build_absolute_uri('/') if request is not None else _setting('SITE_URL', '')
+    return queue_email(
+        recipient, subject, template=template, order=order, site_base=site_base,
+        dedupe_key=_order_dedupe_key(order, template) if dedupe else None,
+    )
+
+
+# ---- delivery ---------------------------------------------------------------
+
+def _claim(entry_id):
+    """Atomically move a due message to 'sending'. Returns the row or None."""
+    now = timezone.now()
+    claimed = EmailOutbox.objects.filter(
+        id=entry_id, status='pending', next_attempt_at__lte=now,
+    ).update(status='sending', attempts=F('attempts') + 1, next_attempt_at=now)
+    if not claimed:
+        return None
+    return EmailOutbox.objects.select_related('order__user').get(id=entry_id)
+
+
+def build_message(entry):
+    """The EmailMessage for an outbox row."""
+    if entry.template:
+        from .views import _build_order_email
+        return _build_order_email(entry.order, entry.template, entry.subject, entry.to,
+                                  request=SiteRequest(entry.site_base))
+    return EmailMessage(
+        subject=entry.subject,
+        body=entry.body,
+        from_email=settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
+        to=[entry.to],
+    )
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def _send(entry, connection):
+    message = build_message(entry)
+    message.connection = connection
+    try:
+        message.send(fail_silently=False)
+    except PERMANENT_ERRORS:
+        raise
+    except Exception:
+        if not message.attachments:
+            raise
+        # Large attachments are the usual cause of SMTP disconnects
+        logger.warning('Sending %s failed with attachments; retrying without', entry)
+        _close(connection)
+        message.attachments = []
+        message.send(fail_silently=False)
+
+
+def _record_failure(entry, exc):
+    max_attempts = _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    permanent = isinstance(exc, PERMANENT_ERRORS)
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, entry.attempts - 1)))
+    entry.last_error = str(exc)[:2000]
+    entry.status = 'failed' if permanent or entry.attempts >= max_attempts else 'pending'
+    entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    entry.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+    logger.warning('Email %s attempt %s failed (%s): %s', entry.pk, entry.attempts, entry.status, exc)
+
+
+def send_entries(entry_ids, connection=None):
+    """Claim and send the given messages over one connection.
+
+    Returns a dict counting final statuses; unclaimed ids are skipped.
+    """
+    connection = connection or get_connection(fail_silently=False)
+    results = {}
+    try:
+        for entry_id in entry_ids:
+            entry = _claim(entry_id)
+            if entry is None:
+                continue
+            try:
+                _send(entry, connection)
+            except Exception as exc:
+                if not isinstance(exc, (smtplib.SMTPException, OSError)):
+                    logger.exception('Email %s failed', entry.pk)
+                # The connection may be broken; the next send reopens it
+                _close(connection)
+                _record_failure(entry, exc)
+            else:
+                entry.status = 'sent'
+                entry.last_error = ''
+                entry.sent_at = timezone.now()
+                entry.save(update_fields=['status', 'last_error', 'sent_at'])
+            results[entry.status] = results.get(entry.status, 0) + 1
+    finally:
+        _close(connection)
+    return results
+
+
+def drain(limit=None):
+    """Send up to `limit` due messages (default EMAIL_OUTBOX_BATCH_SIZE)."""
+    limit = limit or _setting('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    due = list(
+        EmailOutbox.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return {}
+    return send_entries(due)
+
+
+def release_stale(older_than=timedelta(minutes=15)):
+    """Return messages stuck in 'sending' (e.g. a worker died) to the queue.
+
+    While a message is sending, `next_attempt_at` holds the time it was claimed.
+    """
+    cutoff = timezone.now() - older_than
+    return EmailOutbox.objects.filter(status='sending', next_attempt_at__lt=cutoff).update(status='pending')
+
+
+def retry(queryset):
+    """Reset messages so they are sent again on the next drain."""
+    return queryset.exclude(status='sending').update(
+        status='pending', attempts=0, last_error='', next_attempt_at=timezone.now(),
+    )
+
+
+# ---- dispatch ---------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+_drain_scheduled = False
+
+
+def _drain_in_thread():
+    global _drain_scheduled
+    with _executor_lock:
+        _drain_scheduled = False
+    try:
+        # Keep going while full batches come back
+        limit = _setting('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        while sum(drain(limit).values()) >= limit:
+            pass
+    except Exception:
+        logger.exception('Draining the email outbox failed')
+    finally:
+        close_old_connections()
+
+
+def _schedule_drain():
+    global _executor, _drain_scheduled
+    with _executor_lock:
+        if _drain_scheduled:
+            # A drain that has not started yet will pick this message up
+            return
+        if _executor is None:
+            # One thread: messages go out over one SMTP connection at a time
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-outbox')
+        _drain_scheduled = True
+        _executor.submit(_drain_in_thread)
+
+
+def dispatch():
+    """Arrange for the outbox to be drained once the current transaction commits."""
+    mode = (_setting('EMAIL_OUTBOX_DISPATCH', 'thread') or 'thread').lower()
+    if mode == 'none':
+        return
+
+    def _wake():
+        if mode in ('task', 'celery'):
+            try:
+                from store.tasks import drain_email_outbox
+                drain_email_outbox.delay()
+                return
+            except Exception:
+                logger.info('Queueing the email outbox drain as a task failed; draining in-process')
+        _schedule_drain()
+
+    transaction.on_commit(_wake)
@@ -1,6 +1,11 @@
 from .mock import MockProvider
 from .razorpay import RazorpayProvider
+from .http import build_session
 import os
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 # In the future, add: from .stripe import StripeProvider, etc.
 
@@ -9,6 +14,41 @@ PROVIDERS = {
     'razorpay': RazorpayProvider,
 }
 
+# Settings shared by every provider's HTTP session
+HTTP_SETTINGS = ('PAYMENT_HTTP_POOL_SIZE', 'PAYMENT_HTTP_ASYNC_POOL_SIZE', 'PAYMENT_HTTP_TIMEOUT')
+
+# name -> (settings fingerprint, provider instance). Providers are built once
+# per process and reused so their HTTP session keeps connections alive.
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _fingerprint(provider_cls):
+    from django.conf import settings
+    keys = HTTP_SETTINGS + tuple(getattr(provider_cls, 'settings_keys', ()))
+    return tuple(repr(getattr(settings, key, None)) for key in keys)
+
+
+def _build(provider_cls):
+    from django.conf import settings
+    if not getattr(provider_cls, 'settings_keys', None):
+        return provider_cls()
+    session = build_session(
+        pool_size=getattr(settings, 'PAYMENT_HTTP_POOL_SIZE', 10),
+        timeout=getattr(settings, 'PAYMENT_HTTP_TIMEOUT', (5, 15)),
+    )
+    return provider_cls(session=session)
+
+
+def _close(provider):
+    close = getattr(provider, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
 def get_payment_provider(name=None):
     from django.conf import settings
     if not name:
@@ -18,4 +58,36 @@ def get_payment_provider(name=None):
     provider_cls = PROVIDERS.get(name)
     if not provider_cls:
         raise Exception(f'Unknown payment provider: {name}')
-    return provider_cls()
+
+    fingerprint = _fingerprint(provider_cls)
+    entry = _registry.get(name)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+    with _registry_lock:
+        entry = _registry.get(name)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        provider = _build(provider_cls)
+        _registry[name] = (fingerprint, provider)
+    if entry is not None:
+        # Keys or pool settings changed: drop the stale provider's connections
+        _close(entry[1])
+    return provider
+
+
+def reset_payment_providers():
+    """Discard cached providers so the next lookup builds fresh ones."""
+    with _registry_lock:
+        entries = list(_registry.values())
+        _registry.clear()
+    for _, provider in entries:
+        _close(provider)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    # override_settings() in tests and scripts swaps keys without a restart
+    if setting == 'PAYMENT_PROVIDER' or setting in HTTP_SETTINGS or any(
+        setting in getattr(cls, 'settings_keys', ()) for cls in PROVIDERS.values()
+    ):
+        reset_payment_providers()
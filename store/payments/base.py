@@ -18,3 +18,7 @@ class BasePaymentProvider(ABC):
     def handle_webhook(self, request):
         """Process webhook and return status/result."""
         pass
+
+    def fetch_order_payment(self, provider_order_id):
+        """Return {'paid', 'payment_id', 'status'} for a provider order (used by reconciliation)."""
+        raise NotImplementedError
@@ -0,0 +1,56 @@
+"""Shared HTTP plumbing for payment provider SDKs.
+
+Provider SDKs such as `razorpay` accept a `requests.Session`; handing them
+one built here gives every call keep-alive connection reuse, a bounded
+connection pool and a default timeout (the SDKs send requests without one).
+
+`build_async_client` is the asyncio counterpart used by the ASGI payment
+views; it needs the optional `httpx` package.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+
+class TimeoutSession(requests.Session):
+    """`requests.Session` that applies a default timeout to every request."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(pool_size=10, timeout=(5, 15)):
+    """Return a session with a keep-alive pool of at most `pool_size` connections.
+
+    `pool_block=True` makes extra concurrent callers wait for a free
+    connection instead of opening (and then discarding) additional sockets.
+    """
+    session = TimeoutSession(timeout)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def build_async_client(pool_size=100, timeout=(5, 15)):
+    """Return an `httpx.AsyncClient` capped at `pool_size` connections, or None.
+
+    Callers fall back to running the synchronous SDK in a worker thread when
+    httpx is not installed.
+    """
+    if httpx is None:
+        return None
+    connect, read = timeout if isinstance(timeout, (tuple, list)) else (timeout, timeout)
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        timeout=httpx.Timeout(read, connect=connect),
+    )
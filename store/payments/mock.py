@@ -19,9 +19,25 @@ class MockProvider:
             'payment_intent_id': f'mock_pi_{order.id}',
         }
 
+    async def acreate_order(self, order):
+        return self.create_order(order)
+
     def verify_payment(self, data):
         # Accept anything in tests
         return True
 
     def handle_webhook(self, request):
         return True, {}
+
+    def fetch_order_payment(self, provider_order_id):
+        # Mock orders stay unpaid ('created') so a mock provider left enabled
+        # cannot mark real orders paid; set MOCK_PAYMENT_STATUS='captured' to
+        # exercise reconciliation offline.
+        from django.conf import settings
+        status = getattr(settings, 'MOCK_PAYMENT_STATUS', 'created')
+        paid = status == 'captured' and str(provider_order_id).startswith('mock_order_')
+        return {
+            'paid': paid,
+            'payment_id': f'mock_pay_{provider_order_id}' if paid else None,
+            'status': 'paid' if paid else status,
+        }
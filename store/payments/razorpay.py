@@ -6,32 +6,86 @@ Configuration keys expected in Django settings:
 - `RAZORPAY_KEY_ID`
 - `RAZORPAY_KEY_SECRET`
 - `RAZORPAY_WEBHOOK_SECRET` (optional, used to validate webhooks)
+- `RAZORPAY_API_BASE_URL` (optional, points the SDK at a stub server)
 
 If the `razorpay` package is not installed the adapter raises
 meaningful errors when used.
+
+`acreate_order` is the coroutine used by the ASGI views. It talks to the
+orders API directly through httpx, because the SDK is blocking.
 """
+import asyncio
 import logging
+import weakref
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .http import build_async_client
+
 logger = logging.getLogger(__name__)
 
 
 class RazorpayProvider:
-    def __init__(self):
+    # Settings that, when changed, require the provider to be rebuilt
+    settings_keys = ('RAZORPAY_KEY_ID', 'RAZORPAY_KEY_SECRET', 'RAZORPAY_API_BASE_URL')
+
+    def __init__(self, session=None):
+        self.session = session
+        # httpx clients are bound to the event loop that opened their
+        # connections, so keep one per running loop.
+        self._async_clients = weakref.WeakKeyDictionary()
         try:
             import razorpay
             self.razorpay = razorpay
             key_id = getattr(settings, 'RAZORPAY_KEY_ID', '')
             key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
-            self.client = razorpay.Client(auth=(key_id, key_secret))
+            options = {}
+            base_url = getattr(settings, 'RAZORPAY_API_BASE_URL', '')
+            if base_url:
+                options['base_url'] = base_url
+            self.client = razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+            self.auth = (key_id, key_secret)
             # store key id for client-side usage
             self.key_id = key_id
         except Exception:
             self.razorpay = None
             self.client = None
             self.key_id = ''
+            self.auth = None
             logger.exception('razorpay package not installed or configuration missing')
 
+    def close(self):
+        """Release pooled connections held by the underlying HTTP session."""
+        session = getattr(self.client, 'session', None) if self.client else self.session
+        if session is not None:
+            session.close()
+        # Async clients are closed with their event loop
+        self._async_clients.clear()
+
+    async def aclose(self):
+        """Close the async client bound to the running event loop, if any."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _order_payload(self, order):
+        return {
+            'amount': int(float(order.final_amount or 0) * 100),
+            'currency': 'INR',
+            'receipt': str(order.order_number),
+            'payment_capture': 1,
+        }
+
+    def _order_result(self, payload, r_order):
+        return {
+            'razorpay_order_id': r_order.get('id'),
+            'razorpay_key_id': self.key_id,
+            'amount': payload['amount'],
+            'currency': payload['currency'],
+            'provider_response': r_order,
+        }
+
     def create_order(self, order):
         """Create a Razorpay order for `order`.
 
@@ -40,22 +94,46 @@ class RazorpayProvider:
         if not self.client:
             raise Exception('Razorpay SDK not available')
 
-        amount_paise = int(float(order.final_amount or 0) * 100)
+        payload = self._order_payload(order)
         try:
-            payload = {
-                'amount': amount_paise,
-                'currency': 'INR',
-                'receipt': str(order.order_number),
-                'payment_capture': 1,
-            }
             r_order = self.client.order.create(payload)
-            return {
-                'razorpay_order_id': r_order.get('id'),
-                'razorpay_key_id': self.key_id,
-                'amount': amount_paise,
-                'currency': 'INR',
-                'provider_response': r_order,
-            }
+            return self._order_result(payload, r_order)
+        except Exception:
+            logger.exception('Failed to create razorpay order')
+            raise
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = build_async_client(
+                pool_size=getattr(settings, 'PAYMENT_HTTP_ASYNC_POOL_SIZE', 100),
+                timeout=getattr(settings, 'PAYMENT_HTTP_TIMEOUT', (5, 15)),
+            )
+            if client is not None:
+                self._async_clients[loop] = client
+        return client
+
+    async def acreate_order(self, order):
+        """Async `create_order`: same payload and result, without blocking the loop.
+
+        Without httpx the SDK call runs in a worker thread instead.
+        """
+        if not self.client:
+            raise Exception('Razorpay SDK not available')
+
+        http = self._async_client()
+        if http is None:
+            return await sync_to_async(self.create_order, thread_sensitive=False)(order)
+
+        payload = self._order_payload(order)
+        try:
+            response = await http.post(f'{self.client.base_url}/v1/orders', json=payload, auth=self.auth)
+            r_order = response.json()
+            if response.status_code >= 300:
+                error = r_order.get('error', {}) if isinstance(r_order, dict) else {}
+                raise Exception(error.get('description') or f'Razorpay returned HTTP {response.status_code}')
+            return self._order_result(payload, r_order)
         except Exception:
             logger.exception('Failed to create razorpay order')
             raise
@@ -85,6 +163,22 @@ class RazorpayProvider:
             logger.exception('Razorpay signature verification failed')
             return False
 
+    def fetch_order_payment(self, provider_order_id):
+        """Return the captured payment for a Razorpay order, if any.
+
+        Result: ``{'paid': bool, 'payment_id': str | None, 'status': str}``
+        where `status` is the Razorpay order status.
+        """
+        if not self.client:
+            raise Exception('Razorpay SDK not available')
+        result = self.client.order.payments(provider_order_id)
+        items = result.get('items', []) if isinstance(result, dict) else []
+        captured = [p for p in items if p.get('status') == 'captured']
+        if captured:
+            return {'paid': True, 'payment_id': captured[0].get('id'), 'status': 'paid'}
+        status = items[0].get('status') if items else 'created'
+        return {'paid': False, 'payment_id': None, 'status': status}
+
     def handle_webhook(self, request):
         """Verify Razorpay webhook signature and return (ok, event_or_message).
 
@@ -2,30 +2,38 @@ from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
 from django.conf import settings
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from datetime import timedelta
 import json
 import logging
 
-from .models import Order
+from .inventory import InsufficientStock, hold_order_stock
+from .models import Order, PaymentReference
 from .payments import get_payment_provider
+from . import webhooks
 
 logger = logging.getLogger(__name__)
 
 
 def _finalize_payment(provider_order, payment_id=None, request=None, local_order_id=None, order_number=None):
-    """Locate the Order by provider order id and reliable fallbacks, then mark it paid.
+    """Locate the Order through its payment references, then mark it paid.
+
+    Provider order ids, payment ids and order numbers are resolved together
+    in one indexed PaymentReference query; `local_order_id` is only used
+    when none of them is known.
 
     Returns True if an Order was found and processed, False otherwise.
     """
     order = None
     try:
-        if provider_order:
-            order = Order.objects.filter(provider_order_id=provider_order).first()
+        order = PaymentReference.resolve(
+            provider_order=provider_order,
+            payment_id=payment_id,
+            order_number=order_number,
+        )
         if not order and local_order_id:
             order = Order.objects.filter(id=local_order_id).first()
-        if not order and order_number:
-            order = Order.objects.filter(order_number__iexact=order_number).first()
-        if not order:
-            order = Order.objects.filter(order_number__iexact=provider_order).first()
     except Exception:
         logger.exception(
             'Error locating Order for provider_order=%s local_order_id=%s order_number=%s',
@@ -53,12 +61,8 @@ def _finalize_payment(provider_order, payment_id=None, request=None, local_order
         return False
 
 
-def create_razorpay_payment(request, order_id):
-    """Create a razorpay order for the given order id and return payload for client."""
-    if request.method != 'POST' and request.method != 'GET':
-        return HttpResponseBadRequest('Only POST/GET allowed')
-
-    order = get_object_or_404(Order, id=order_id)
+def _payment_unavailable(order):
+    """Return an error response if `order` cannot be sent to the gateway."""
     if order.payment_status == 'paid':
         return JsonResponse({'error': 'Order already paid'}, status=400)
 
@@ -66,25 +70,87 @@ def create_razorpay_payment(request, order_id):
     key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
     if not key_id or not key_secret:
         return JsonResponse({'error': 'Payment gateway not configured'}, status=503)
+    return None
+
+
+def _stock_unavailable(order):
+    """Renew expired stock holds; return a 409 response if the stock is gone."""
+    try:
+        hold_order_stock(order)
+    except InsufficientStock as exc:
+        from store.views import _insufficient_stock_response
+
+        return _insufficient_stock_response(exc)
+    return None
+
+
+def _amount_paise(order):
+    # Same conversion the providers use when creating the order
+    return int(float(order.final_amount or 0) * 100)
+
+
+def _cached_provider_order(order):
+    """Return the stored client payload if its provider order can be reused.
+
+    Reuse requires the same provider order id, the same amount and currency,
+    and an age below PROVIDER_ORDER_TTL seconds.
+    """
+    ttl = getattr(settings, 'PROVIDER_ORDER_TTL', 0)
+    payload = order.provider_order_payload
+    if not ttl or not payload or not order.provider_order_id or not order.provider_order_created_at:
+        return None
+    if (payload.get('razorpay_order_id') or payload.get('provider_order_id')) != order.provider_order_id:
+        return None
+    if payload.get('amount') != _amount_paise(order) or payload.get('currency', 'INR') != 'INR':
+        return None
+    if timezone.now() - order.provider_order_created_at > timedelta(seconds=ttl):
+        return None
+    logger.info('Reusing provider order %s for order %s', order.provider_order_id, order.order_number)
+    return dict(payload)
+
+
+def _client_payload(order, payload):
+    payload.setdefault('payment_method', order.payment_method)
+    payload.setdefault('amount_rupees', float(order.final_amount))
+    return payload
+
+
+def _record_provider_order(order, payload):
+    # Persist provider order id on our Order so we can map callbacks/verify,
+    # and the payload so repeat attempts can reuse it
+    try:
+        prov_id = payload.get('razorpay_order_id') or payload.get('provider_order_id')
+        if prov_id:
+            order.provider_order_id = prov_id
+            order.provider_order_payload = {k: v for k, v in payload.items() if k != 'provider_response'}
+            order.provider_order_created_at = timezone.now()
+            order.save()
+    except Exception:
+        # Don't fail the create flow when saving provider id; log and continue
+        logger.exception('Failed to persist provider_order_id for order %s', order.order_number)
+    return payload
+
+
+def create_razorpay_payment(request, order_id):
+    """Create a razorpay order for the given order id and return payload for client."""
+    if request.method != 'POST' and request.method != 'GET':
+        return HttpResponseBadRequest('Only POST/GET allowed')
+
+    order = get_object_or_404(Order, id=order_id)
+    error = _payment_unavailable(order) or _stock_unavailable(order)
+    if error:
+        return error
+
+    cached = _cached_provider_order(order)
+    if cached:
+        return JsonResponse(_client_payload(order, cached))
 
     provider = get_payment_provider('razorpay')
     try:
         payload = provider.create_order(order)
-        payload.setdefault('payment_method', order.payment_method)
-        payload.setdefault('amount_rupees', float(order.final_amount))
-        # Persist provider order id on our Order so we can map callbacks/verify
-        try:
-            prov_id = payload.get('razorpay_order_id') or payload.get('provider_order_id')
-            if prov_id:
-                order.provider_order_id = prov_id
-                order.save()
-        except Exception:
-            # Don't fail the create flow when saving provider id; log and continue
-            import logging
-            logging.getLogger(__name__).exception('Failed to persist provider_order_id for order %s', order.order_number)
-        return JsonResponse(payload)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=502)
+    return JsonResponse(_client_payload(order, _record_provider_order(order, payload)))
 
 
 @csrf_exempt
@@ -120,55 +186,111 @@ def verify_razorpay_payment(request):
 
 @csrf_exempt
 def razorpay_webhook(request):
-    """Receive Razorpay webhooks and hand off to provider for verification."""
+    """Receive Razorpay webhooks, store them in the inbox and acknowledge.
+
+    Order finalization (locks, stock, invoice email) runs later from
+    `store.webhooks`, so slow SMTP or PDF work cannot delay the 200 and
+    provoke provider retries. Redelivered events dedupe on the event id.
+    """
     provider = get_payment_provider('razorpay')
     ok, event_or_msg = provider.handle_webhook(request)
     if not ok:
         return HttpResponse(status=400)
 
-    # event_or_msg should be the event dict when ok
+    event = event_or_msg if isinstance(event_or_msg, dict) else {}
+    return _store_webhook(request, event)
+
+
+def _store_webhook(request, event):
     try:
-        event = event_or_msg if isinstance(event_or_msg, dict) else {}
-        event_name = event.get('event') or ''
-        payload = event.get('payload', {})
-
-        # Handle payment captured events: mark order paid and send invoice.
-        # We prefer provider order id, but also use order_number from notes/receipt
-        # because users can retry checkout and provider ids can rotate.
-        if event_name == 'payment.captured':
-            payment_entity = payload.get('payment', {}).get('entity', {})
-            provider_order = payment_entity.get('order_id')
-            payment_id = payment_entity.get('id')
-            notes = payment_entity.get('notes', {}) or {}
-            webhook_order_number = notes.get('order_number')
-            if not webhook_order_number:
-                webhook_order_number = payment_entity.get('receipt')
-            _finalize_payment(
-                provider_order,
-                payment_id=payment_id,
-                request=request,
-                order_number=webhook_order_number,
-            )
-
-        # Also handle order.paid which is emitted in some capture flows.
-        elif event_name == 'order.paid':
-            order_entity = payload.get('order', {}).get('entity', {})
-            payment_entity = payload.get('payment', {}).get('entity', {})
-            provider_order = order_entity.get('id') or payment_entity.get('order_id')
-            payment_id = payment_entity.get('id')
-            webhook_order_number = order_entity.get('receipt')
-            if not webhook_order_number:
-                notes = payment_entity.get('notes', {}) or {}
-                webhook_order_number = notes.get('order_number')
-            _finalize_payment(
-                provider_order,
-                payment_id=payment_id,
-                request=request,
-                order_number=webhook_order_number,
-            )
-
-        # Optionally: handle order.paid or other events in future
+        event_id = webhooks.event_id_for(request, request.body)
+        inbox_event, created = webhooks.record_event('razorpay', event_id, event)
     except Exception:
-        logger.exception('Error processing webhook event')
+        logger.exception('Failed to store webhook event')
+        # Let the provider retry rather than lose the event
+        return HttpResponse(status=500)
 
+    if created:
+        webhooks.dispatch(inbox_event)
+    else:
+        logger.info('Duplicate webhook event %s (%s) acknowledged', event_id, inbox_event.status)
     return HttpResponse(status=200)
+
+
+# ---------------------------------------------------------------------------
+# ASGI variants, routed instead of the views above when PAYMENT_VIEWS_ASYNC is
+# on. Gateway HTTP calls are awaited on the event loop; only the ORM work
+# (order lookup/save, finalization, inbox insert) hops to Django's sync thread
+# through sync_to_async, so a worker can hold many payment calls in flight.
+# Signature checks are local HMACs and run inline.
+#
+# csrf_exempt() in Django 4.2 wraps views in a plain function, which would
+# hide the coroutine from the handler, so the flag is set directly.
+# ---------------------------------------------------------------------------
+
+async def _acreate_provider_order(provider, order):
+    acreate = getattr(provider, 'acreate_order', None)
+    if acreate is not None:
+        return await acreate(order)
+    return await sync_to_async(provider.create_order, thread_sensitive=False)(order)
+
+
+async def acreate_razorpay_payment(request, order_id):
+    """Async `create_razorpay_payment`."""
+    if request.method != 'POST' and request.method != 'GET':
+        return HttpResponseBadRequest('Only POST/GET allowed')
+
+    order = await sync_to_async(get_object_or_404)(Order, id=order_id)
+    error = _payment_unavailable(order) or await sync_to_async(_stock_unavailable)(order)
+    if error:
+        return error
+
+    cached = _cached_provider_order(order)
+    if cached:
+        return JsonResponse(_client_payload(order, cached))
+
+    provider = get_payment_provider('razorpay')
+    try:
+        payload = await _acreate_provider_order(provider, order)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=502)
+    payload = await sync_to_async(_record_provider_order)(order, payload)
+    return JsonResponse(_client_payload(order, payload))
+
+
+async def averify_razorpay_payment(request):
+    """Async `verify_razorpay_payment`."""
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST required')
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return HttpResponseBadRequest('Invalid JSON')
+
+    provider = get_payment_provider('razorpay')
+    if not provider.verify_payment(data):
+        return JsonResponse({'success': False})
+
+    processed = await sync_to_async(_finalize_payment)(
+        data.get('razorpay_order_id'),
+        payment_id=data.get('razorpay_payment_id'),
+        request=request,
+        local_order_id=data.get('order_id'),
+        order_number=data.get('order_number'),
+    )
+    return JsonResponse({'success': bool(processed)})
+
+
+async def arazorpay_webhook(request):
+    """Async `razorpay_webhook`."""
+    provider = get_payment_provider('razorpay')
+    ok, event_or_msg = provider.handle_webhook(request)
+    if not ok:
+        return HttpResponse(status=400)
+
+    event = event_or_msg if isinstance(event_or_msg, dict) else {}
+    return await sync_to_async(_store_webhook)(request, event)
+
+
+averify_razorpay_payment.csrf_exempt = True
+arazorpay_webhook.csrf_exempt = True
@@ -0,0 +1,96 @@
+"""Reconcile pending orders against the payment provider.
+
+Orders whose webhook was missed (and whose customer closed the tab before
+verification) stay ``pending`` even though the provider captured the money.
+`reconcile_pending_orders` pages through such orders, asks the provider
+about each provider order id on a bounded thread pool, and finalizes the
+captured ones with `finalize_order_payment`.
+
+Only the provider HTTP calls run in worker threads; all database work stays
+on the calling thread.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Order
+from .payments import get_payment_provider
+
+logger = logging.getLogger(__name__)
+
+
+def _pending_orders(min_age, max_age):
+    now = timezone.now()
+    return (
+        Order.objects.filter(
+            payment_status='pending',
+            status='pending',
+            provider_order_id__isnull=False,
+            created_at__lte=now - min_age,
+            created_at__gte=now - max_age,
+        )
+        .exclude(provider_order_id='')
+        .order_by('id')
+    )
+
+
+def _fetch(provider, order_id, provider_order_id):
+    try:
+        return order_id, provider.fetch_order_payment(provider_order_id), None
+    except Exception as exc:
+        return order_id, None, exc
+
+
+def reconcile_pending_orders(provider_name=None, batch_size=100, workers=4,
+                             min_age=timedelta(minutes=10), max_age=timedelta(days=7),
+                             limit=None, dry_run=False, log=None):
+    """Finalize pending orders the provider reports as paid.
+
+    Returns counters: checked, paid, finalized, unpaid, errors.
+    """
+    provider = get_payment_provider(provider_name)
+    stats = {'checked': 0, 'paid': 0, 'finalized': 0, 'unpaid': 0, 'errors': 0}
+    qs = _pending_orders(min_age, max_age)
+    last_id = 0
+
+    from .views import finalize_order_payment
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='reconcile') as pool:
+        while limit is None or stats['checked'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats['checked'])
+            batch = list(qs.filter(id__gt=last_id).only('id', 'order_number', 'provider_order_id')[:size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            by_id = {order.id: order for order in batch}
+
+            results = pool.map(lambda o: _fetch(provider, o.id, o.provider_order_id), batch)
+            for order_id, result, error in results:
+                order = by_id[order_id]
+                stats['checked'] += 1
+                if error is not None:
+                    stats['errors'] += 1
+                    logger.warning('Could not fetch provider status for order %s: %s', order.order_number, error)
+                    continue
+                if not result.get('paid'):
+                    stats['unpaid'] += 1
+                    continue
+                stats['paid'] += 1
+                if dry_run:
+                    if log:
+                        log(f'{order.order_number}: paid at provider ({result.get("payment_id")}) - dry run')
+                    continue
+                try:
+                    processed, _ = finalize_order_payment(order, payment_id=result.get('payment_id'))
+                except Exception:
+                    stats['errors'] += 1
+                    logger.exception('Reconciliation failed to finalize order %s', order.order_number)
+                    continue
+                if processed:
+                    stats['finalized'] += 1
+                    logger.info('Reconciled order %s (payment %s)', order.order_number, result.get('payment_id'))
+                    if log:
+                        log(f'{order.order_number}: finalized ({result.get("payment_id")})')
+    return stats
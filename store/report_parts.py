@@ -0,0 +1,34 @@
+"""Worker side of background report jobs (`store.reports`).
+
+A report over a long date range is split into time slices; `build_part`
+writes one slice's rows to a part file, and the parent process joins the
+parts in order into the final file. Like `store.invoice_batch` this runs in
+'spawn' pool workers, so nothing here touches Django at import time.
+"""
+import json
+
+
+def build_part(kind, params, start, end, path):
+    """Write the rows of `kind` for orders created in ``[start, end)`` to `path`.
+
+    CSV kinds write CSV without a header. 'orders_xlsx' writes one JSON list
+    per row to ``<path>.orders`` and ``<path>.items`` for the two sheets.
+    Returns the number of rows written (orders, for the workbook).
+    """
+    from django.utils.dateparse import parse_datetime
+
+    from .exports import export_orders, item_rows, order_rows, write_csv
+
+    orders = export_orders(params).filter(created_at__gte=parse_datetime(start), created_at__lt=parse_datetime(end))
+    if kind != 'orders_xlsx':
+        with open(path, 'w', encoding='utf-8', newline='') as fh:
+            return write_csv('orders' if kind == 'orders_csv' else 'items', orders, fh, header=False)
+    count = 0
+    with open(f'{path}.orders', 'w', encoding='utf-8') as fh:
+        for row in order_rows(orders):
+            fh.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    with open(f'{path}.items', 'w', encoding='utf-8') as fh:
+        for row in item_rows(orders):
+            fh.write(json.dumps(row, ensure_ascii=False) + '\n')
+    return count
@@ -0,0 +1,285 @@
+"""Background report jobs for the admin area.
+
+The admin reports page calls `request_report`, which inserts a `ReportJob`
+and, once the transaction commits, hands it off according to
+`REPORT_DISPATCH`:
+
+* ``thread`` (default) - one background thread in this process builds it.
+* ``task`` - queue `store.tasks.build_report` on the task backend.
+* ``none`` - leave it for `python manage.py reports build --pending`.
+
+`build` splits the orders' date range into time slices and renders them on
+a 'spawn' process pool (`REPORT_WORKERS`; small reports and daemonic Celery
+workers build in-process), then joins the parts in order into one file
+under MEDIA_ROOT/reports/. The file name carries a random token, and the
+file and row are deleted `REPORT_RETENTION_DAYS` after completion by the
+'reports' maintenance job.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .exports import (
+    CUSTOMER_COLUMNS, DATASETS, ITEM_COLUMNS, ORDER_COLUMNS, customer_rows, export_orders, write_workbook,
+)
+from .invoice_batch import init_worker
+from .models import ReportJob
+from .report_parts import build_part
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_RETENTION_DAYS = 7
+# Below this many orders a pool costs more to start than it saves
+MIN_PARTITION_ORDERS = 50000
+PARTS_PER_WORKER = 2
+# Builds still running after this long are taken to have died
+DEFAULT_TIMEOUT_MINUTES = 60
+
+EXTENSIONS = {
+    'orders_xlsx': '.xlsx',
+    'orders_csv': '.csv',
+    'items_csv': '.csv',
+    'customers_csv': '.csv',
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def request_report(kind, params, user=None):
+    """Queue a report of `kind` for orders matching `params`; returns the job."""
+    job = ReportJob.objects.create(kind=kind, params=params, requested_by=user)
+    dispatch(job)
+    return job
+
+
+def report_path(job):
+    return os.path.join(settings.MEDIA_ROOT, job.file_path) if job.file_path else None
+
+
+# ---- building ---------------------------------------------------------------
+
+def _claim(job_id):
+    """Atomically move a queued job to 'running'. Returns the row or None."""
+    claimed = ReportJob.objects.filter(id=job_id, status='queued').update(
+        status='running', started_at=timezone.now(), parts_done=0, error='',
+    )
+    if not claimed:
+        return None
+    return ReportJob.objects.get(id=job_id)
+
+
+def _slices(orders, parts):
+    """``[start, end)`` ISO bounds splitting the orders' creation times into `parts`."""
+    bounds = orders.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if bounds['first'] is None:
+        return []
+    first, end = bounds['first'], bounds['last'] + timedelta(microseconds=1)
+    step = (end - first) / parts
+    edges = [first + step * index for index in range(parts)] + [end]
+    return [(edges[index].isoformat(), edges[index + 1].isoformat()) for index in range(parts)]
+
+
+def _build_parts(job, slices, workdir, workers):
+    """Render every slice to a part file; returns the part paths (slice order) and total rows."""
+    paths = [os.path.join(workdir, f'part-{index:04d}') for index in range(len(slices))]
+    counts = [0] * len(slices)
+    tasks = [(job.kind, job.params, start, end, path) for (start, end), path in zip(slices, paths)]
+
+    def finished(index, count):
+        counts[index] = count
+        ReportJob.objects.filter(pk=job.pk).update(parts_done=F('parts_done') + 1)
+
+    # Daemonic processes (Celery prefork workers) may not start children
+    if workers and len(tasks) > 1 and not multiprocessing.current_process().daemon:
+        # 'spawn' so no child inherits this process's database connection
+        context = multiprocessing.get_context('spawn')
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'fishy_friend_aquatics.settings')
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context,
+                                 initializer=init_worker, initargs=(settings_module,)) as pool:
+            futures = {pool.submit(build_part, *task): index for index, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+    else:
+        for index, task in enumerate(tasks):
+            finished(index, build_part(*task))
+    return paths, sum(counts)
+
+
+def _json_rows(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                yield json.loads(line)
+
+
+def _write_report(job, orders, target, workdir, workers):
+    """Build the report file at `target`; returns the number of rows."""
+    if job.kind == 'customers_csv':
+        # One grouped query over the whole range; nothing to partition
+        ReportJob.objects.filter(pk=job.pk).update(parts_total=1)
+        count = 0
+        with open(target, 'w', encoding='utf-8', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow([name for name, _ in CUSTOMER_COLUMNS])
+            for row in customer_rows(orders):
+                writer.writerow(row)
+                count += 1
+        ReportJob.objects.filter(pk=job.pk).update(parts_done=1)
+        return count
+
+    total = orders.count()
+    parts = 1 if not workers or total < MIN_PARTITION_ORDERS else workers * PARTS_PER_WORKER
+    slices = _slices(orders, parts)
+    ReportJob.objects.filter(pk=job.pk).update(parts_total=len(slices))
+    paths, count = _build_parts(job, slices, workdir, workers)
+
+    if job.kind == 'orders_xlsx':
+        # The workbook lists newest orders first: newest slice first
+        newest_first = paths[::-1]
+        with open(target, 'wb') as fh:
+            write_workbook(fh, [
+                ('Orders Summary', ORDER_COLUMNS, _json_rows(f'{path}.orders' for path in newest_first)),
+                ('Order Items Detail', ITEM_COLUMNS, _json_rows(f'{path}.items' for path in newest_first)),
+                ('Customer Details', CUSTOMER_COLUMNS, customer_rows(orders)),
+            ])
+        return count
+
+    dataset = 'orders' if job.kind == 'orders_csv' else 'items'
+    with open(target, 'w', encoding='utf-8', newline='') as fh:
+        csv.writer(fh).writerow(DATASETS[dataset])
+        for path in paths:
+            with open(path, encoding='utf-8', newline='') as part:
+                shutil.copyfileobj(part, fh)
+    return count
+
+
+def build(job_id, workers=None):
+    """Build a queued report. Returns the job, or None if it was not queued."""
+    job = _claim(job_id)
+    if job is None:
+        return None
+    workers = _setting('REPORT_WORKERS', DEFAULT_WORKERS) if workers is None else workers
+    relative = os.path.join('reports', f'{job.pk}-{secrets.token_hex(8)}{EXTENSIONS[job.kind]}')
+    target = os.path.join(settings.MEDIA_ROOT, relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = f'{target}.part'
+    try:
+        with tempfile.TemporaryDirectory(prefix=f'report-{job.pk}-') as workdir:
+            count = _write_report(job, export_orders(job.params), partial, workdir, workers)
+        os.replace(partial, target)
+    except Exception as exc:
+        logger.exception('Report %s failed', job.pk)
+        if os.path.exists(partial):
+            os.remove(partial)
+        ReportJob.objects.filter(pk=job.pk).update(
+            status='failed', error=str(exc)[:2000] or type(exc).__name__, finished_at=timezone.now(),
+        )
+        job.refresh_from_db()
+        return job
+    now = timezone.now()
+    ReportJob.objects.filter(pk=job.pk).update(
+        status='done', file_path=relative, file_size=os.path.getsize(target), row_count=count,
+        finished_at=now, expires_at=now + timedelta(days=_setting('REPORT_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)),
+    )
+    job.refresh_from_db()
+    logger.info('Report %s (%s) built: %s rows in %.1fs', job.pk, job.kind, count,
+                (job.finished_at - job.started_at).total_seconds())
+    return job
+
+
+# ---- retention --------------------------------------------------------------
+
+def _delete_file(job):
+    path = report_path(job)
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning('Could not delete report file %s', path)
+
+
+def fail_stale():
+    """Mark builds running longer than REPORT_TIMEOUT_MINUTES (their worker died) failed."""
+    cutoff = timezone.now() - timedelta(minutes=_setting('REPORT_TIMEOUT_MINUTES', DEFAULT_TIMEOUT_MINUTES))
+    return ReportJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='failed', error='The build stopped before finishing', finished_at=timezone.now(),
+    )
+
+
+def prune_expired(batch_size=100, deadline=None):
+    """Delete expired reports, file first. Returns ``(removed, finished)``."""
+    removed = 0
+    while deadline is None or time.monotonic() < deadline:
+        jobs = list(ReportJob.objects.filter(expires_at__lt=timezone.now()).order_by('id')[:batch_size])
+        if not jobs:
+            return removed, True
+        for job in jobs:
+            _delete_file(job)
+        deleted, _ = ReportJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+        removed += deleted
+    return removed, False
+
+
+def delete_report(job):
+    _delete_file(job)
+    job.delete()
+
+
+# ---- dispatch ---------------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _build_in_thread(job_id):
+    try:
+        build(job_id)
+    except Exception:
+        logger.exception('Building report %s failed', job_id)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One report at a time; each build has its own process pool
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report')
+        return _executor
+
+
+def dispatch(job):
+    """Arrange for `job` to be built once the current transaction commits."""
+    mode = (_setting('REPORT_DISPATCH', 'thread') or 'thread').lower()
+    if mode == 'none':
+        return
+
+    def _start():
+        if mode in ('task', 'celery'):
+            try:
+                from store.tasks import build_report
+                build_report.delay(job.pk)
+                return
+            except Exception:
+                logger.info('Queueing report %s as a task failed; building in-process', job.pk)
+        _get_executor().submit(_build_in_thread, job.pk)
+
+    transaction.on_commit(_start)
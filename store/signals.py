@@ -1,10 +1,10 @@
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 import logging
 
-from .models import CustomUser, Order
+from .models import CustomUser, Order, OrderSummary, PaymentReference
 
 logger = logging.getLogger(__name__)
 
@@ -13,15 +13,10 @@ logger = logging.getLogger(__name__)
 def notify_on_staff_removal(sender, instance, **kwargs):
     """Send an official email when a user's role changes from 'staff' to a non-staff role."""
     # Only proceed for existing users (skip creations)
-    if not instance.pk:
+    if instance._state.adding:
         return
 
-    try:
-        previous = CustomUser.objects.get(pk=instance.pk)
-    except CustomUser.DoesNotExist:
-        return
-
-    prev_role = getattr(previous, 'role', None)
+    prev_role = instance.previous('role')
     new_role = getattr(instance, 'role', None)
 
     if prev_role == 'staff' and new_role != 'staff':
@@ -37,53 +32,93 @@ def notify_on_staff_removal(sender, instance, **kwargs):
             "— FISHY FRIEND AQUA Team"
         )
 
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None)
-        recipient = [instance.email] if instance.email else []
-
-        if not recipient:
+        if not instance.email:
             logger.warning('User %s has no email set; cannot send staff-removal notification.', instance.pk)
             return
 
         try:
-            send_mail(subject, body, from_email, recipient, fail_silently=False)
-            logger.info('Sent staff-removal email to %s', instance.email)
+            from .outbox import queue_email
+            queue_email(instance.email, subject, body)
+            logger.info('Queued staff-removal email to %s', instance.email)
         except Exception:
-            logger.exception('Failed to send staff-removal email to %s', instance.email)
-        except Exception:
-            logger.exception('Failed to send staff-removal email to %s', instance.email)
+            logger.exception('Failed to queue staff-removal email to %s', instance.email)
 
 
-# ---- Order payment signals: send invoice when payment_status becomes 'paid' ----
-@receiver(pre_save, sender=Order)
-def _order_pre_save(sender, instance, **kwargs):
-    """Store previous payment_status on the instance for comparison in post_save."""
-    if not instance.pk:
-        # New order; nothing to fetch
-        instance._previous_payment_status = None
-        return
-    try:
-        previous = Order.objects.get(pk=instance.pk)
-        instance._previous_payment_status = previous.payment_status
-    except Order.DoesNotExist:
-        instance._previous_payment_status = None
+def _order_references(order):
+    return {
+        PaymentReference.KIND_ORDER_NUMBER: order.order_number,
+        PaymentReference.KIND_PROVIDER_ORDER: order.provider_order_id,
+        PaymentReference.KIND_PAYMENT: order.transaction_id,
+    }
 
 
+def _previous_order_references(order):
+    return {
+        PaymentReference.KIND_ORDER_NUMBER: order.previous('order_number'),
+        PaymentReference.KIND_PROVIDER_ORDER: order.previous('provider_order_id'),
+        PaymentReference.KIND_PAYMENT: order.previous('transaction_id'),
+    }
+
+
+# ---- Order payment signals: send invoice when payment_status becomes 'paid' ----
+# Previous values come from Order's field tracker (FieldTrackerMixin), so
+# these handlers add no queries to an order save.
 @receiver(post_save, sender=Order)
 def _order_post_save(sender, instance, created, **kwargs):
-    """When an Order's payment_status transitions to 'paid', send the invoice email."""
+    """When an Order's payment_status transitions to 'paid', queue the invoice email."""
     try:
         # If caller set this attribute, it means they will handle sending the invoice
         if getattr(instance, '_skip_invoice_signal', False):
             return
-        prev = getattr(instance, '_previous_payment_status', None)
+        prev = instance.previous('payment_status')
         new = getattr(instance, 'payment_status', None)
         # If newly paid (including created as paid), and previous wasn't 'paid'
         if new == 'paid' and prev != 'paid':
             try:
-                # Send synchronously to guarantee delivery when payment_status becomes 'paid'
-                from .views import _send_order_email
-                _send_order_email(instance, 'invoice', f'Invoice - {settings.SITE_NAME} - {instance.order_number}', instance.user.email, request=None)
+                # Queued in the saving transaction; delivered by store.outbox once it commits
+                from .outbox import queue_order_email
+                queue_order_email(instance, 'invoice', f'Invoice - {settings.SITE_NAME} - {instance.order_number}')
             except Exception:
-                logger.exception('Failed to send invoice synchronously for order %s', instance.order_number)
+                logger.exception('Failed to queue invoice email for order %s', instance.order_number)
     except Exception:
         logger.exception('Error in order post-save signal for order %s', getattr(instance, 'order_number', 'N/A'))
+
+
+@receiver(post_save, sender=Order)
+def _order_refresh_summary(sender, instance, created, **kwargs):
+    """Keep the order history read model in step with payment/status changes."""
+    if not (instance.has_changed('status') or instance.has_changed('payment_status')):
+        return
+    # Drafts only get a summary once they have been paid
+    if instance.payment_status != 'paid' and not OrderSummary.objects.filter(order_id=instance.pk).exists():
+        return
+    try:
+        # Savepoint so a failure here cannot poison the caller's transaction
+        with transaction.atomic():
+            OrderSummary.refresh_for(instance)
+    except Exception:
+        logger.exception('Failed to refresh order summary for order %s', getattr(instance, 'order_number', 'N/A'))
+
+
+@receiver(post_save, sender=Order)
+def _order_record_payment_references(sender, instance, created, **kwargs):
+    """Add newly issued order numbers / provider ids / payment ids to PaymentReference."""
+    previous = _previous_order_references(instance)
+    for kind, value in _order_references(instance).items():
+        if value and value != previous.get(kind):
+            try:
+                PaymentReference.record(instance, kind, value)
+            except Exception:
+                logger.exception('Failed to record %s reference for order %s', kind, getattr(instance, 'order_number', 'N/A'))
+
+
+@receiver(post_save, sender=Order)
+def _order_release_stock_holds(sender, instance, created, **kwargs):
+    """Cancelled drafts give their reserved stock back immediately."""
+    if created or instance.status != 'cancelled' or not instance.has_changed('status'):
+        return
+    from .inventory import release_order_stock
+    try:
+        release_order_stock(instance)
+    except Exception:
+        logger.exception('Failed to release stock holds for order %s', getattr(instance, 'order_number', 'N/A'))
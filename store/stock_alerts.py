@@ -0,0 +1,177 @@
+"""Batched low/out-of-stock alerts for staff.
+
+Product saves and order deductions only queue the touched product ids;
+`evaluate_stock_alerts` runs once per committed transaction (and on a
+schedule for the whole catalogue) and reconciles the Notification table
+with current stock:
+
+- each product has at most one alert per condition (``low``/``out``), keyed
+  by `Notification.key` and written with a single upsert;
+- an alert whose condition cleared is archived (read, key released), so the
+  product alerts again the next time it runs low;
+- when one evaluation raises more than STOCK_ALERT_DIGEST_THRESHOLD new
+  alerts, they are stored already read and a single digest notification
+  summarises them, keeping the staff dropdown short.
+
+`prune_notifications` deletes read notifications past their retention.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Accessory, Fish, Notification, Plant
+
+logger = logging.getLogger(__name__)
+
+ALERT_MODELS = {'fish': Fish, 'accessory': Accessory, 'plant': Plant}
+CONDITIONS = ('low', 'out')
+
+_pending = threading.local()
+
+# Keeps IN lists well below database parameter limits
+_KEY_CHUNK = 500
+
+
+def _key(product_type, pk, condition):
+    return f'stock:{product_type}:{pk}:{condition}'
+
+
+def _alert_for(product_type, pk, name, stock, threshold):
+    if stock <= 0:
+        if product_type == 'fish':
+            return Notification(key=_key(product_type, pk, 'out'), title=f"{name} is out of stock",
+                                message=f"{name} has run out of stock.", level='critical', fish_id=pk)
+        return Notification(
+            key=_key(product_type, pk, 'out'),
+            title=f"{name} {product_type} is out of stock",
+            message=f"{name} {product_type} stock has reached zero. Please restock promptly.",
+            level='critical',
+        )
+    # Only fish raise low-stock warnings
+    if product_type == 'fish' and stock <= threshold:
+        return Notification(key=_key(product_type, pk, 'low'), title=f"{name} stock is low",
+                            message=f"{name} stock is low (only {stock} left).", level='warning', fish_id=pk)
+    return None
+
+
+def queue_stock_alerts(product_type, ids):
+    """Evaluate alerts for `ids` once the current transaction commits.
+
+    Ids queued by every save in the transaction are evaluated together. With
+    STOCK_ALERTS_ON_COMMIT off, only the scheduled evaluation runs.
+    """
+    if not getattr(settings, 'STOCK_ALERTS_ON_COMMIT', True):
+        return
+    targets = getattr(_pending, 'targets', None)
+    if targets is None:
+        targets = _pending.targets = defaultdict(set)
+    targets[product_type].update(pk for pk in ids if pk)
+    # Registered per call: a rolled-back transaction drops its callback, and
+    # flushing an already-empty queue is free
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    targets = getattr(_pending, 'targets', None)
+    if not targets:
+        return
+    _pending.targets = None
+    try:
+        evaluate_stock_alerts(targets)
+    except Exception:
+        logger.exception('Stock alert evaluation failed')
+
+
+def _existing_alerts(keys):
+    if keys is None:
+        qs = Notification.objects.filter(key__startswith='stock:')
+        return {key: (title, message, level) for key, title, message, level in
+                qs.values_list('key', 'title', 'message', 'level')}
+    existing = {}
+    keys = list(keys)
+    for start in range(0, len(keys), _KEY_CHUNK):
+        qs = Notification.objects.filter(key__in=keys[start:start + _KEY_CHUNK])
+        existing.update(
+            (key, (title, message, level)) for key, title, message, level in
+            qs.values_list('key', 'title', 'message', 'level')
+        )
+    return existing
+
+
+def evaluate_stock_alerts(targets=None):
+    """Bring stock alerts in line with current stock.
+
+    `targets` maps product type to product ids; None evaluates every
+    product. Returns counters: checked, new, updated, resolved, digest.
+    """
+    threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+    alerts, checked_keys, checked = {}, set(), 0
+    for product_type, model in ALERT_MODELS.items():
+        qs = model.objects.all()
+        if targets is not None:
+            ids = targets.get(product_type)
+            if not ids:
+                continue
+            qs = qs.filter(id__in=list(ids))
+        for pk, name, stock in qs.values_list('id', 'name', 'stock_quantity').iterator(chunk_size=2000):
+            checked += 1
+            checked_keys.update(_key(product_type, pk, condition) for condition in CONDITIONS)
+            alert = _alert_for(product_type, pk, name, int(stock or 0), threshold)
+            if alert is not None:
+                alerts[alert.key] = alert
+
+    # A full run also archives alerts of deleted products
+    existing = _existing_alerts(None if targets is None else checked_keys)
+    resolved = [key for key in existing if key not in alerts]
+    new = [alert for key, alert in alerts.items() if key not in existing]
+    changed = [
+        alert for key, alert in alerts.items()
+        if key in existing and existing[key] != (alert.title, alert.message, alert.level)
+    ]
+
+    digest = len(new) > getattr(settings, 'STOCK_ALERT_DIGEST_THRESHOLD', 5)
+    if digest:
+        for alert in new:
+            alert.is_read = True
+
+    with transaction.atomic():
+        for start in range(0, len(resolved), _KEY_CHUNK):
+            Notification.objects.filter(key__in=resolved[start:start + _KEY_CHUNK]).update(key=None, is_read=True)
+        if new or changed:
+            # Upsert on key; is_read is left alone so dismissed alerts stay dismissed
+            conflict = {'update_conflicts': True, 'update_fields': ['title', 'message', 'level']}
+            # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target (key is the unique column)
+            if connections[Notification.objects.db].features.supports_update_conflicts_with_target:
+                conflict['unique_fields'] = ['key']
+            Notification.objects.bulk_create(new + changed, batch_size=500, **conflict)
+        if digest:
+            Notification.objects.create(
+                title=f"{len(new)} products need restocking",
+                message='\n'.join(alert.title for alert in new),
+                level='critical' if any(alert.level == 'critical' for alert in new) else 'warning',
+            )
+
+    return {'checked': checked, 'new': len(new), 'updated': len(changed), 'resolved': len(resolved), 'digest': digest}
+
+
+def prune_notifications(retention_days=None, batch_size=1000):
+    """Delete read, unkeyed notifications older than the retention period.
+
+    Keyed alerts are kept while their condition holds, however old, so a
+    dismissed alert does not come back. Returns the number deleted.
+    """
+    days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 30) if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=days)
+    stale = Notification.objects.filter(is_read=True, key__isnull=True, created_at__lt=cutoff)
+    total = 0
+    while True:
+        ids = list(stale.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = Notification.objects.filter(id__in=ids).delete()
+        total += deleted
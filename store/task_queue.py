@@ -0,0 +1,264 @@
+"""Pluggable backend for the background tasks in `store.tasks`.
+
+Tasks are declared with `shared_task` from this module and queued with the
+usual ``task.delay(...)``. Where they go depends on `TASK_BACKEND`:
+
+* ``celery`` (default) - the Celery broker, as before.
+* ``db`` - a `BackgroundTask` row, inserted in the caller's transaction and
+  run by `python manage.py run_worker`, which also queues the periodic
+  CELERY_BEAT_SCHEDULE entries as they come due (`enqueue_periodic`). No
+  broker needed, which suits the shared Passenger hosting.
+* ``sync`` - run at once in the calling process (development).
+
+The worker leases due rows with a conditional UPDATE, so several workers can
+share the table, and keeps extending the lease while a task runs. A failed
+task is retried with exponential backoff up to its `max_attempts`; a task
+whose lease runs out (its worker died) goes back to the queue. Celery need
+not be installed for the 'db' and 'sync' backends.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import BackgroundTask, MaintenanceJob
+
+try:
+    from celery import Task as _CeleryTask, shared_task as _celery_shared_task
+except ImportError:  # broker-free installs
+    _CeleryTask = _celery_shared_task = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 5
+# Backoff grows 30s, 60s, 120s ... capped at one hour
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Task name -> callable, filled in by `shared_task`
+_registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def backend():
+    return (_setting('TASK_BACKEND', 'celery') or 'celery').lower()
+
+
+def enqueue(name, args=None, kwargs=None, countdown=None, eta=None, max_attempts=None):
+    """Insert a `BackgroundTask` row for `run_worker` and return it.
+
+    The row is part of the current transaction, so the task only becomes
+    visible to workers once the change that queued it has committed.
+    """
+    run_after = eta or timezone.now() + timedelta(seconds=countdown or 0)
+    return BackgroundTask.objects.create(
+        name=name, args=list(args or ()), kwargs=dict(kwargs or {}), run_after=run_after,
+        max_attempts=max_attempts or _setting('TASK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+    )
+
+
+if _CeleryTask is not None:
+    class QueuedTask(_CeleryTask):
+        """Celery task whose `delay`/`apply_async` honour `TASK_BACKEND`."""
+
+        def apply_async(self, args=None, kwargs=None, task_id=None, producer=None,
+                        link=None, link_error=None, shadow=None, **options):
+            mode = backend()
+            if mode == 'db':
+                return enqueue(self.name, args, kwargs, options.get('countdown'), options.get('eta'))
+            if mode == 'sync':
+                return self.apply(args, kwargs)
+            return super().apply_async(args, kwargs, task_id, producer, link, link_error, shadow, **options)
+
+
+class LocalTask:
+    """Stand-in for a Celery task when Celery is not installed."""
+
+    def __init__(self, fn, name, bind=False):
+        self.run = fn
+        self.name = name
+        self.bind = bind
+        self.__doc__ = fn.__doc__
+
+    def __call__(self, *args, **kwargs):
+        if self.bind:
+            return self.run(self, *args, **kwargs)
+        return self.run(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args=None, kwargs=None, countdown=None, eta=None, **options):
+        if backend() == 'db':
+            return enqueue(self.name, args, kwargs, countdown, eta)
+        # 'sync', or 'celery' without Celery: run here, and like Celery's
+        # eager mode do not raise into the caller
+        try:
+            return self(*(args or ()), **(kwargs or {}))
+        except Exception:
+            logger.exception('Task %s failed', self.name)
+            return None
+
+
+def shared_task(*args, **options):
+    """Declare a background task; use like Celery's `shared_task`."""
+    def register(fn):
+        name = options.get('name') or f'{fn.__module__}.{fn.__name__}'
+        if _celery_shared_task is not None:
+            task = _celery_shared_task(base=QueuedTask, **options)(fn)
+        else:
+            task = LocalTask(fn, name, bind=options.get('bind', False))
+        _registry[name] = task
+        return task
+
+    if len(args) == 1 and callable(args[0]) and not options:
+        return register(args[0])
+    return register
+
+
+def autodiscover():
+    """Import every installed app's `tasks` module so its tasks are registered."""
+    autodiscover_modules('tasks')
+
+
+# ---- periodic tasks ---------------------------------------------------------
+
+def enqueue_periodic(schedule=None):
+    """Queue the CELERY_BEAT_SCHEDULE entries that are due; returns their names.
+
+    Stands in for Celery beat under the 'db' backend; `run_worker` calls it
+    on every poll. Each entry's next due time is kept in a ``beat:<entry>``
+    `MaintenanceJob` row and moved on with a conditional UPDATE, so however
+    many workers share the table an entry is queued once per interval.
+    Entries with a non-numeric (crontab) schedule are left to Celery beat.
+    """
+    schedule = _setting('CELERY_BEAT_SCHEDULE', {}) if schedule is None else schedule
+    now = timezone.now()
+    queued = []
+    for entry, spec in schedule.items():
+        every = spec.get('schedule')
+        if isinstance(every, timedelta):
+            every = every.total_seconds()
+        if not isinstance(every, (int, float)) or every <= 0:
+            continue
+        state, _ = MaintenanceJob.objects.get_or_create(name=f'beat:{entry}'[:50])
+        taken = MaintenanceJob.objects.filter(pk=state.pk, next_run_at__lte=now).update(
+            next_run_at=now + timedelta(seconds=every), last_run_at=now,
+        )
+        if taken:
+            enqueue(spec['task'], spec.get('args'), spec.get('kwargs'))
+            queued.append(entry)
+    return queued
+
+
+# ---- worker -----------------------------------------------------------------
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _lease_end(lease_seconds=None):
+    return timezone.now() + timedelta(seconds=lease_seconds or _setting('TASK_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+
+
+def claim(worker, limit, lease_seconds=None):
+    """Lease up to `limit` due tasks for `worker`; returns the leased rows."""
+    if limit <= 0:
+        return []
+    due = list(
+        BackgroundTask.objects.filter(status='queued', run_after__lte=timezone.now())
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    leased_until = _lease_end(lease_seconds)
+    claimed = [
+        task_id for task_id in due
+        if BackgroundTask.objects.filter(id=task_id, status='queued').update(
+            status='running', attempts=F('attempts') + 1, leased_until=leased_until, worker=worker,
+        )
+    ]
+    if not claimed:
+        return []
+    return list(BackgroundTask.objects.filter(id__in=claimed).order_by('run_after', 'id'))
+
+
+def extend_leases(task_ids, worker, lease_seconds=None):
+    """Push out the lease on tasks `worker` is still running."""
+    if not task_ids:
+        return 0
+    return BackgroundTask.objects.filter(id__in=task_ids, status='running', worker=worker).update(
+        leased_until=_lease_end(lease_seconds),
+    )
+
+
+def release_expired():
+    """Requeue running tasks whose lease ran out; fail those out of attempts.
+
+    Returns the number of tasks requeued.
+    """
+    expired = BackgroundTask.objects.filter(status='running', leased_until__lt=timezone.now())
+    expired.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', leased_until=None, finished_at=timezone.now(),
+        last_error='Lease expired; the worker running this task stopped',
+    )
+    return expired.update(status='queued', leased_until=None, worker='')
+
+
+def _record_failure(task, exc, permanent=False):
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, task.attempts - 1)))
+    failed = permanent or task.attempts >= task.max_attempts
+    status = 'failed' if failed else 'queued'
+    # Filter on the lease we hold: if it expired and the task moved on, leave it be
+    BackgroundTask.objects.filter(id=task.id, status='running', worker=task.worker, attempts=task.attempts).update(
+        status=status, leased_until=None, last_error=str(exc)[:2000] or type(exc).__name__,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        finished_at=timezone.now() if failed else None,
+    )
+    logger.warning('Task %s #%s attempt %s failed (%s): %s', task.name, task.id, task.attempts, status, exc)
+    return status
+
+
+def run_task(task):
+    """Run one leased task and record the outcome. Returns the new status."""
+    fn = _registry.get(task.name)
+    if fn is None:
+        autodiscover()
+        fn = _registry.get(task.name)
+    try:
+        if fn is None:
+            return _record_failure(task, LookupError(f'Unknown task {task.name}'), permanent=True)
+        try:
+            fn(*task.args, **task.kwargs)
+        except Exception as exc:
+            logger.exception('Task %s #%s raised', task.name, task.id)
+            return _record_failure(task, exc)
+        BackgroundTask.objects.filter(id=task.id, status='running', worker=task.worker, attempts=task.attempts).update(
+            status='done', leased_until=None, last_error='', finished_at=timezone.now(),
+        )
+        return 'done'
+    finally:
+        close_old_connections()
+
+
+def retry(queryset):
+    """Queue tasks to run again on the next worker pass."""
+    return queryset.exclude(status='running').update(
+        status='queued', attempts=0, last_error='', run_after=timezone.now(), finished_at=None,
+    )
+
+
+def purge(older_than=timedelta(days=7)):
+    """Delete finished tasks older than `older_than`; failed ones are kept."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = BackgroundTask.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
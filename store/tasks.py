@@ -1,28 +1,13 @@
 from __future__ import annotations
-from celery import shared_task
 from django.conf import settings
 import logging
 
 from .models import Order
+from .outbox import SiteRequest
+from .task_queue import shared_task
 from .views import _send_order_email
 
 
-class _DummyRequest:
-    """Small helper to provide build_absolute_uri for background tasks.
-
-    If `site_base` is provided it will be used as the absolute base URL.
-    """
-    def __init__(self, site_base: str | None):
-        self.site_base = (site_base or '').rstrip('/')
-
-    def build_absolute_uri(self, path: str) -> str:
-        if not self.site_base:
-            return path
-        if path.startswith('/'):
-            return f"{self.site_base}{path}"
-        return f"{self.site_base}/{path}"
-
-
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={'max_retries': 5})
 def send_order_email(self, order_id: int, template_base: str, subject: str, recipient_email: str, site_base: str | None = None):
     """Background task to send order-related emails (invoice/cancellation).
@@ -36,11 +21,79 @@ def send_order_email(self, order_id: int, template_base: str, subject: str, reci
         logger.warning('Order %s not found for send_order_email task', order_id)
         return
 
-    req = _DummyRequest(site_base)
+    req = SiteRequest(site_base)
     try:
         _send_order_email(order, template_base, subject, recipient_email, request=req)
         logger.info('send_order_email task completed for order %s', order.order_number)
     except Exception as exc:
         logger.exception('send_order_email task failed for order %s', order_id)
-        # Let Celery retry according to autoretry_for / retry_backoff
+        # Retried by Celery (autoretry_for / retry_backoff) or by run_worker
         raise
+
+
+@shared_task
+def process_webhook_event(event_id: int):
+    """Process one stored webhook event (see store.webhooks)."""
+    from .webhooks import process_event
+    return process_event(event_id)
+
+
+@shared_task
+def drain_webhook_inbox(limit: int = 100):
+    """Retry due webhook events; suitable for a Celery beat schedule."""
+    from .webhooks import drain, release_stale
+    release_stale()
+    return drain(limit=limit)
+
+
+@shared_task
+def drain_email_outbox(limit: int | None = None):
+    """Send due outbox emails; queued on commit and on a beat schedule for retries."""
+    from .outbox import drain, release_stale
+    release_stale()
+    return drain(limit)
+
+
+@shared_task
+def reconcile_payments(batch_size: int = 100, workers: int = 4):
+    """Periodic reconciliation of pending orders against the payment provider."""
+    from .reconciliation import reconcile_pending_orders
+    return reconcile_pending_orders(batch_size=batch_size, workers=workers)
+
+
+@shared_task
+def release_stock_reservations(batch_size: int = 1000):
+    """Delete expired stock holds (see store.inventory)."""
+    from .inventory import release_expired_reservations
+    return release_expired_reservations(batch_size=batch_size)
+
+
+@shared_task
+def snapshot_stock():
+    """Snapshot every product's ledger balance for point-in-time queries."""
+    from .inventory import take_stock_snapshot
+    return take_stock_snapshot()
+
+
+@shared_task
+def evaluate_stock_alerts():
+    """Full-catalogue stock alert pass, then prune old read notifications."""
+    from .stock_alerts import evaluate_stock_alerts as evaluate, prune_notifications
+    stats = evaluate()
+    stats['pruned'] = prune_notifications()
+    return stats
+
+
+@shared_task
+def run_maintenance():
+    """Run the due clean-up jobs in store.maintenance."""
+    from .maintenance import run_due
+    return run_due()
+
+
+@shared_task
+def build_report(job_id: int):
+    """Build one queued admin report (store.reports)."""
+    from .reports import build
+    job = build(job_id)
+    return job.status if job else None
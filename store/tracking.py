@@ -0,0 +1,77 @@
+"""In-memory change tracking for model fields.
+
+Signal handlers used to re-fetch an instance in pre_save just to learn a
+field's previous value, which doubled the cost of every write. Models mixing
+in `FieldTrackerMixin` keep the values of `tracked_fields` as they were
+loaded from (or last written to) the database instead.
+"""
+
+
+class FieldTrackerMixin:
+    """Remember the stored values of `tracked_fields` on model instances.
+
+    Snapshots are taken in ``from_db`` and refreshed after ``save()`` and
+    ``refresh_from_db()``, so handlers running during a save - including
+    post_save - still see the pre-save values. Instances built with
+    ``__init__`` have no stored values until their first save. Track scalar
+    fields only; values are not copied.
+    """
+
+    tracked_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # None until the instance is known to exist in the database
+        self._tracked_snapshot = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        if self._tracked_snapshot is None:
+            self._tracked_snapshot = {}
+        loaded = self.__dict__
+        for name in self.tracked_fields:
+            if fields is not None and name not in fields:
+                continue
+            attname = self._meta.get_field(name).attname
+            # Deferred fields are not in __dict__; they are read on demand
+            if attname in loaded:
+                self._tracked_snapshot[name] = loaded[attname]
+
+    def _load_stored_values(self, fields):
+        # Only needed for fields that were deferred when the instance was loaded
+        stored = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*fields).first() or {}
+        for name in fields:
+            self._tracked_snapshot[name] = stored.get(name)
+
+    def previous(self, field):
+        """Return the stored value of `field`, or None if the instance was never stored."""
+        if self._tracked_snapshot is None:
+            return None
+        if field not in self._tracked_snapshot:
+            self._load_stored_values([field])
+        return self._tracked_snapshot[field]
+
+    def has_changed(self, field):
+        """True if `field` differs from its stored value (always True before the first save)."""
+        if self._tracked_snapshot is None:
+            return True
+        return self.previous(field) != getattr(self, self._meta.get_field(field).attname)
+
+    def save(self, *args, **kwargs):
+        if self._tracked_snapshot is not None:
+            # Read deferred tracked fields before the write overwrites them
+            missing = [name for name in self.tracked_fields if name not in self._tracked_snapshot]
+            if missing:
+                self._load_stored_values(missing)
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields', args[3] if len(args) > 3 else None)
+        self._snapshot_tracked_fields(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_tracked_fields(fields)
@@ -1,7 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . import razorpay_integration
 
+if getattr(settings, 'PAYMENT_VIEWS_ASYNC', False):
+    create_payment_view = razorpay_integration.acreate_razorpay_payment
+    verify_payment_view = razorpay_integration.averify_razorpay_payment
+    payment_webhook_view = razorpay_integration.arazorpay_webhook
+else:
+    create_payment_view = razorpay_integration.create_razorpay_payment
+    verify_payment_view = razorpay_integration.verify_razorpay_payment
+    payment_webhook_view = razorpay_integration.razorpay_webhook
+
 urlpatterns = [
     # Authentication
     path('register/', views.register_view, name='register'),
@@ -61,6 +71,7 @@ urlpatterns = [
     path('order/<int:order_id>/', views.order_detail_view, name='order_detail'),
     path('order/<int:order_id>/resume/', views.resume_payment_view, name='resume_payment'),
     path('order-confirmation/<int:order_id>/', views.order_confirmation_view, name='order_confirmation'),
+    path('order/<int:order_id>/invoice/', views.download_invoice_view, name='download_invoice'),
     path('order/<int:order_id>/cancel/', views.cancel_order_view, name='cancel_order'),
     path('order/<int:order_id>/review/', views.submit_review_view, name='submit_review'),
     path('upi-payment/<int:order_id>/', views.upi_payment_view, name='upi_payment'),
@@ -68,9 +79,9 @@ urlpatterns = [
     path('verify-upi/<int:order_id>/', views.verify_upi_payment, name='verify_upi_payment'),
     # Payment endpoints (Stripe-backed integration is the primary path now)
     # Razorpay payment endpoints
-    path('payments/razorpay/create/<int:order_id>/', razorpay_integration.create_razorpay_payment, name='create_razorpay_payment'),
-    path('payments/razorpay/webhook/', razorpay_integration.razorpay_webhook, name='razorpay_webhook'),
-    path('payments/razorpay/verify/', razorpay_integration.verify_razorpay_payment, name='verify_razorpay_payment'),
+    path('payments/razorpay/create/<int:order_id>/', create_payment_view, name='create_razorpay_payment'),
+    path('payments/razorpay/webhook/', payment_webhook_view, name='razorpay_webhook'),
+    path('payments/razorpay/verify/', verify_payment_view, name='verify_razorpay_payment'),
     
     # Staff Routes
     path('staff/dashboard/', views.staff_dashboard_view, name='staff_dashboard'),
@@ -161,6 +172,10 @@ urlpatterns = [
     path('store-admin/block-user/<int:user_id>/', views.block_user_view, name='block_user'),
     path('store-admin/unblock-user/<int:user_id>/', views.unblock_user_view, name='unblock_user'),
     path('store-admin/export-orders/', views.export_orders_excel_view, name='export_orders_excel'),
+    path('store-admin/export/<slug:dataset>.<slug:fmt>', views.export_orders_data_view, name='export_orders_data'),
+    path('store-admin/reports/', views.admin_reports_view, name='admin_reports'),
+    path('store-admin/reports/status/', views.admin_report_status_view, name='admin_report_status'),
+    path('store-admin/reports/<int:job_id>/download/', views.admin_report_download_view, name='admin_report_download'),
     # Coupon Management
     path('store-admin/coupons/', views.admin_coupons_view, name='admin_coupons'),
     path('store-admin/add-coupon/', views.admin_add_coupon_view, name='admin_add_coupon'),
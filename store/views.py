@@ -88,6 +88,40 @@ def _guest_cart_total_counter(request):
     return _guest_cart_total_items(cart)
 
 
+# Product type -> (guest cart section, product id field)
+_GUEST_CART_SECTIONS = {'fish': ('fish', 'fish_id'), 'accessory': ('accessories', 'accessory_id'), 'plant': ('plants', 'plant_id')}
+
+
+def _cart_shopper(request):
+    user = request.user
+    return user if user.is_authenticated and getattr(user, 'role', None) == 'customer' else None
+
+
+def _cart_quantity(request, product_type, product_id, exclude_line=None):
+    """Units of a product already in the shopper's cart, over all its lines."""
+    section, field = _GUEST_CART_SECTIONS[product_type]
+    shopper = _cart_shopper(request)
+    if shopper is not None:
+        model = {'fish': Cart, 'accessory': AccessoryCart, 'plant': PlantCart}[product_type]
+        lines = model.objects.filter(user=shopper, **{field: product_id})
+        if exclude_line is not None:
+            lines = lines.exclude(id=exclude_line)
+        return lines.aggregate(total=models.Sum('quantity'))['total'] or 0
+    total = 0
+    for data in _ensure_guest_cart(request)[section].values():
+        if str(data.get(field)) == str(product_id):
+            try:
+                total += int(data.get('quantity', 0) or 0)
+            except (TypeError, ValueError):
+                continue
+    return total
+
+
+def _available_quantity(request, product_type, product_id):
+    """Stock the shopper can still buy: on hand less other shoppers' checkout holds."""
+    return available_to_sell(product_type, [product_id], exclude_user=_cart_shopper(request)).get(product_id, 0)
+
+
 def _merge_guest_cart_into_user(request, user):
     if not user or getattr(user, 'role', None) != 'customer':
         # Non-customer logins should not keep guest carts; clear to avoid reuse.
@@ -721,9 +755,14 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.mail import send_mail, EmailMultiAlternatives
-from django.http import JsonResponse, HttpResponse
+from django.http import (
+    JsonResponse, HttpResponse, FileResponse, Http404, HttpResponseForbidden, HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.contrib.auth.views import redirect_to_login
+from django.utils.http import parse_etags, quote_etag
 from django.db import models, transaction
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Sum, Count, Prefetch
 from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import update_session_auth_hash
@@ -744,6 +783,7 @@ from .models import (
     OrderItem,
     OrderAccessoryItem,
     OrderPlantItem,
+    OrderSummary,
     OTP,
     Review,
     Service,
@@ -777,15 +817,21 @@ from .forms import (
     PlantMediaForm,
     ShippingChargeForm,
     ShippingChargeByLocationForm,
+    ReportRequestForm,
 )
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import user_passes_test
 from django import forms
 from .models import ComboOffer, ComboItem
+from .inventory import InsufficientStock, available_to_sell, reserve_order_stock
+from .invoices import ensure_invoice, invoice_pdf_bytes
+from .outbox import queue_email, queue_order_email
+from .exports import DATASETS, FORMATS as EXPORT_FORMATS, InvalidCursor, export_orders, stream_export, write_orders_workbook
+from .invoice_renderer import get_invoice_renderer
+from .models import ReportJob
+from .reports import report_path, request_report
 from urllib.parse import quote_plus
 from datetime import timedelta
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
 # QR generation removed; keep imports out to avoid unused deps
 import uuid
 import smtplib
@@ -793,7 +839,10 @@ import socket
 import logging
 from collections import defaultdict
 from django.contrib.sessions.models import Session
+import hmac
 import os
+import tempfile
+import time
 
 
 @require_GET
@@ -1063,13 +1112,11 @@ def register_view(request):
             request.session['pending_registration_otp'] = otp_code
             request.session['pending_registration_time'] = timezone.now().isoformat()
 
-            # Send OTP email
-            send_mail(
+            # Send OTP email (delivered by the outbox worker)
+            queue_email(
+                data['email'],
                 f'Email Verification OTP - {settings.SITE_NAME}',
                 f"Your OTP for email verification is: {otp_code}\n\nThis OTP will expire in 5 minutes.",
-                settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
-                [data['email']],
-                fail_silently=False,
             )
 
             messages.success(request, 'We\'ve sent an OTP to your email. Please verify to complete registration.')
@@ -1183,78 +1230,66 @@ def terminate_user_sessions(user):
     return removed
 
 
-def _send_order_email(order, template_base, subject, recipient_email, request=None):
-    """Render email templates and send an order-related email (invoice/cancellation).
+def _build_order_email(order, template_base, subject, recipient_email, request=None):
+    """Render an order-related email (invoice/cancellation) without sending it.
 
     `template_base` should be the base filename under `store/emails/`, e.g. 'invoice' or 'order_cancelled'.
     """
-    try:
-        context = {
-            'order': order,
-            'order_items': order.items.all(),
-            'plant_items': order.plant_items.all() if hasattr(order, 'plant_items') else [],
-            'accessory_items': order.accessory_items.all() if hasattr(order, 'accessory_items') else [],
-            'site_name': settings.SITE_NAME,
-        }
-        if request is not None:
-            try:
-                context['order_url'] = request.build_absolute_uri(reverse('order_detail', args=[order.id]))
-            except Exception:
-                context['order_url'] = None
-
-        text_body = render_to_string(f'store/emails/{template_base}.txt', context)
-        html_body = render_to_string(f'store/emails/{template_base}.html', context)
+    context = {
+        'order': order,
+        'order_items': order.items.all(),
+        'plant_items': order.plant_items.all() if hasattr(order, 'plant_items') else [],
+        'accessory_items': order.accessory_items.all() if hasattr(order, 'accessory_items') else [],
+        'site_name': settings.SITE_NAME,
+    }
+    if request is not None:
+        try:
+            context['order_url'] = request.build_absolute_uri(reverse('order_detail', args=[order.id]))
+        except Exception:
+            context['order_url'] = None
 
-        # Use EmailMultiAlternatives to support HTML alternative and attachments
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_body,
-            from_email=settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
-            to=[recipient_email],
-        )
-        email.extra_headers = {'Reply-To': settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com'}
-        # Attach HTML alternative
-        email.attach_alternative(html_body, 'text/html')
-
-        # If sending invoice, generate PDF and save to media (fallback). Attaching
-        # the PDF to the email is controlled by `settings.INVOICE_ATTACHMENTS`.
-        download_url = None
-        pdf_bytes = None
-        if template_base == 'invoice':
-            try:
-                pdf_bytes = generate_invoice_pdf(order)
-                if pdf_bytes:
-                    # Save a copy to MEDIA so we can include a download link if email delivery fails
-                    try:
-                        invoices_dir = os.path.join(getattr(settings, 'MEDIA_ROOT', os.path.join(getattr(settings, 'BASE_DIR', ''), 'media')), 'invoices')
-                        os.makedirs(invoices_dir, exist_ok=True)
-                        filename = f'invoice-{order.order_number}.pdf'
-                        fs_path = os.path.join(invoices_dir, filename)
-                        with open(fs_path, 'wb') as f:
-                            f.write(pdf_bytes)
-                        # Build URL: prefer absolute if request present
-                        rel_url = os.path.join(getattr(settings, 'MEDIA_URL', '/media/'), 'invoices', filename).replace('\\', '/')
-                        if request is not None:
-                            try:
-                                download_url = request.build_absolute_uri(rel_url)
-                            except Exception:
-                                download_url = rel_url
-                        else:
-                            download_url = rel_url
-                    except Exception:
-                        logging.getLogger(__name__).exception('Failed to save invoice PDF to media for order %s', order.order_number)
-            except Exception:
-                logging.getLogger(__name__).exception('Failed to generate PDF invoice for order %s', order.order_number)
+    text_body = render_to_string(f'store/emails/{template_base}.txt', context)
+    html_body = render_to_string(f'store/emails/{template_base}.html', context)
 
-        # Attach the generated PDF to the email when configured. We do not
-        # include a download link in the email body to avoid exposing direct
-        # media links in emails.
+    # Use EmailMultiAlternatives to support HTML alternative and attachments
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        from_email=settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
+        to=[recipient_email],
+    )
+    email.extra_headers = {'Reply-To': settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com'}
+    # Attach HTML alternative
+    email.attach_alternative(html_body, 'text/html')
+
+    # Invoices come from the content-addressed store, so retries and
+    # resends reuse the stored PDF. Attaching it to the email is
+    # controlled by `settings.INVOICE_ATTACHMENTS`.
+    pdf_bytes = None
+    if template_base == 'invoice':
         try:
-            if getattr(settings, 'INVOICE_ATTACHMENTS', False) and pdf_bytes:
-                email.attach(f'invoice-{order.order_number}.pdf', pdf_bytes, 'application/pdf')
+            pdf_bytes = invoice_pdf_bytes(order)
         except Exception:
-            logging.getLogger(__name__).exception('Failed to attach PDF to email for order %s', order.order_number)
+            logging.getLogger(__name__).exception('Failed to generate PDF invoice for order %s', order.order_number)
+
+    # Attach the generated PDF to the email when configured. We do not
+    # include a download link in the email body to avoid exposing direct
+    # media links in emails.
+    try:
+        if getattr(settings, 'INVOICE_ATTACHMENTS', False) and pdf_bytes:
+            email.attach(f'invoice-{order.order_number}.pdf', pdf_bytes, 'application/pdf')
+    except Exception:
+        logging.getLogger(__name__).exception('Failed to attach PDF to email for order %s', order.order_number)
+    return email
+
 
+def _send_order_email(order, template_base, subject, recipient_email, request=None):
+    """Render and send an order-related email right away (see `_build_order_email`).
+
+    Request handlers queue order emails through `store.outbox` instead.
+    """
+    try:
+        email = _build_order_email(order, template_base, subject, recipient_email, request=request)
         try:
             email.send(fail_silently=False)
             logging.getLogger(__name__).info('Sent order email %s for order %s to %s', template_base, order.order_number, recipient_email)
@@ -1280,99 +1315,14 @@ def _ensure_order_inventory_deducted_locked(order):
     if getattr(order, 'status', None) != 'pending':
         return False
 
-    logger = logging.getLogger(__name__)
-    deducted = False
-
-    fish_items = list(order.items.select_related('fish')) if hasattr(order, 'items') else []
-    accessory_items = list(order.accessory_items.select_related('accessory')) if hasattr(order, 'accessory_items') else []
-    plant_items = list(order.plant_items.select_related('plant')) if hasattr(order, 'plant_items') else []
+    from .inventory import PRODUCT_MODELS, deduct_stock, order_quantities, release_order_stock
 
-    if fish_items:
-        qty_by_fish = defaultdict(int)
-        for item in fish_items:
-            try:
-                qty_by_fish[item.fish_id] += int(item.quantity or 0)
-            except Exception:
-                logger.exception('Invalid quantity for fish item %s on order %s', getattr(item, 'id', None), getattr(order, 'order_number', None))
-        if qty_by_fish:
-            fishes = {fish.id: fish for fish in Fish.objects.select_for_update().filter(id__in=qty_by_fish.keys())}
-            for fish_id, qty in qty_by_fish.items():
-                fish = fishes.get(fish_id)
-                if not fish or qty <= 0:
-                    continue
-                current_stock = int(fish.stock_quantity or 0)
-                new_stock = current_stock - qty
-                if new_stock < 0:
-                    logger.warning(
-                        'Order %s attempted to reduce fish %s stock below zero (%s -> %s)',
-                        getattr(order, 'order_number', None),
-                        fish_id,
-                        current_stock,
-                        new_stock,
-                    )
-                    new_stock = 0
-                if new_stock != current_stock:
-                    fish.stock_quantity = new_stock
-                    fish.save(update_fields=['stock_quantity'])
-                    deducted = True
-
-    if accessory_items:
-        qty_by_accessory = defaultdict(int)
-        for item in accessory_items:
-            try:
-                qty_by_accessory[item.accessory_id] += int(item.quantity or 0)
-            except Exception:
-                logger.exception('Invalid quantity for accessory item %s on order %s', getattr(item, 'id', None), getattr(order, 'order_number', None))
-        if qty_by_accessory:
-            accessories = {acc.id: acc for acc in Accessory.objects.select_for_update().filter(id__in=qty_by_accessory.keys())}
-            for accessory_id, qty in qty_by_accessory.items():
-                accessory = accessories.get(accessory_id)
-                if not accessory or qty <= 0:
-                    continue
-                current_stock = int(accessory.stock_quantity or 0)
-                new_stock = current_stock - qty
-                if new_stock < 0:
-                    logger.warning(
-                        'Order %s attempted to reduce accessory %s stock below zero (%s -> %s)',
-                        getattr(order, 'order_number', None),
-                        accessory_id,
-                        current_stock,
-                        new_stock,
-                    )
-                    new_stock = 0
-                if new_stock != current_stock:
-                    accessory.stock_quantity = new_stock
-                    accessory.save(update_fields=['stock_quantity'])
-                    deducted = True
-
-    if plant_items:
-        qty_by_plant = defaultdict(int)
-        for item in plant_items:
-            try:
-                qty_by_plant[item.plant_id] += int(item.quantity or 0)
-            except Exception:
-                logger.exception('Invalid quantity for plant item %s on order %s', getattr(item, 'id', None), getattr(order, 'order_number', None))
-        if qty_by_plant:
-            plants = {pl.id: pl for pl in Plant.objects.select_for_update().filter(id__in=qty_by_plant.keys())}
-            for plant_id, qty in qty_by_plant.items():
-                plant = plants.get(plant_id)
-                if not plant or qty <= 0:
-                    continue
-                current_stock = int(plant.stock_quantity or 0)
-                new_stock = current_stock - qty
-                if new_stock < 0:
-                    logger.warning(
-                        'Order %s attempted to reduce plant %s stock below zero (%s -> %s)',
-                        getattr(order, 'order_number', None),
-                        plant_id,
-                        current_stock,
-                        new_stock,
-                    )
-                    new_stock = 0
-                if new_stock != current_stock:
-                    plant.stock_quantity = new_stock
-                    plant.save(update_fields=['stock_quantity'])
-                    deducted = True
+    deducted = False
+    for product_type, quantities in order_quantities(order).items():
+        if deduct_stock(PRODUCT_MODELS[product_type], quantities, getattr(order, 'order_number', None)):
+            deducted = True
+    # The deduction above consumes whatever this order was holding
+    release_order_stock(order)
 
     order._inventory_deducted = True
     return deducted
@@ -1389,12 +1339,13 @@ def ensure_order_inventory_deducted(order):
 
 
 def finalize_order_payment(order, payment_id=None, request=None):
-    """Mark an order as paid, deduct stock, clear carts, and trigger invoice send."""
+    """Mark an order as paid, deduct stock, clear carts, and queue the invoice email."""
     logger = logging.getLogger(__name__)
     processed = False
 
     with transaction.atomic():
         locked_order = Order.objects.select_for_update().select_related('user').get(pk=order.pk)
+        lock_started = time.perf_counter()
 
         dirty_fields = []
         if payment_id and locked_order.transaction_id != payment_id:
@@ -1428,8 +1379,15 @@ def finalize_order_payment(order, payment_id=None, request=None):
             setattr(locked_order, '_skip_invoice_signal', True)
             locked_order.save()
 
+        if processed:
+            # Committed together with the payment; sent by store.outbox afterwards
+            queue_order_email(locked_order, 'invoice', f'Invoice - {settings.SITE_NAME} - {locked_order.order_number}',
+                              request=request)
+
         order = locked_order
 
+    logger.debug('Order %s row lock held %.1fms during finalization', order.order_number, (time.perf_counter() - lock_started) * 1000)
+
     if processed:
         try:
             Cart.objects.filter(user=order.user).delete()
@@ -1444,32 +1402,6 @@ def finalize_order_payment(order, payment_id=None, request=None):
             except Exception:
                 logger.debug('No coupon session to clear for order %s', getattr(order, 'order_number', None))
 
-        recipient = ''
-        if getattr(order, 'user', None):
-            recipient = (getattr(order.user, 'email', '') or '').strip()
-
-        if recipient:
-            subject = f'Invoice - {settings.SITE_NAME} - {order.order_number}'
-            site_base = request.build_absolute_uri('/') if request is not None else getattr(settings, 'SITE_URL', None)
-            dispatched = False
-
-            if getattr(settings, 'ORDER_EMAILS_ASYNC', False):
-                try:
-                    from store.tasks import send_order_email
-                    send_order_email.delay(order.id, 'invoice', subject, recipient, site_base)
-                    dispatched = True
-                except Exception:
-                    logger.info('Async invoice queueing failed; falling back to synchronous send for %s', getattr(order, 'order_number', None))
-
-            if not dispatched:
-                try:
-                    _send_order_email(order, 'invoice', subject, recipient, request=request)
-                    dispatched = True
-                except Exception:
-                    logger.exception('Synchronous invoice send failed for order %s', getattr(order, 'order_number', None))
-        else:
-            logger.warning('Skipping invoice email - no recipient for order %s', getattr(order, 'order_number', None))
-
     return processed, order
 
 
@@ -1477,291 +1409,12 @@ def generate_invoice_pdf(order):
     """Generate PDF invoice bytes using fpdf2. Returns bytes or None on error."""
     try:
         # Import fpdf locally so missing dependency doesn't break Django startup.
-        try:
-            from fpdf import FPDF
-        except Exception:
-            logging.getLogger(__name__).warning('fpdf2 package not available; invoice PDF generation disabled.')
-            return None
-
-        # Create a cleaner, more professional invoice layout using fpdf2
-        pdf = FPDF(unit='mm', format='A4')
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-
-        # Attempt to embed a Unicode-capable TTF (DejaVu Sans) from static/fonts/
-        use_unicode_font = False
-        try:
-            font_path = os.path.join(getattr(settings, 'BASE_DIR', ''), 'static', 'fonts', 'DejaVuSans.ttf')
-            if os.path.exists(font_path):
-                try:
-                    pdf.add_font('DejaVu', '', font_path, uni=True)
-                    # Also try bold variant if present (DejaVuSans-Bold.ttf)
-                    bold_path = os.path.join(getattr(settings, 'BASE_DIR', ''), 'static', 'fonts', 'DejaVuSans-Bold.ttf')
-                    if os.path.exists(bold_path):
-                        pdf.add_font('DejaVu', 'B', bold_path, uni=True)
-                    use_unicode_font = True
-                except Exception:
-                    logging.getLogger(__name__).warning('Failed to register DejaVu fonts; falling back to core fonts')
-        except Exception:
-            use_unicode_font = False
-
-        # Header: logo + company name (use site logo)
-        logo_path = os.path.join(getattr(settings, 'BASE_DIR', ''), 'static', 'images', 'logo.jpg')
-        if os.path.exists(logo_path):
-            try:
-                pdf.image(logo_path, x=15, y=10, w=30)
-            except Exception:
-                pass
-        # Move the site name down by 40px. Convert pixels to mm assuming 96 DPI
-        # (1 inch = 25.4 mm; px_to_mm = 25.4 / 96). 40px ≈ 10.583 mm.
-        try:
-            px_to_mm = 25.4 / 96.0
-            y_offset_mm = 40 * px_to_mm
-        except Exception:
-            y_offset_mm = 10.583
-        pdf.set_xy(50, 14.5 + y_offset_mm)
-        # Choose font family depending on availability
-        header_font = 'DejaVu' if use_unicode_font else 'Arial'
-        regular_font = 'DejaVu' if use_unicode_font else 'Arial'
-        pdf.set_font(header_font, 'B' if use_unicode_font else 'B', 18)
-        pdf.set_text_color(11, 83, 148)
-        pdf.cell(0, 8, settings.SITE_NAME, ln=True)
-        pdf.set_font(regular_font, '', 10)
-        pdf.set_text_color(80, 80, 80)
-        company_lines = [
-            getattr(settings, 'COMPANY_ADDRESS_LINE1', ''),
-            getattr(settings, 'COMPANY_ADDRESS_LINE2', ''),
-            getattr(settings, 'COMPANY_PHONE', '')
-        ]
-        for line in [l for l in company_lines if l]:
-            pdf.set_x(50)
-            pdf.cell(0, 5, line, ln=True)
-
-        pdf.ln(6)
-
-        # Invoice title and meta (right side)
-        pdf.set_font(header_font, 'B' if use_unicode_font else 'B', 14)
-        pdf.set_text_color(0, 0, 0)
-        pdf.cell(0, 8, f'INVOICE', ln=True, align='R')
-        pdf.set_font(regular_font, '', 10)
-        pdf.cell(0, 5, f'Invoice #: {order.order_number}', ln=True, align='R')
-        pdf.cell(0, 5, f'Date: {order.created_at.strftime("%Y-%m-%d")}', ln=True, align='R')
-
-        pdf.ln(4)
-
-        # Billing / Shipping details
-        pdf.set_font(header_font, 'B' if use_unicode_font else 'B', 11)
-        pdf.cell(95, 6, 'Bill To:', border=0)
-        pdf.cell(0, 6, 'Ship To:', border=0, ln=True)
-
-        pdf.set_font(regular_font, '', 10)
-        name = f"{order.user.first_name} {order.user.last_name}".strip() or order.user.username
-        bill_lines = [name, order.user.email or '']
-        ship_lines = (str(order.shipping_address) or '').split('\n') if order.shipping_address else ['N/A']
-
-        max_lines = max(len(bill_lines), len(ship_lines))
-        for i in range(max_lines):
-            left = bill_lines[i] if i < len(bill_lines) else ''
-            right = ship_lines[i] if i < len(ship_lines) else ''
-            pdf.cell(95, 5, left, border=0)
-            pdf.cell(0, 5, right, border=0, ln=True)
-
-        pdf.ln(6)
-
-        # Table header
-        pdf.set_fill_color(242, 246, 251)
-        pdf.set_text_color(11, 83, 148)
-        pdf.set_draw_color(180, 180, 180)
-        pdf.set_line_width(0.4)
-        pdf.set_font(regular_font, 'B' if use_unicode_font else 'B', 10)
-
-        col_item_w = 95
-        col_qty_w = 20
-        col_unit_w = 30
-        col_total_w = 30
-
-        th = 8
-        pdf.cell(col_item_w, th, 'Item', border=1, fill=True)
-        pdf.cell(col_qty_w, th, 'Qty', border=1, fill=True, align='R')
-        pdf.cell(col_unit_w, th, 'Unit', border=1, fill=True, align='R')
-        pdf.cell(col_total_w, th, 'Total', border=1, fill=True, align='R')
-        pdf.ln(th)
-
-        # Table rows — use single-line truncated names for clean alignment
-        pdf.set_font(regular_font, '', 10)
-        pdf.set_text_color(0, 0, 0)
-
-        def fmt(v):
-            try:
-                if use_unicode_font:
-                    return f'₹{float(v):,.2f}'
-                return f'Rs{float(v):,.2f}'
-            except Exception:
-                return str(v)
-
-        row_fill_toggle = False
-        for item in order.items.all():
-            row_fill = row_fill_toggle
-            row_fill_toggle = not row_fill_toggle
-            name = item.fish.name or ''
-            name_display = name if len(name) <= 60 else name[:57] + '...'
-            fill = 240 if row_fill else 255
-            if fill != 255:
-                pdf.set_fill_color(fill, fill, fill)
-            # Item cell
-            pdf.cell(col_item_w, 8, name_display, border=1, fill=(fill != 255))
-            pdf.cell(col_qty_w, 8, str(item.quantity), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_unit_w, 8, fmt(item.price), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_total_w, 8, fmt(item.get_total()), border=1, align='R', fill=(fill != 255))
-            pdf.ln(8)
-
-        # Accessory items (if any)
-        for a in (order.accessory_items.all() if hasattr(order, 'accessory_items') else []):
-            row_fill = row_fill_toggle
-            row_fill_toggle = not row_fill_toggle
-            name = a.accessory.name or ''
-            name_display = name if len(name) <= 60 else name[:57] + '...'
-            fill = 240 if row_fill else 255
-            if fill != 255:
-                pdf.set_fill_color(fill, fill, fill)
-            pdf.cell(col_item_w, 8, name_display, border=1, fill=(fill != 255))
-            pdf.cell(col_qty_w, 8, str(a.quantity), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_unit_w, 8, fmt(a.price), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_total_w, 8, fmt(a.get_total()), border=1, align='R', fill=(fill != 255))
-            pdf.ln(8)
-
-        for plant_item in (order.plant_items.all() if hasattr(order, 'plant_items') else []):
-            row_fill = row_fill_toggle
-            row_fill_toggle = not row_fill_toggle
-            name = plant_item.plant.name or ''
-            name_display = name if len(name) <= 60 else name[:57] + '...'
-            fill = 240 if row_fill else 255
-            if fill != 255:
-                pdf.set_fill_color(fill, fill, fill)
-            pdf.cell(col_item_w, 8, name_display, border=1, fill=(fill != 255))
-            pdf.cell(col_qty_w, 8, str(plant_item.quantity), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_unit_w, 8, fmt(plant_item.price), border=1, align='R', fill=(fill != 255))
-            pdf.cell(col_total_w, 8, fmt(plant_item.get_total()), border=1, align='R', fill=(fill != 255))
-            pdf.ln(8)
-
-        # Totals box
-        pdf.ln(6)
-        right_x = 15 + col_item_w + col_qty_w
-        pdf.set_x(right_x)
-        pdf.set_font('Arial', '', 10)
-        pdf.cell(col_unit_w, 6, 'Subtotal:', border=0)
-        pdf.cell(col_total_w, 6, fmt(order.total_amount), border=0, align='R', ln=True)
-        if order.discount_amount and float(order.discount_amount) > 0:
-            pdf.set_x(right_x)
-            pdf.cell(col_unit_w, 6, 'Discount:', border=0)
-            pdf.cell(col_total_w, 6, f"-{fmt(order.discount_amount)}", border=0, align='R', ln=True)
-        pdf.set_x(right_x)
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(col_unit_w, 8, 'Total:', border=0)
-        pdf.cell(col_total_w, 8, fmt(order.final_amount), border=0, align='R', ln=True)
-
-        pdf.ln(8)
-        pdf.set_font('Arial', '', 9)
-        pdf.multi_cell(0, 5, f'If you have any questions about this invoice, contact us at {getattr(settings, "DEFAULT_FROM_EMAIL", "support@aquafishstore.com")}')
-
-        # Footer
-        pdf.set_y(-30)
-        pdf.set_font('Arial', 'I', 8)
-        pdf.set_text_color(120, 120, 120)
-        pdf.cell(0, 5, f'Thank you for shopping with {settings.SITE_NAME}', ln=True, align='C')
-
-        result = pdf.output(dest='S')
-        # fpdf2 may return bytes or bytearray; ensure bytes
-        if isinstance(result, (bytes, bytearray)):
-            return bytes(result)
-        try:
-            return result.encode('latin-1')
-        except Exception:
-            return result.encode('utf-8', errors='replace')
-
-        # Logo
-        logo_path = os.path.join(getattr(settings, 'BASE_DIR', ''), 'static', 'images', 'hero-betta-fish.png')
-        if os.path.exists(logo_path):
-            try:
-                pdf.image(logo_path, x=10, y=8, w=25)
-            except Exception:
-                pass
-
-        pdf.set_font('Helvetica', 'B', 16)
-        pdf.cell(0, 10, settings.SITE_NAME, ln=True, align='R')
-        pdf.ln(4)
-
-        pdf.set_font('Helvetica', '', 10)
-        pdf.cell(0, 6, f'Invoice: {order.order_number}', ln=True, align='L')
-        pdf.cell(0, 6, f'Date: {order.created_at.strftime("%Y-%m-%d %H:%M")}', ln=True, align='L')
-        pdf.ln(4)
-
-        # Bill to
-        name = f"{order.user.first_name} {order.user.last_name}".strip() or order.user.username
-        pdf.set_font('Helvetica', 'B', 11)
-        pdf.cell(0, 6, 'Bill To:', ln=True)
-        pdf.set_font('Helvetica', '', 10)
-        pdf.multi_cell(0, 6, name)
-        if order.user.email:
-            pdf.multi_cell(0, 6, order.user.email)
-        if order.shipping_address:
-            for line in str(order.shipping_address).split('\n'):
-                if line.strip():
-                    pdf.multi_cell(0, 6, line.strip())
-
-        pdf.ln(6)
-
-        # Table header
-        pdf.set_fill_color(242, 246, 251)
-        pdf.set_text_color(11, 83, 148)
-        pdf.set_draw_color(200,200,200)
-        pdf.set_font('Helvetica', 'B', 10)
-        th = 8
-        pdf.cell(90, th, 'Item', border=1, fill=True)
-        pdf.cell(20, th, 'Qty', border=1, fill=True, align='R')
-        pdf.cell(30, th, 'Unit', border=1, fill=True, align='R')
-        pdf.cell(30, th, 'Total', border=1, fill=True, align='R')
-        pdf.ln(th)
-
-        # Table rows
-        pdf.set_font('Helvetica', '', 10)
-        pdf.set_text_color(0,0,0)
-        def fmt(v):
-            try:
-                return f'₹{float(v):,.2f}'
-            except Exception:
-                return str(v)
-
-        for item in order.items.all():
-            pdf.cell(90, 7, item.fish.name[:60], border=1)
-            pdf.cell(20, 7, str(item.quantity), border=1, align='R')
-            pdf.cell(30, 7, fmt(item.price), border=1, align='R')
-            pdf.cell(30, 7, fmt(item.get_total()), border=1, align='R')
-            pdf.ln(7)
-
-        # Totals
-        pdf.ln(4)
-        pdf.set_font('Helvetica', '', 10)
-        pdf.cell(140, 6, '', border=0)
-        pdf.cell(30, 6, 'Subtotal:', border=0)
-        pdf.cell(30, 6, fmt(order.total_amount), border=0, align='R')
-        pdf.ln(6)
-        if order.discount_amount and float(order.discount_amount) > 0:
-            pdf.cell(140, 6, '', border=0)
-            pdf.cell(30, 6, 'Discount:', border=0)
-            pdf.cell(30, 6, f"-{fmt(order.discount_amount)}", border=0, align='R')
-            pdf.ln(6)
-        pdf.set_font('Helvetica', 'B', 12)
-        pdf.cell(140, 8, '', border=0)
-        pdf.cell(30, 8, 'Total:', border=0)
-        pdf.cell(30, 8, fmt(order.final_amount), border=0, align='R')
-        pdf.ln(12)
-
-        pdf.set_font('Helvetica', '', 9)
-        pdf.multi_cell(0, 6, f'Thank you for shopping with {settings.SITE_NAME}')
-
-        out = pdf.output(dest='S').encode('latin-1')
-        return out
+        import fpdf  # noqa: F401
+    except Exception:
+        logging.getLogger(__name__).warning('fpdf2 package not available; invoice PDF generation disabled.')
+        return None
+    try:
+        return get_invoice_renderer().render(order)
     except Exception:
         logging.getLogger(__name__).exception('Error generating invoice PDF (fpdf) for order %s', getattr(order, 'order_number', None))
         return None
@@ -1778,12 +1431,10 @@ def resend_otp_view(request):
         request.session['pending_registration_otp'] = otp_code
         request.session['pending_registration_time'] = timezone.now().isoformat()
 
-        send_mail(
+        queue_email(
+            pending.get('email'),
             f'Email Verification OTP - {settings.SITE_NAME}',
             f"Your OTP for email verification is: {otp_code}\n\nThis OTP will expire in 5 minutes.",
-            settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
-            [pending.get('email')],
-            fail_silently=False,
         )
 
         messages.success(request, 'A new OTP has been sent to your email.')
@@ -1933,15 +1584,13 @@ def forgot_password_view(request):
                 return render(request, 'store/forgot_password.html')
             
             otp_code = OTP.generate_otp()
-            OTP.objects.create(user=user, otp_code=otp_code)
-            
-            send_mail(
-                f'Password Reset OTP - {settings.SITE_NAME}',
-                f'Your OTP for password reset is: {otp_code}\n\nThis OTP will expire in 5 minutes.',
-                settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
-                [user.email],
-                fail_silently=False,
-            )
+            with transaction.atomic():
+                OTP.objects.create(user=user, otp_code=otp_code)
+                queue_email(
+                    user.email,
+                    f'Password Reset OTP - {settings.SITE_NAME}',
+                    f'Your OTP for password reset is: {otp_code}\n\nThis OTP will expire in 5 minutes.',
+                )
             
             messages.success(request, 'OTP has been sent to your email.')
             return redirect('reset_password', user_id=user.id)
@@ -2678,7 +2327,9 @@ def fish_detail_view(request, fish_id):
     images = list(FishMedia.objects.filter(fish=fish, media_type='image')[:5])
     videos = list(FishMedia.objects.filter(fish=fish, media_type='video')[:2])
     media = images + videos
-    return render(request, 'store/customer/fish_detail.html', {'fish': fish, 'media': media})
+    return render(request, 'store/customer/fish_detail.html', {
+        'fish': fish, 'media': media, 'available': _available_quantity(request, 'fish', fish.id),
+    })
 
 
 def plant_detail_view(request, plant_id):
@@ -2708,6 +2359,7 @@ def plant_detail_view(request, plant_id):
 
     return render(request, 'store/customer/plant_detail.html', {
         'plant': plant,
+        'available': _available_quantity(request, 'plant', plant.id),
         'primary_image_url': primary_image_url,
         'modal_images': modal_images,
         'gallery_items': gallery_items,
@@ -2755,7 +2407,9 @@ def customer_accessories_view(request):
 
 def accessory_detail_view(request, accessory_id):
     accessory = get_object_or_404(Accessory, id=accessory_id, is_active=True, stock_quantity__gt=0)
-    return render(request, 'store/customer/accessory_detail.html', {'accessory': accessory})
+    return render(request, 'store/customer/accessory_detail.html', {
+        'accessory': accessory, 'available': _available_quantity(request, 'accessory', accessory.id),
+    })
 
 
 # Admin: Manage Fish Media
@@ -2895,6 +2549,14 @@ def add_to_cart_view(request, fish_id):
         messages.error(request, f'Minimum order quantity for {fish.name} is {fish.minimum_order_quantity}.')
         return redirect('fish_detail', fish_id=fish_id)
 
+    available = _available_quantity(request, 'fish', fish.id)
+    if _cart_quantity(request, 'fish', fish.id) + quantity > available:
+        msg = f'Only {available} units of {fish.name} available.'
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': False, 'message': msg}, status=400)
+        messages.error(request, msg)
+        return redirect('fish_detail', fish_id=fish_id)
+
     if request.user.is_authenticated and getattr(request.user, 'role', None) == 'customer':
         cart_item, created = Cart.objects.get_or_create(
             user=request.user,
@@ -2934,12 +2596,14 @@ def add_combo_to_cart_view(request, combo_id):
 
     # Validate all items first
     errors = []
-    for item in combo.items.select_related('fish').all():
+    combo_items = list(combo.items.select_related('fish').all())
+    available = available_to_sell('fish', [item.fish_id for item in combo_items], exclude_user=_cart_shopper(request))
+    for item in combo_items:
         fish = item.fish
         qty = max(1, int(item.quantity or 1))
-        if not fish.is_available or fish.stock_quantity <= 0:
+        if not fish.is_available or available.get(fish.id, 0) <= 0:
             errors.append(f"{fish.name} is not available.")
-        elif fish.stock_quantity < qty:
+        elif available.get(fish.id, 0) < qty + _cart_quantity(request, 'fish', fish.id):
             errors.append(f"Not enough stock for {fish.name} (requested {qty}).")
         elif qty < fish.minimum_order_quantity:
             errors.append(f"Minimum order for {fish.name} is {fish.minimum_order_quantity}.")
@@ -2989,6 +2653,14 @@ def add_accessory_to_cart_view(request, accessory_id):
         messages.error(request, 'Invalid quantity.')
         return redirect('accessory_detail', accessory_id=accessory_id)
 
+    available = _available_quantity(request, 'accessory', accessory.id)
+    if _cart_quantity(request, 'accessory', accessory.id) + quantity > available:
+        msg = f'Only {available} units of {accessory.name} available.'
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': False, 'message': msg}, status=400)
+        messages.error(request, msg)
+        return redirect('accessory_detail', accessory_id=accessory_id)
+
     try:
         if request.user.is_authenticated and getattr(request.user, 'role', None) == 'customer':
             cart_item, created = AccessoryCart.objects.get_or_create(
@@ -3056,8 +2728,9 @@ def add_plant_to_cart_view(request, plant_id):
         messages.error(request, msg)
         return redirect('plants')
 
-    if plant.stock_quantity is not None and plant.stock_quantity > 0 and quantity > plant.stock_quantity:
-        msg = f'Only {plant.stock_quantity} units available for {plant.name}.'
+    available = _available_quantity(request, 'plant', plant.id)
+    if _cart_quantity(request, 'plant', plant.id) + quantity > available:
+        msg = f'Only {available} units available for {plant.name}.'
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': False, 'message': msg}, status=400)
         messages.error(request, msg)
@@ -3219,6 +2892,12 @@ def update_cart_view(request, cart_id):
     if quantity > 0 and quantity < cart_item.fish.minimum_order_quantity:
         messages.error(request, f'Minimum order quantity for {cart_item.fish.name} is {cart_item.fish.minimum_order_quantity}.')
         return redirect('cart')
+
+    if quantity > 0:
+        available = _available_quantity(request, 'fish', cart_item.fish_id)
+        if _cart_quantity(request, 'fish', cart_item.fish_id, exclude_line=cart_item.id) + quantity > available:
+            messages.error(request, f'Only {available} units of {cart_item.fish.name} available.')
+            return redirect('cart')
     
     if quantity > 0:
         cart_item.quantity = quantity
@@ -3261,6 +2940,11 @@ def update_accessory_cart_view(request, accessory_cart_id):
         messages.error(request, f'Minimum order quantity for {a_item.accessory.name} is {a_item.accessory.minimum_order_quantity}.')
         return redirect('cart')
 
+    available = _available_quantity(request, 'accessory', a_item.accessory_id)
+    if quantity > available:
+        messages.error(request, f'Only {available} units of {a_item.accessory.name} available.')
+        return redirect('cart')
+
     if quantity > 0:
         a_item.quantity = quantity
         a_item.save()
@@ -3292,8 +2976,8 @@ def update_plant_cart_view(request, plant_cart_id):
         messages.error(request, f'Minimum order quantity for {p_item.plant.name} is {p_item.plant.minimum_order_quantity}.')
         return redirect('cart')
 
-    available = p_item.plant.stock_quantity
-    if available is not None and available >= 0 and quantity > available:
+    available = _available_quantity(request, 'plant', p_item.plant_id)
+    if quantity > available:
         messages.error(request, f'Only {available} units of {p_item.plant.name} available.')
         return redirect('cart')
 
@@ -3549,15 +3233,52 @@ def _build_upi_metadata(order):
     }
 
 
+def _create_order_lines(order, cart_items, accessory_items, plant_items):
+    """Create order lines with their product snapshot captured up front."""
+    lines = []
+    for cart_item in cart_items:
+        line = OrderItem(order=order, fish=cart_item.fish, quantity=cart_item.quantity, price=cart_item.fish.price)
+        line.capture_snapshot()
+        lines.append(line)
+    OrderItem.objects.bulk_create(lines)
+
+    lines = []
+    for a_item in accessory_items:
+        line = OrderAccessoryItem(order=order, accessory=a_item.accessory, quantity=a_item.quantity, price=a_item.accessory.price)
+        line.capture_snapshot()
+        lines.append(line)
+    OrderAccessoryItem.objects.bulk_create(lines)
+
+    lines = []
+    for p_item in plant_items:
+        line = OrderPlantItem(order=order, plant=p_item.plant, quantity=p_item.quantity, price=p_item.plant.price)
+        line.capture_snapshot()
+        lines.append(line)
+    OrderPlantItem.objects.bulk_create(lines)
+
+
+def _insufficient_stock_response(exc):
+    """409 JSON response listing the cart lines that can no longer be covered."""
+    return JsonResponse({
+        'error': 'Some items in your cart are no longer available in the requested quantity.',
+        'out_of_stock': [
+            {'name': name, 'requested': requested, 'available': available}
+            for name, requested, available in exc.shortages
+        ],
+    }, status=409)
+
+
 def create_draft_order(request):
     """AJAX endpoint: create or return a recent draft Order for the current user's cart.
 
     Returns JSON: { order_id, order_number, final_amount }
     """
     try:
-        cart_items = Cart.objects.filter(user=request.user).select_related('fish', 'combo')
-        accessory_items = AccessoryCart.objects.filter(user=request.user).select_related('accessory')
-        plant_items = PlantCart.objects.filter(user=request.user).select_related('plant')
+        cart_items = Cart.objects.filter(user=request.user).select_related(
+            'fish__breed', 'fish__category', 'combo'
+        )
+        accessory_items = AccessoryCart.objects.filter(user=request.user).select_related('accessory__category')
+        plant_items = PlantCart.objects.filter(user=request.user).select_related('plant__category')
 
         if not cart_items and not accessory_items and not plant_items:
             return JsonResponse({'error': 'Cart is empty'}, status=400)
@@ -3660,98 +3381,63 @@ Mobile :-"""
         kerala_rate_value, default_rate_value, _, _ = _get_shipping_rates()
         final_total = max(Decimal('0'), final_total) + delivery_charge
 
-        # Try to reuse a recent draft
-        draft_cutoff = timezone.now() - timedelta(minutes=30)
-        draft_order = Order.objects.filter(
-            user=request.user,
-            transaction_id__isnull=True,
-            status='pending',
-            created_at__gte=draft_cutoff,
-        ).order_by('-created_at').first()
-
-        if draft_order is None:
-            draft_order = Order.objects.create(
+        # Draft, lines and stock holds commit together: a shortage leaves the
+        # previous draft (and its holds) untouched
+        with transaction.atomic():
+            # Try to reuse a recent draft
+            draft_cutoff = timezone.now() - timedelta(minutes=30)
+            draft_order = Order.objects.filter(
                 user=request.user,
-                order_number=Order.generate_order_number(),
-                total_amount=total,
-                coupon=applied_coupon,
-                discount_amount=discount,
-                final_amount=final_total,
-                delivery_charge=delivery_charge,
-                total_weight=total_weight,
-                shipping_address=shipping_address,
-                shipping_state=shipping_state,
-                shipping_pincode=shipping_pincode,
-                phone_number=phone_number,
-                payment_method=payment_method,
-                payment_status='pending',
-            )
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=draft_order,
-                    fish=cart_item.fish,
-                    quantity=cart_item.quantity,
-                    price=cart_item.fish.price,
-                )
-            for a_item in accessory_items:
-                OrderAccessoryItem.objects.create(
-                    order=draft_order,
-                    accessory=a_item.accessory,
-                    quantity=a_item.quantity,
-                    price=a_item.accessory.price,
-                )
-            for p_item in plant_items:
-                OrderPlantItem.objects.create(
-                    order=draft_order,
-                    plant=p_item.plant,
-                    quantity=p_item.quantity,
-                    price=p_item.plant.price,
-                )
-        else:
-            # Refresh core order fields to match the current cart snapshot
-            draft_order.total_amount = total
-            draft_order.coupon = applied_coupon
-            draft_order.discount_amount = discount
-            draft_order.final_amount = final_total
-            draft_order.shipping_address = shipping_address
-            draft_order.shipping_state = shipping_state
-            draft_order.shipping_pincode = shipping_pincode
-            draft_order.phone_number = phone_number
-            draft_order.payment_method = payment_method
-            draft_order.status = 'pending'
-            draft_order.payment_status = 'pending'
-            draft_order.transaction_id = None
-            draft_order.provider_order_id = None
-            draft_order.delivery_charge = delivery_charge
-            draft_order.total_weight = total_weight
-            draft_order.save()
-
-            # Replace line items so the order mirrors the latest cart contents
-            draft_order.items.all().delete()
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=draft_order,
-                    fish=cart_item.fish,
-                    quantity=cart_item.quantity,
-                    price=cart_item.fish.price,
-                )
-
-            draft_order.accessory_items.all().delete()
-            for a_item in accessory_items:
-                OrderAccessoryItem.objects.create(
-                    order=draft_order,
-                    accessory=a_item.accessory,
-                    quantity=a_item.quantity,
-                    price=a_item.accessory.price,
-                )
-            draft_order.plant_items.all().delete()
-            for p_item in plant_items:
-                OrderPlantItem.objects.create(
-                    order=draft_order,
-                    plant=p_item.plant,
-                    quantity=p_item.quantity,
-                    price=p_item.plant.price,
+                transaction_id__isnull=True,
+                status='pending',
+                created_at__gte=draft_cutoff,
+            ).order_by('-created_at').first()
+
+            if draft_order is None:
+                draft_order = Order.objects.create(
+                    user=request.user,
+                    order_number=Order.generate_order_number(),
+                    total_amount=total,
+                    coupon=applied_coupon,
+                    discount_amount=discount,
+                    final_amount=final_total,
+                    delivery_charge=delivery_charge,
+                    total_weight=total_weight,
+                    shipping_address=shipping_address,
+                    shipping_state=shipping_state,
+                    shipping_pincode=shipping_pincode,
+                    phone_number=phone_number,
+                    payment_method=payment_method,
+                    payment_status='pending',
                 )
+                _create_order_lines(draft_order, cart_items, accessory_items, plant_items)
+            else:
+                # Refresh core order fields to match the current cart snapshot
+                draft_order.total_amount = total
+                draft_order.coupon = applied_coupon
+                draft_order.discount_amount = discount
+                draft_order.final_amount = final_total
+                draft_order.shipping_address = shipping_address
+                draft_order.shipping_state = shipping_state
+                draft_order.shipping_pincode = shipping_pincode
+                draft_order.phone_number = phone_number
+                draft_order.payment_method = payment_method
+                draft_order.status = 'pending'
+                draft_order.payment_status = 'pending'
+                draft_order.transaction_id = None
+                # provider_order_id is kept: create-payment reuses it while the
+                # amount is unchanged and issues a new one otherwise
+                draft_order.delivery_charge = delivery_charge
+                draft_order.total_weight = total_weight
+                draft_order.save()
+
+                # Replace line items so the order mirrors the latest cart contents
+                draft_order.items.all().delete()
+                draft_order.accessory_items.all().delete()
+                draft_order.plant_items.all().delete()
+                _create_order_lines(draft_order, cart_items, accessory_items, plant_items)
+
+            reserve_order_stock(draft_order)
 
         response_data = {
             'order_id': draft_order.id,
@@ -3777,6 +3463,8 @@ Mobile :-"""
                 logging.getLogger(__name__).exception('Failed generating UPI metadata for order %s', draft_order.order_number)
 
         return JsonResponse(response_data)
+    except InsufficientStock as exc:
+        return _insufficient_stock_response(exc)
     except Exception:
         logging.getLogger(__name__).exception('Failed to create draft order via AJAX')
         return JsonResponse({'error': 'Server error'}, status=500)
@@ -3785,15 +3473,32 @@ Mobile :-"""
 @login_required
 @user_passes_test(is_customer)
 def customer_orders_view(request):
-    # Show only paid orders in the customer's "My Orders" section
-    orders = Order.objects.filter(user=request.user, payment_status='paid').order_by('-created_at')
+    # Show only paid orders in the customer's "My Orders" section. Reads the
+    # OrderSummary projection so the page never touches order lines.
+    summaries = OrderSummary.objects.filter(user=request.user, payment_status='paid').order_by('-created_at')
+    paginator = Paginator(summaries, 10)
+    page_number = request.GET.get('page')
+    try:
+        orders = paginator.page(page_number or 1)
+    except PageNotAnInteger:
+        orders = paginator.page(1)
+    except EmptyPage:
+        orders = paginator.page(paginator.num_pages)
     return render(request, 'store/customer/orders.html', {'orders': orders})
 
 
 @login_required
 @user_passes_test(is_customer)
 def order_detail_view(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(
+        Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.order_by('id')),
+            Prefetch('accessory_items', queryset=OrderAccessoryItem.objects.order_by('id')),
+            Prefetch('plant_items', queryset=OrderPlantItem.objects.order_by('id')),
+        ),
+        id=order_id,
+        user=request.user,
+    )
     existing_review = Review.objects.filter(user=request.user, order=order).first()
     review_form = None
     if order.status == 'delivered' and not existing_review:
@@ -3809,18 +3514,37 @@ def order_detail_view(request, order_id):
 @user_passes_test(is_customer)
 def order_confirmation_view(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    invoice_url = None
-    if order.payment_status == 'paid':
-        invoice_filename = f'invoice-{order.order_number}.pdf'
-        invoice_path = os.path.join(settings.MEDIA_ROOT, 'invoices', invoice_filename)
-        if os.path.exists(invoice_path):
-            invoice_url = settings.MEDIA_URL + f'invoices/{invoice_filename}'
     return render(request, 'store/customer/order_confirmation.html', {
         'order': order,
-        'invoice_url': invoice_url,
+        'invoice_url': order.invoice_url,
     })
 
 
+@login_required
+def download_invoice_view(request, order_id):
+    """Serve a paid order's invoice PDF from the invoice store.
+
+    The ETag is the invoice content hash, so browsers revalidate with
+    If-None-Match and get a 304 until the order's invoice content changes.
+    """
+    order = get_object_or_404(Order.objects.select_related('user'), id=order_id, payment_status='paid')
+    if order.user_id != request.user.id and not is_staff(request.user):
+        raise Http404('Invoice not found')
+    invoice = ensure_invoice(order)
+    if invoice is None:
+        raise Http404('Invoice not available')
+
+    etag = quote_etag(invoice.sha256)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(invoice.path, 'rb'), content_type='application/pdf',
+                                filename=f'invoice-{order.order_number}.pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 @user_passes_test(is_customer)
 def resume_payment_view(request, order_id):
@@ -3875,20 +3599,14 @@ def cancel_order_view(request, order_id):
     if request.method == 'POST':
         # Only allow cancellation for pending or processing orders
         if order.status in ['pending', 'processing']:
-            order.status = 'cancelled'
-            order.save()
-            # Send cancellation email to customer
-            try:
-                subject = f'Order Cancelled - {settings.SITE_NAME} - {order.order_number}'
-                try:
-                    from store.tasks import send_order_email
-                    site_base = request.build_absolute_uri('/') if request is not None else getattr(settings, 'SITE_URL', None)
-                    send_order_email.delay(order.id, 'order_cancelled', subject, order.user.email, site_base)
-                except Exception:
-                    logging.getLogger(__name__).exception('Celery task import failed; falling back to synchronous send for order %s', order.order_number)
-                    _send_order_email(order, 'order_cancelled', subject, order.user.email, request=request)
-            except Exception:
-                logging.getLogger(__name__).exception('Error sending cancellation email for order %s', order.order_number)
+            with transaction.atomic():
+                order.status = 'cancelled'
+                order.save()
+                # Cancellation email to the customer, sent once the cancellation commits;
+                # every cancellation gets one, even of a reinstated order
+                queue_order_email(order, 'order_cancelled',
+                                  f'Order Cancelled - {settings.SITE_NAME} - {order.order_number}', request=request,
+                                  dedupe=False)
             messages.success(request, f'Order #{order.order_number} has been cancelled successfully.')
         else:
             messages.error(request, f'Order #{order.order_number} cannot be cancelled at this stage.')
@@ -3907,20 +3625,14 @@ def admin_cancel_order_view(request, order_id):
     if request.method == 'POST':
         # Only allow cancellation for pending or processing orders
         if order.status in ['pending', 'processing']:
-            order.status = 'cancelled'
-            order.save()
-            # Send cancellation email to customer
-            try:
-                subject = f'Order Cancelled - {settings.SITE_NAME} - {order.order_number}'
-                try:
-                    from store.tasks import send_order_email
-                    site_base = request.build_absolute_uri('/') if request is not None else getattr(settings, 'SITE_URL', None)
-                    send_order_email.delay(order.id, 'order_cancelled', subject, order.user.email, site_base)
-                except Exception:
-                    logging.getLogger(__name__).exception('Celery task import failed; falling back to synchronous send for order %s', order.order_number)
-                    _send_order_email(order, 'order_cancelled', subject, order.user.email, request=request)
-            except Exception:
-                logging.getLogger(__name__).exception('Error sending cancellation email for order %s', order.order_number)
+            with transaction.atomic():
+                order.status = 'cancelled'
+                order.save()
+                # Cancellation email to the customer, sent once the cancellation commits;
+                # every cancellation gets one, even of a reinstated order
+                queue_order_email(order, 'order_cancelled',
+                                  f'Order Cancelled - {settings.SITE_NAME} - {order.order_number}', request=request,
+                                  dedupe=False)
             messages.success(request, f'Order #{order.order_number} has been cancelled successfully.')
         else:
             messages.error(request, f'Order #{order.order_number} cannot be cancelled at this stage.')
@@ -4864,22 +4576,17 @@ def add_staff_view(request):
                 user.set_unusable_password()
             user.save()
             # Send a simple welcome email (do not include passwords in email)
-            try:
-                send_mail(
-                    f'You have been added as Staff - {settings.SITE_NAME}',
-                    (
-                        f"Hello {user.username},\n\n"
-                        f"You've been added as staff to {settings.SITE_NAME}.\n\n"
-                        "You can now login using your account credentials. If you did not set a password, please use the password reset flow.\n\n"
-                        f"Thanks,\n{settings.SITE_NAME}"
-                    ),
-                    settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com',
-                    [user.email],
-                    fail_silently=False,
-                )
-                messages.success(request, 'Staff member added and notification email sent successfully.')
-            except Exception as e:
-                messages.warning(request, f'Staff member added, but failed to send email: {e}')
+            queue_email(
+                user.email,
+                f'You have been added as Staff - {settings.SITE_NAME}',
+                (
+                    f"Hello {user.username},\n\n"
+                    f"You've been added as staff to {settings.SITE_NAME}.\n\n"
+                    "You can now login using your account credentials. If you did not set a password, please use the password reset flow.\n\n"
+                    f"Thanks,\n{settings.SITE_NAME}"
+                ),
+            )
+            messages.success(request, 'Staff member added and notification email queued.')
             return redirect('admin_staff_list')
     else:
         form = StaffCreateForm()
@@ -5950,15 +5657,14 @@ def admin_order_detail_view(request, order_id):
                 return redirect('admin_order_detail', order_id=order.id)
 
             subject_line = subject or f'Update on Order {order.order_number}'
-            from_email = settings.DEFAULT_FROM_EMAIL or 'noreply@aquafishstore.com'
 
             try:
-                send_mail(subject_line, message_body, from_email, [recipient], fail_silently=False)
+                queue_email(recipient, subject_line, message_body, order=order)
             except Exception:
-                logging.getLogger(__name__).exception('Failed to send admin order email for order %s', order.id)
+                logging.getLogger(__name__).exception('Failed to queue admin order email for order %s', order.id)
                 messages.error(request, 'Failed to send email. Please try again later.')
             else:
-                messages.success(request, 'Email sent to customer successfully.')
+                messages.success(request, 'Email queued for the customer.')
 
             return redirect('admin_order_detail', order_id=order.id)
 
@@ -6032,181 +5738,130 @@ def unblock_user_view(request, user_id):
     return redirect('admin_users')
 
 
+def _filter_errors_response(form):
+    """JSON 400 listing an export filter form's errors."""
+    errors = '; '.join(f'{field}: {error}' for field, errors in form.errors.items() for error in errors)
+    return JsonResponse({'error': errors}, status=400)
+
+
 @login_required
 @user_passes_test(is_admin)
 def export_orders_excel_view(request):
-    # When exporting, omit payment-pending orders unless specifically requested
-    orders = Order.objects.exclude(payment_status='pending').order_by('-created_at')
-    
-    # Filter
-    status = request.GET.get('status')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    if status:
-        orders = orders.filter(status=status)
-    if start_date:
-        orders = orders.filter(created_at__gte=start_date)
-    if end_date:
-        orders = orders.filter(created_at__lte=end_date)
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    
-    # Sheet 1: Orders Summary
-    ws1 = wb.active
-    ws1.title = "Orders Summary"
-    
-    # Orders Summary Headers
-    summary_headers = [
-        'Order Number', 'Customer Username', 'Customer Email', 'Customer Phone', 
-        'Total Amount', 'Order Status', 'Payment Method', 'Payment Status', 'Transaction ID',
-        'Shipping Address', 'Contact Phone', 'Total Items', 'Order Created', 'Last Updated'
-    ]
-    ws1.append(summary_headers)
-    
-    # Style header
-    header_fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    
-    for cell in ws1[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Orders Summary Data
-    for order in orders:
-        total_items = order.items.aggregate(total=models.Sum('quantity'))['total'] or 0
-        ws1.append([
-            order.order_number,
-            order.user.username,
-            order.user.email,
-            order.user.phone_number if order.user.phone_number else 'N/A',
-            float(order.total_amount),
-            order.get_status_display(),
-            order.get_payment_method_display(),
-            order.get_payment_status_display(),
-            order.transaction_id if order.transaction_id else 'N/A',
-            order.shipping_address,
-            order.phone_number,
-            total_items,
-            order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            order.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-        ])
-    
-    # Auto-adjust column widths for summary sheet
-    for column in ws1.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws1.column_dimensions[column_letter].width = adjusted_width
-    
-    # Sheet 2: Detailed Order Items
-    ws2 = wb.create_sheet(title="Order Items Detail")
-    
-    # Order Items Headers
-    items_headers = [
-        'Order Number', 'Customer Name', 'Fish Name', 'Fish Breed', 'Fish Category',
-        'Quantity', 'Unit Price', 'Item Total', 'Order Status', 'Order Date'
-    ]
-    ws2.append(items_headers)
-    
-    # Style items header
-    for cell in ws2[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Order Items Data
-    for order in orders:
-        for item in order.items.all():
-            ws2.append([
-                order.order_number,
-                order.user.username,
-                item.fish.name,
-                item.fish.breed.name,
-                item.fish.category.name,
-                item.quantity,
-                float(item.price),
-                float(item.get_total()),
-                order.get_status_display(),
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            ])
-    
-    # Auto-adjust column widths for items sheet
-    for column in ws2.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws2.column_dimensions[column_letter].width = adjusted_width
-    
-    # Sheet 3: Customer Information
-    ws3 = wb.create_sheet(title="Customer Details")
-    
-    # Get unique customers from filtered orders
-    customer_ids = orders.values_list('user_id', flat=True).distinct()
-    customers = CustomUser.objects.filter(id__in=customer_ids)
-    
-    # Customer Headers
-    customer_headers = [
-        'Username', 'Email', 'Phone Number', 'Date Joined', 
-        'Email Verified', 'Total Orders', 'Total Spent'
-    ]
-    ws3.append(customer_headers)
-    
-    # Style customer header
-    for cell in ws3[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Customer Data
-    for customer in customers:
-        customer_orders = orders.filter(user=customer)
-        total_orders = customer_orders.count()
-        total_spent = customer_orders.aggregate(total=models.Sum('total_amount'))['total'] or 0
-        
-        ws3.append([
-            customer.username,
-            customer.email,
-            customer.phone_number if customer.phone_number else 'N/A',
-            customer.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'Yes' if customer.email_verified else 'No',
-            total_orders,
-            float(total_spent),
-        ])
-    
-    # Auto-adjust column widths for customer sheet
-    for column in ws3.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws3.column_dimensions[column_letter].width = adjusted_width
-    
-    # Response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    # Same filter validation as the CSV/NDJSON export
+    form = OrderFilterForm(request.GET)
+    if not form.is_valid():
+        return _filter_errors_response(form)
+    # Payment-pending orders are omitted from exports
+    orders = export_orders(form.cleaned_data)
+    # Write-only workbook spooled to disk, then streamed from there
+    fh = tempfile.TemporaryFile()
+    try:
+        write_orders_workbook(orders, fh)
+        fh.seek(0)
+    except Exception:
+        fh.close()
+        raise
+    return FileResponse(
+        fh, as_attachment=True, filename='orders_detailed_report.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    response['Content-Disposition'] = 'attachment; filename="orders_detailed_report.xlsx"'
-    wb.save(response)
+
+
+def _export_token_ok(request):
+    token = getattr(settings, 'EXPORT_API_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and header.startswith('Bearer ') and hmac.compare_digest(header[7:].strip(), token)
+
+
+@require_GET
+def export_orders_data_view(request, dataset, fmt):
+    """Orders or order lines as streamed CSV/NDJSON for accounting and BI tools.
+
+    Takes the Excel export's filters plus ``cursor`` (resume after the order
+    a row came from) and ``limit`` (orders per response). Admins use their
+    session; scripts send ``Authorization: Bearer <EXPORT_API_TOKEN>``.
+    """
+    if not _export_token_ok(request):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not is_admin(request.user):
+            return HttpResponseForbidden()
+    if dataset not in DATASETS or fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export')
+    # Same 400 JSON for bad filters, limit and cursor
+    form = OrderFilterForm(request.GET)
+    if not form.is_valid():
+        return _filter_errors_response(form)
+    limit = request.GET.get('limit') or None
+    if limit is not None:
+        if not limit.isdigit() or int(limit) <= 0:
+            return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+        limit = int(limit)
+    try:
+        chunks = stream_export(dataset, fmt, export_orders(form.cleaned_data),
+                               cursor=request.GET.get('cursor') or None, limit=limit)
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_reports_view(request):
+    """Request background reports and download finished ones."""
+    if request.method == 'POST':
+        form = ReportRequestForm(request.POST)
+        if form.is_valid():
+            job = request_report(form.cleaned_data['kind'], form.report_params(), request.user)
+            messages.success(request, f'{job.get_kind_display()} queued. It will appear below when ready.')
+            return redirect('admin_reports')
+        messages.error(request, 'Please correct the report options.')
+    else:
+        # Prefilled from the orders page's filters
+        initial = {'kind': 'orders_xlsx'}
+        initial.update({name: request.GET[name] for name in ('kind', 'status', 'start_date', 'end_date')
+                        if request.GET.get(name)})
+        form = ReportRequestForm(initial=initial)
+    jobs = ReportJob.objects.select_related('requested_by').order_by('-created_at')[:50]
+    return render(request, 'store/admin/reports.html', {
+        'form': form,
+        'jobs': jobs,
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_GET
+def admin_report_status_view(request):
+    """Progress of the report jobs in ``ids`` (comma separated), for polling."""
+    ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip().isdigit()][:100]
+    jobs = ReportJob.objects.filter(id__in=ids)
+    return JsonResponse({'jobs': [{
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'parts_done': job.parts_done,
+        'parts_total': job.parts_total,
+        'row_count': job.row_count,
+        'file_size': job.file_size,
+        'error': job.error,
+        'download_url': reverse('admin_report_download', args=[job.id]) if job.status == 'done' else None,
+    } for job in jobs]})
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_GET
+def admin_report_download_view(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id, status='done')
+    path = report_path(job)
+    if not path or not os.path.exists(path):
+        raise Http404('This report has expired')
+    response = FileResponse(open(path, 'rb'), as_attachment=True, filename=job.download_name)
+    response['Cache-Control'] = 'no-store'
     return response
 
 
@@ -6343,12 +5998,13 @@ def change_password_view(request):
 
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
-import razorpay
+from .payments import get_payment_provider
 
 def start_payment(request):
     amount = 50000  # amount in paise (₹500)
 
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    # Shared provider client: reuses the pooled keep-alive session
+    client = get_payment_provider('razorpay').client
 
     # Create order
     payment = client.order.create({
@@ -0,0 +1,242 @@
+"""Durable inbox for payment provider webhooks.
+
+The webhook view verifies the signature, calls `record_event` and returns
+200 straight away. Events are then processed by `process_event`, either on a
+small in-process thread pool, a background task, or the `webhook_inbox drain`
+management command, depending on `WEBHOOK_DISPATCH`:
+
+* ``thread`` (default) - hand the event to a bounded background pool once the
+  insert has committed.
+* ``task`` (or ``celery``) - queue `store.tasks.process_webhook_event` on the
+  task backend (`store.task_queue`).
+* ``none`` - leave it for `python manage.py webhook_inbox drain`.
+
+Failed events are retried with exponential backoff up to
+`WEBHOOK_MAX_ATTEMPTS` times and then left in the ``failed`` state for
+inspection and replay. The 'webhooks' maintenance job (`store.maintenance`)
+requeues events left 'processing' by a dead worker and processes retries as
+they come due.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_CONCURRENCY = 2
+# Backoff grows 30s, 60s, 120s ... capped at one hour
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+class WebhookProcessingError(Exception):
+    """Raised by a handler when an event should be retried later."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def event_id_for(request, body):
+    """Return the provider's event id, or a digest of the body if it is absent."""
+    event_id = request.META.get('HTTP_X_RAZORPAY_EVENT_ID')
+    if event_id:
+        return event_id[:100]
+    return 'sha256:' + hashlib.sha256(body or b'').hexdigest()
+
+
+def record_event(provider, event_id, event):
+    """Store a verified webhook. Returns (WebhookEvent, created)."""
+    event_type = (event.get('event') or '')[:64] if isinstance(event, dict) else ''
+    try:
+        with transaction.atomic():
+            obj = WebhookEvent.objects.create(
+                provider=provider,
+                event_id=event_id,
+                event_type=event_type,
+                payload=event if isinstance(event, dict) else {},
+            )
+        return obj, True
+    except IntegrityError:
+        return WebhookEvent.objects.get(provider=provider, event_id=event_id), False
+
+
+# ---- handlers ---------------------------------------------------------------
+
+def _handle_payment_captured(payload):
+    payment_entity = payload.get('payment', {}).get('entity', {})
+    notes = payment_entity.get('notes', {}) or {}
+    # Prefer provider order id, but also use order_number from notes/receipt
+    # because users can retry checkout and provider ids can rotate.
+    return (
+        payment_entity.get('order_id'),
+        payment_entity.get('id'),
+        notes.get('order_number') or payment_entity.get('receipt'),
+    )
+
+
+def _handle_order_paid(payload):
+    order_entity = payload.get('order', {}).get('entity', {})
+    payment_entity = payload.get('payment', {}).get('entity', {})
+    order_number = order_entity.get('receipt')
+    if not order_number:
+        notes = payment_entity.get('notes', {}) or {}
+        order_number = notes.get('order_number')
+    return (
+        order_entity.get('id') or payment_entity.get('order_id'),
+        payment_entity.get('id'),
+        order_number,
+    )
+
+
+PAYMENT_EVENT_HANDLERS = {
+    'payment.captured': _handle_payment_captured,
+    'order.paid': _handle_order_paid,
+}
+
+
+def handle_event(event):
+    """Apply a single event. Returns False when the event type is not handled."""
+    handler = PAYMENT_EVENT_HANDLERS.get(event.event_type)
+    if handler is None:
+        return False
+    provider_order, payment_id, order_number = handler((event.payload or {}).get('payload', {}))
+
+    from .razorpay_integration import _finalize_payment
+
+    if not _finalize_payment(provider_order, payment_id=payment_id, order_number=order_number):
+        # The order may not be linked to the provider id yet; try again later
+        raise WebhookProcessingError(f'No order finalized for provider order {provider_order!r}')
+    return True
+
+
+# ---- processing -------------------------------------------------------------
+
+def _claim(event_id):
+    """Atomically move a due event to 'processing'. Returns the row or None."""
+    now = timezone.now()
+    claimed = WebhookEvent.objects.filter(
+        id=event_id, status='pending', next_attempt_at__lte=now,
+    ).update(status='processing', attempts=F('attempts') + 1, next_attempt_at=now)
+    if not claimed:
+        return None
+    return WebhookEvent.objects.get(id=event_id)
+
+
+def process_event(event_id):
+    """Claim and process one event. Returns the final status or None if not claimed."""
+    event = _claim(event_id)
+    if event is None:
+        return None
+
+    max_attempts = _setting('WEBHOOK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    try:
+        handle_event(event)
+    except Exception as exc:
+        if not isinstance(exc, WebhookProcessingError):
+            logger.exception('Webhook event %s failed', event.event_id)
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, event.attempts - 1)))
+        event.last_error = str(exc)[:2000]
+        event.status = 'failed' if event.attempts >= max_attempts else 'pending'
+        event.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        event.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+        logger.warning('Webhook event %s attempt %s failed (%s): %s', event.event_id, event.attempts, event.status, exc)
+        return event.status
+
+    event.status = 'processed'
+    event.last_error = ''
+    event.processed_at = timezone.now()
+    event.save(update_fields=['status', 'last_error', 'processed_at'])
+    return event.status
+
+
+def release_stale(older_than=timedelta(minutes=15)):
+    """Return events stuck in 'processing' (e.g. a worker died) to the queue.
+
+    While an event is processing, `next_attempt_at` holds the time it was claimed.
+    """
+    cutoff = timezone.now() - older_than
+    return WebhookEvent.objects.filter(status='processing', next_attempt_at__lt=cutoff).update(status='pending')
+
+
+def replay(queryset):
+    """Reset events so they are processed again on the next drain."""
+    return queryset.update(status='pending', attempts=0, last_error='', next_attempt_at=timezone.now())
+
+
+def _process_in_thread(event_id):
+    try:
+        return process_event(event_id)
+    finally:
+        close_old_connections()
+
+
+def drain(limit=100, concurrency=None):
+    """Process up to `limit` due events with at most `concurrency` threads.
+
+    Returns a dict counting final statuses.
+    """
+    concurrency = max(1, concurrency or _setting('WEBHOOK_WORKER_CONCURRENCY', DEFAULT_CONCURRENCY))
+    due = list(
+        WebhookEvent.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    results = {}
+    if not due:
+        return results
+    if concurrency == 1:
+        for event_id in due:
+            status = process_event(event_id)
+            results[status] = results.get(status, 0) + 1
+        return results
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook') as pool:
+        futures = [pool.submit(_process_in_thread, event_id) for event_id in due]
+        for future in as_completed(futures):
+            status = future.result()
+            results[status] = results.get(status, 0) + 1
+    return results
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, _setting('WEBHOOK_WORKER_CONCURRENCY', DEFAULT_CONCURRENCY)),
+                thread_name_prefix='webhook',
+            )
+        return _executor
+
+
+def dispatch(event):
+    """Schedule processing of a freshly recorded event per `WEBHOOK_DISPATCH`."""
+    mode = (_setting('WEBHOOK_DISPATCH', 'thread') or 'thread').lower()
+    if mode == 'none':
+        return
+
+    def _send():
+        if mode in ('task', 'celery'):
+            try:
+                from store.tasks import process_webhook_event
+                process_webhook_event.delay(event.id)
+                return
+            except Exception:
+                logger.info('Queueing webhook event %s as a task failed; processing in-process', event.event_id)
+        _get_executor().submit(_process_in_thread, event.id)
+
+    transaction.on_commit(_send)
@@ -0,0 +1,114 @@
+"""Benchmark: invoice PDF rendering with and without preloaded fonts and logo.
+
+Creates throwaway orders (three lines each), then renders their invoices
+three ways:
+
+- ``per-call``  - a new InvoiceRenderer per invoice, so fonts and logo are
+  parsed for every document, which is what generate_invoice_pdf used to do;
+- ``preloaded`` - one renderer reused for every invoice;
+- ``subset``    - one reused renderer with INVOICE_FONT_SUBSET behaviour.
+
+For each it reports the latency of a single render (p50 over ``--single``
+renders) and the throughput of a batch of ``--orders`` invoices. Order lines
+are prefetched so the numbers cover rendering only; nothing is written to
+MEDIA_ROOT.
+
+Usage (against a development database; fonts from INVOICE_FONT_DIR unless
+--font-dir is given):
+    python tools/bench_invoices.py --orders 200 --font-dir /usr/share/fonts/truetype/dejavu
+"""
+import argparse
+import os
+import pathlib
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def report(label, single, batch, count, size):
+    print(
+        f"{label:>10}: single p50 {statistics.median(single) * 1000:7.1f} ms "
+        f"({1 / statistics.median(single):6.1f}/s) | batch of {count}: {batch:6.2f}s "
+        f"({count / batch:6.1f}/s) | {size / 1024:.0f} KiB/pdf"
+    )
+
+
+def run(label, make_renderer, orders, single_runs):
+    renderer = make_renderer()
+    # The first render of a shared renderer pays the one-time load
+    started = time.perf_counter()
+    size = len(renderer.render(orders[0]))
+    first = time.perf_counter() - started
+
+    single = []
+    for order in orders[:single_runs]:
+        started = time.perf_counter()
+        make_renderer().render(order) if label == 'per-call' else renderer.render(order)
+        single.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for order in orders:
+        (make_renderer() if label == 'per-call' else renderer).render(order)
+    batch = time.perf_counter() - started
+    report(label, single, batch, len(orders), size)
+    return first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--orders', type=int, default=100, help='Invoices per batch')
+    parser.add_argument('--single', type=int, default=20, help='Single renders timed for the p50')
+    parser.add_argument('--font-dir', help='Directory with DejaVuSans*.ttf (default: INVOICE_FONT_DIR)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fishy_friend_aquatics.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from store.invoice_renderer import FONT_FILES, InvoiceRenderer
+    from store.models import Order, OrderAccessoryItem, OrderItem, OrderPlantItem
+
+    font_dir = args.font_dir or settings.INVOICE_FONT_DIR
+    if not os.path.exists(os.path.join(font_dir, FONT_FILES[''])):
+        print(f"No {FONT_FILES['']} in {font_dir}: timing core-font invoices only")
+
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username='bench_invoices', defaults={'email': 'bench@example.invalid', 'first_name': 'Bench'},
+    )
+    Order.objects.filter(user=user).delete()
+    try:
+        for i in range(args.orders):
+            order = Order.objects.create(
+                user=user, order_number=f'BI{i:06d}', total_amount=Decimal('1297'), final_amount=Decimal('1297'),
+                shipping_address='12 Reef Road\nKochi',
+            )
+            OrderItem.objects.create(order=order, product_name=f'Halfmoon Betta #{i}', quantity=2, price=Decimal('349'))
+            OrderAccessoryItem.objects.create(order=order, product_name='Sponge Filter', quantity=1, price=Decimal('299'))
+            OrderPlantItem.objects.create(order=order, product_name='Java Fern', quantity=1, price=Decimal('300'))
+        orders = list(
+            Order.objects.filter(user=user).select_related('user')
+            .prefetch_related('items', 'accessory_items', 'plant_items').order_by('id')
+        )
+
+        def renderer(subset=False):
+            return lambda: InvoiceRenderer(font_dir=font_dir, logo_path=settings.INVOICE_LOGO_PATH,
+                                           subset_fonts=subset)
+
+        run('per-call', renderer(), orders, args.single)
+        for label, subset in (('preloaded', False), ('subset', True)):
+            first = run(label, renderer(subset), orders, args.single)
+            print(f"{'':>10}  one-time load + first render: {first * 1000:.0f} ms")
+    finally:
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
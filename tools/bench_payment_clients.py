@@ -0,0 +1,133 @@
+"""Microbenchmark: per-call Razorpay clients vs the pooled provider registry.
+
+Starts a local HTTP/1.1 stub of the Razorpay orders API, then creates N
+provider orders two ways:
+
+- ``fresh``  - build a new RazorpayProvider (and requests.Session) per call,
+  which is what get_payment_provider() used to do;
+- ``pooled`` - reuse the provider from the registry with its keep-alive pool.
+
+It reports per-call latency and how many TCP connections the stub accepted.
+No traffic leaves the machine and no database access is needed. Against the
+real API each avoided connection also saves a TLS handshake, so the gap in
+production is larger than on loopback.
+
+Usage:
+    python tools/bench_payment_clients.py --calls 300 --threads 4
+"""
+import argparse
+import json
+import os
+import pathlib
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+class StubRazorpay(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    lock = threading.Lock()
+    latency = 0.0
+
+    def setup(self):
+        # Headers and body go out in separate writes; without NODELAY, Nagle
+        # plus delayed ACKs add ~40ms to every keep-alive response.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+        with StubRazorpay.lock:
+            StubRazorpay.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({
+            'id': f"order_stub{time.monotonic_ns()}",
+            'entity': 'order',
+            'amount': data.get('amount'),
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(label, get_provider, calls, threads):
+    StubRazorpay.connections = 0
+    order = SimpleNamespace(final_amount=499, order_number='BENCH1')
+    timings = []
+
+    def one(_):
+        start = time.perf_counter()
+        get_provider().create_order(order)
+        timings.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - started
+    ms = [t * 1000 for t in timings]
+    print(
+        f"{label:<7} calls={calls:<5} wall={wall:6.2f}s  "
+        f"p50={statistics.median(ms):6.2f}ms p95={percentile(ms, 95):6.2f}ms p99={percentile(ms, 99):6.2f}ms  "
+        f"connections={StubRazorpay.connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Artificial server latency per request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubRazorpay)
+    server.daemon_threads = True
+    StubRazorpay.latency = args.latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fishy_friend_aquatics.settings')
+    os.environ['RAZORPAY_API_BASE_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ.setdefault('RAZORPAY_KEY_ID', 'rzp_test_bench')
+    os.environ.setdefault('RAZORPAY_KEY_SECRET', 'bench_secret')
+    import django
+    django.setup()
+
+    from store.payments import get_payment_provider, reset_payment_providers
+    from store.payments.razorpay import RazorpayProvider
+
+    # Warm up imports and the stub before timing
+    RazorpayProvider().create_order(SimpleNamespace(final_amount=1, order_number='WARM'))
+
+    run('fresh', RazorpayProvider, args.calls, args.threads)
+    reset_payment_providers()
+    run('pooled', lambda: get_payment_provider('razorpay'), args.calls, args.threads)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Benchmark: sync (WSGI) vs async (ASGI) Razorpay create-payment views.
+
+Starts the local Razorpay stub from bench_payment_clients.py in a separate
+process (so its threads do not compete for this process's GIL) with an
+artificial gateway latency, creates throwaway orders, then drives
+`create_razorpay_payment` two ways:
+
+- ``wsgi`` - the sync view on a thread pool of ``--threads`` workers, i.e.
+  one WSGI worker process with that many threads;
+- ``asgi`` - the async view on a single event loop with up to
+  ``--inflight`` requests awaiting the gateway at once.
+
+Both paths run the same ORM work (order lookup, provider_order_id save).
+It reports wall time, throughput, latency percentiles and the peak number of
+requests the stub had in flight. Views are called directly with
+RequestFactory requests, so server overhead is not included.
+
+Usage (against a development database):
+    python tools/bench_payment_views.py --requests 200 --latency-ms 100 --threads 8
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import pathlib
+import socket
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+from urllib.request import urlopen
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (PROJECT_ROOT, PROJECT_ROOT / 'tools'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from bench_payment_clients import StubRazorpay, percentile  # noqa: E402
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Enough listen backlog for every async request to connect at once
+    request_queue_size = 1024
+
+
+class CountingStub(StubRazorpay):
+    """Stub that tracks concurrent requests; GET /stats returns and resets the peak."""
+    inflight = 0
+    peak = 0
+
+    def do_POST(self):
+        with StubRazorpay.lock:
+            CountingStub.inflight += 1
+            CountingStub.peak = max(CountingStub.peak, CountingStub.inflight)
+        try:
+            super().do_POST()
+        finally:
+            with StubRazorpay.lock:
+                CountingStub.inflight -= 1
+
+    def do_GET(self):
+        with StubRazorpay.lock:
+            body = json.dumps({'peak': CountingStub.peak}).encode()
+            CountingStub.peak = 0
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port, latency):
+    CountingStub.latency = latency
+    StubServer(('127.0.0.1', port), CountingStub).serve_forever()
+
+
+def stub_peak(base_url):
+    with urlopen(f'{base_url}/stats') as response:
+        return json.loads(response.read())['peak']
+
+
+def report(label, timings, errors, wall, base_url):
+    ms = [t * 1000 for t in timings] or [0]
+    print(
+        f"{label:<5} requests={len(timings):<5} errors={errors:<3} wall={wall:6.2f}s "
+        f"rps={len(timings) / wall if wall else 0:7.1f}  "
+        f"p50={statistics.median(ms):7.1f}ms p95={percentile(ms, 95):7.1f}ms p99={percentile(ms, 99):7.1f}ms  "
+        f"peak_in_flight={stub_peak(base_url)}"
+    )
+
+
+def run_wsgi(orders, factory, threads, base_url):
+    from store.razorpay_integration import create_razorpay_payment
+    from django.db import close_old_connections
+
+    stub_peak(base_url)
+    timings, errors = [], []
+
+    def one(order):
+        start = time.perf_counter()
+        try:
+            response = create_razorpay_payment(factory.post(f'/payments/razorpay/create/{order.id}/'), order.id)
+            if response.status_code != 200:
+                errors.append(order.id)
+        finally:
+            timings.append(time.perf_counter() - start)
+            close_old_connections()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, orders))
+    report('wsgi', timings, len(errors), time.perf_counter() - started, base_url)
+
+
+def run_asgi(orders, factory, inflight, base_url):
+    from store.payments import get_payment_provider
+    from store.razorpay_integration import acreate_razorpay_payment
+
+    stub_peak(base_url)
+    timings, errors = [], []
+
+    async def main():
+        gate = asyncio.Semaphore(inflight)
+
+        async def one(order):
+            async with gate:
+                start = time.perf_counter()
+                response = await acreate_razorpay_payment(factory.post(f'/payments/razorpay/create/{order.id}/'), order.id)
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append(order.id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(order) for order in orders))
+        wall = time.perf_counter() - started
+        await get_payment_provider('razorpay').aclose()
+        return wall
+
+    wall = asyncio.run(main())
+    report('asgi', timings, len(errors), wall, base_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=100, help='Artificial gateway latency per call')
+    parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+    parser.add_argument('--inflight', type=int, default=50, help='Max concurrent async requests')
+    args = parser.parse_args()
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    base_url = f'http://127.0.0.1:{port}'
+    server = multiprocessing.Process(target=serve, args=(port, args.latency_ms / 1000), daemon=True)
+    server.start()
+    for _ in range(50):
+        try:
+            stub_peak(base_url)
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fishy_friend_aquatics.settings')
+    os.environ['RAZORPAY_API_BASE_URL'] = base_url
+    os.environ.setdefault('RAZORPAY_KEY_ID', 'rzp_test_bench')
+    os.environ.setdefault('RAZORPAY_KEY_SECRET', 'bench_secret')
+    os.environ['PAYMENT_HTTP_POOL_SIZE'] = str(args.threads)
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import RequestFactory
+    from store.models import Order
+
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(username='bench_payment_views', defaults={'email': 'bench@example.invalid'})
+    Order.objects.filter(user=user).delete()
+    orders = [
+        Order.objects.create(
+            user=user, order_number=f'BV{i:06d}', total_amount=Decimal('499'), final_amount=Decimal('499'),
+        )
+        for i in range(args.requests * 2)
+    ]
+    factory = RequestFactory()
+    try:
+        run_wsgi(orders[:args.requests], factory, args.threads, base_url)
+        run_asgi(orders[args.requests:], factory, args.inflight, base_url)
+    finally:
+        user.delete()
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()